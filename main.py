@@ -1,13 +1,49 @@
 # src/main.py
+import logging
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.responses import HTMLResponse
 from fastapi.openapi.utils import get_openapi
 from src.routers import data_handler, user_auth
+from src.services.extraction_executor import extraction_executor
+from src.services.dense_index import dense_index
+from src.services.ingest_jobs import ingest_jobs
+from src.services.password_hasher import password_hasher
+from src.data_store import data_store, APP_WORKERS
+from src.database.memory_db import users, job_store
+from src.utils.llm_client import llm_client_manager
+
+# Module loggers (logging.getLogger(__name__)) write to stderr next to uvicorn's own log lines
+logging.basicConfig(level=logging.WARNING, format="%(levelname)s:     %(name)s - %(message)s")
+logging.getLogger("src").setLevel(logging.INFO)
+
+
+# ===================================================
+# STARTUP / SHUTDOWN
+# ===================================================
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    extraction_executor.start()
+    password_hasher.start()
+    await password_hasher.calibrate()
+    llm_client_manager.start()
+    ingest_jobs.start(sole_worker=APP_WORKERS == 1)
+    yield
+    await ingest_jobs.aclose()
+    await llm_client_manager.aclose()
+    extraction_executor.shutdown()
+    password_hasher.shutdown()
+    dense_index.save()
+    data_store.close()
+    users.close()
+    job_store.close()
+
 
 app = FastAPI(
     title="CAG Project API - Chat with Your PDF",
     description="API for uploading PDFs, querying content via LLM, and managing data.",
     version="0.1.0",
+    lifespan=lifespan,
 )
 
 # ===================================================
@@ -578,4 +614,8 @@ def read_root():
 
 if __name__ == "__main__":
     import uvicorn
-    uvicorn.run(app, host="127.0.0.1", port=8001)
\ No newline at end of file
+    if APP_WORKERS > 1:
+        # Multiple workers need an import string; each worker imports its own app
+        uvicorn.run("main:app", host="127.0.0.1", port=8001, workers=APP_WORKERS)
+    else:
+        uvicorn.run(app, host="127.0.0.1", port=8001)
\ No newline at end of file
@@ -1 +1,40 @@
-data_store = {}
\ No newline at end of file
+# src/data_store.py
+import logging
+import os
+from dotenv import load_dotenv, find_dotenv
+
+from src.database.document_store import DocumentStore, InMemoryDocumentStore
+
+load_dotenv(find_dotenv())
+logger = logging.getLogger(__name__)
+
+# -------------------------------
+# Config
+# -------------------------------
+# Number of uvicorn worker processes started by main.py
+APP_WORKERS = int(os.getenv("APP_WORKERS", "1"))
+# memory | sqlite; several workers can only share state through sqlite
+DOCUMENT_STORE_BACKEND = os.getenv("DOCUMENT_STORE_BACKEND", "sqlite" if APP_WORKERS > 1 else "memory")
+DOCUMENT_STORE_PATH = os.getenv("DOCUMENT_STORE_PATH", "data/cag_documents.db")
+DOCUMENT_CACHE_MAX_CHARS = int(os.getenv("DOCUMENT_CACHE_MAX_CHARS", str(64 * 1024 * 1024)))
+
+
+def create_document_store(backend: str = DOCUMENT_STORE_BACKEND) -> DocumentStore:
+    """
+    Builds the document store selected by DOCUMENT_STORE_BACKEND.
+    Raises ValueError for an unknown backend name.
+    """
+    if backend == "memory":
+        if APP_WORKERS > 1:
+            logger.warning(
+                "DOCUMENT_STORE_BACKEND=memory with APP_WORKERS=%d; "
+                "each worker will only see its own documents. Use 'sqlite' to share them.", APP_WORKERS
+            )
+        return InMemoryDocumentStore()
+    if backend == "sqlite":
+        from src.database.sqlite_store import SQLiteDocumentStore
+        return SQLiteDocumentStore(DOCUMENT_STORE_PATH, cache_max_chars=DOCUMENT_CACHE_MAX_CHARS)
+    raise ValueError(f"Unknown DOCUMENT_STORE_BACKEND: {backend!r} (expected 'memory' or 'sqlite')")
+
+
+data_store = create_document_store()
@@ -0,0 +1,295 @@
+# src/database/document_store.py
+import hashlib
+import threading
+from abc import ABC, abstractmethod
+
+from src.utils.token_estimator import estimate_tokens
+
+
+class DocumentExistsError(ValueError):
+    """Raised when creating a document under a UUID that is already taken."""
+
+
+class DocumentNotFoundError(KeyError):
+    """Raised when appending to a document that does not exist."""
+
+
+# Joins consecutive segments in the assembled document text
+SEGMENT_SEPARATOR = "\n\n"
+
+
+def text_digest(text: str) -> str:
+    """SHA-256 of a segment text; identical texts are stored once under it."""
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+# -------------------------------
+# Storage interface
+# -------------------------------
+class DocumentStore(ABC):
+    """
+    Storage interface for uploaded documents.
+
+    A document is identified by its UUID string and has metadata
+    (file_name, date of the first upload) plus an ordered list of
+    immutable segments, one per uploaded PDF. Each segment has its own
+    file_name, date and page_count, and its [start, end) character
+    offsets in the document text: the segment texts joined with
+    SEGMENT_SEPARATOR. Appending a PDF adds a segment without copying
+    the text already stored; the full text is assembled only when read.
+    Segment texts are content-addressed, so the same PDF uploaded under
+    several UUIDs is stored once.
+
+    Every write gives the document a new integer version, which callers
+    use to tag derived data (indexes, caches). Versions are taken from
+    the store-wide generation counter, so they only ever increase, also
+    across a delete and re-upload of the same UUID: (uuid, version)
+    names one content for good. `get` returns a dict with the keys
+    "file_name", "date", "version", "token_count", "segments" and "text";
+    metadata-only methods return dicts without "text".
+
+    Writes take a record of every page of the added text: its [start,
+    end) offsets in that text and its estimated tokens (see
+    `page_records`); without them the text is stored as a single page.
+    Pages are numbered from 1 across the whole document and `get_pages`
+    returns their offsets in the document text. "token_count" is the sum
+    over all pages (None for documents stored before token accounting
+    existed).
+
+    Writes also say whether the text was normalized (headers, footers and
+    page numbers dropped, see text_normalizer) or stored as extracted.
+    Segments report it as "normalized", and `list_metadata` reports
+    whether any segment of a document was normalized.
+    """
+
+    # Whether documents outlive the process, so data derived from them is worth persisting too
+    durable = False
+
+    @abstractmethod
+    def __contains__(self, uuid: str) -> bool: ...
+
+    @abstractmethod
+    def create(self, uuid: str, file_name: str, date: str, text: str,
+               pages: list[dict] | None = None, normalized: bool = False) -> int:
+        """
+        Stores a new document as its first segment and returns its version.
+        Raises DocumentExistsError if the UUID is taken.
+        """
+
+    @abstractmethod
+    def append_segment(self, uuid: str, file_name: str, date: str, text: str,
+                       pages: list[dict] | None = None, normalized: bool = False) -> dict:
+        """
+        Adds a segment at the end of a document. Pages of the new text are
+        numbered after the existing ones.
+        Returns {"version", "previous_version", "token_count", "segment"}
+        with the new and the replaced version, the document's new token
+        count and the segment's metadata.
+        Raises DocumentNotFoundError if the document is missing.
+        """
+
+    @abstractmethod
+    def get(self, uuid: str) -> dict | None:
+        """Returns metadata, segments and text, or None if the document does not exist."""
+
+    @abstractmethod
+    def get_pages(self, uuid: str) -> list[dict] | None:
+        """
+        Returns {"page", "start", "end", "tokens"} for every page in page
+        order, or None if the document does not exist. Documents stored
+        before pages were recorded have no offsets ("start"/"end" None).
+        """
+
+    @abstractmethod
+    def delete(self, uuid: str) -> dict | None:
+        """Deletes a document and returns its metadata, or None if it did not exist."""
+
+    @abstractmethod
+    def list_metadata(self) -> list[dict]:
+        """Returns {"uuid", "file_name", "date", "normalized"} for every stored document."""
+
+    @abstractmethod
+    def versions(self) -> dict[str, int]:
+        """Returns {uuid: version} for every stored document."""
+
+    @abstractmethod
+    def generation(self) -> int:
+        """
+        Returns a counter bumped by every create, append and delete (by any
+        process sharing the store), so derived data covering all documents
+        can tell cheaply whether anything changed.
+        """
+
+    def stats(self) -> dict:
+        """Backend-specific counters for the /stats endpoint."""
+        return {}
+
+    def close(self) -> None:
+        """Releases backend resources (connections, files)."""
+
+
+def page_records(spans: list[tuple[int, int]], tokens: list[int]) -> list[dict]:
+    """Builds the page records taken by the store writes from page offsets and token counts."""
+    return [{"start": start, "end": end, "tokens": count} for (start, end), count in zip(spans, tokens)]
+
+
+def single_page(text: str) -> list[dict]:
+    """Page records of a text without page information: one page spanning all of it."""
+    return [{"start": 0, "end": len(text), "tokens": estimate_tokens(text)}]
+
+
+def segment_metadata(seq: int, file_name: str, date: str, page_count: int, start: int, end: int,
+                     normalized: bool = False) -> dict:
+    """Builds the metadata dict of one segment as returned by the stores."""
+    return {
+        "seq": seq,
+        "file_name": file_name,
+        "date": date,
+        "page_count": page_count,
+        "start": start,
+        "end": end,
+        "normalized": normalized,
+    }
+
+
+# -------------------------------
+# In-memory backend
+# -------------------------------
+class InMemoryDocumentStore(DocumentStore):
+    """
+    Process-local store backed by a dict. Contents are lost on restart.
+    The assembled text of a document is kept until its next append.
+    Segments with identical text reference one shared string.
+    """
+
+    def __init__(self):
+        self._docs: dict[str, dict] = {}
+        self._blobs: dict[str, list] = {}  # digest -> [text, references]
+        self._generation = 0
+        self._lock = threading.Lock()
+
+    def _share(self, digest: str, text: str) -> str:
+        """Takes a reference to the blob of `digest` and returns its shared text."""
+        blob = self._blobs.setdefault(digest, [text, 0])
+        blob[1] += 1
+        return blob[0]
+
+    def _release(self, digest: str) -> None:
+        blob = self._blobs[digest]
+        blob[1] -= 1
+        if blob[1] == 0:
+            del self._blobs[digest]
+
+    def __contains__(self, uuid: str) -> bool:
+        return uuid in self._docs
+
+    def create(self, uuid: str, file_name: str, date: str, text: str,
+               pages: list[dict] | None = None, normalized: bool = False) -> int:
+        pages = pages if pages is not None else single_page(text)
+        segment = segment_metadata(0, file_name, date, len(pages), 0, len(text), normalized)
+        digest = text_digest(text)
+        with self._lock:
+            if uuid in self._docs:
+                raise DocumentExistsError(uuid)
+            text = self._share(digest, text)
+            self._generation += 1
+            self._docs[uuid] = {
+                "file_name": file_name,
+                "date": date,
+                "version": self._generation,
+                "token_count": sum(page["tokens"] for page in pages),
+                "pages": [dict(page) for page in pages],
+                "segments": [segment],
+                "segment_blobs": [digest],
+                "segment_texts": [text],
+                "text": text,
+            }
+        return self._generation
+
+    def append_segment(self, uuid: str, file_name: str, date: str, text: str,
+                       pages: list[dict] | None = None, normalized: bool = False) -> dict:
+        pages = pages if pages is not None else single_page(text)
+        digest = text_digest(text)
+        with self._lock:
+            doc = self._docs.get(uuid)
+            if doc is None:
+                raise DocumentNotFoundError(uuid)
+            text = self._share(digest, text)
+            start = doc["segments"][-1]["end"] + len(SEGMENT_SEPARATOR)
+            segment = segment_metadata(
+                len(doc["segments"]), file_name, date, len(pages), start, start + len(text), normalized
+            )
+            doc["segments"].append(segment)
+            doc["segment_blobs"].append(digest)
+            doc["segment_texts"].append(text)
+            doc["text"] = None
+            doc["pages"].extend(
+                {"start": start + page["start"], "end": start + page["end"], "tokens": page["tokens"]}
+                for page in pages
+            )
+            doc["token_count"] += sum(page["tokens"] for page in pages)
+            previous_version = doc["version"]
+            self._generation += 1
+            doc["version"] = self._generation
+            return {"version": doc["version"], "previous_version": previous_version,
+                    "token_count": doc["token_count"], "segment": dict(segment)}
+
+    def get(self, uuid: str) -> dict | None:
+        with self._lock:
+            doc = self._docs.get(uuid)
+            if doc is None:
+                return None
+            if doc["text"] is None:
+                doc["text"] = SEGMENT_SEPARATOR.join(doc["segment_texts"])
+            return {
+                "file_name": doc["file_name"],
+                "date": doc["date"],
+                "version": doc["version"],
+                "token_count": doc["token_count"],
+                "segments": [dict(segment) for segment in doc["segments"]],
+                "text": doc["text"],
+            }
+
+    def get_pages(self, uuid: str) -> list[dict] | None:
+        with self._lock:
+            doc = self._docs.get(uuid)
+            if doc is None:
+                return None
+            return [{"page": number, **page} for number, page in enumerate(doc["pages"], start=1)]
+
+    def delete(self, uuid: str) -> dict | None:
+        with self._lock:
+            doc = self._docs.pop(uuid, None)
+            if doc is None:
+                return None
+            for digest in doc["segment_blobs"]:
+                self._release(digest)
+            self._generation += 1
+        return {"file_name": doc["file_name"], "date": doc["date"]}
+
+    def list_metadata(self) -> list[dict]:
+        return [
+            {"uuid": uuid, "file_name": doc["file_name"], "date": doc["date"],
+             "normalized": any(segment["normalized"] for segment in doc["segments"])}
+            for uuid, doc in list(self._docs.items())
+        ]
+
+    def versions(self) -> dict[str, int]:
+        with self._lock:
+            return {uuid: doc["version"] for uuid, doc in self._docs.items()}
+
+    def generation(self) -> int:
+        return self._generation
+
+    def stats(self) -> dict:
+        docs = list(self._docs.values())
+        blobs = list(self._blobs.values())
+        return {
+            "backend": "memory",
+            "documents": len(docs),
+            "segments": sum(len(doc["segments"]) for doc in docs),
+            "text_chars": sum(doc["segments"][-1]["end"] for doc in docs),
+            "blobs": len(blobs),
+            "blob_chars": sum(len(blob[0]) for blob in blobs),
+            "token_count": sum(doc["token_count"] for doc in docs),
+        }
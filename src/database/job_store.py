@@ -0,0 +1,128 @@
+# src/database/job_store.py
+import threading
+from abc import ABC, abstractmethod
+
+# Jobs in these states hold their document: it is not ready for queries
+ACTIVE_STATUSES = ("queued", "running")
+FINISHED_STATUSES = ("succeeded", "failed")
+
+
+class JobConflictError(ValueError):
+    """Raised when a document already has an active ingestion job."""
+
+    def __init__(self, job: dict):
+        super().__init__(f"Document {job['uuid']} already has ingestion job {job['job_id']} ({job['status']}).")
+        self.job = job
+
+
+# -------------------------------
+# Ingestion job storage interface
+# -------------------------------
+class JobStore(ABC):
+    """
+    Storage interface for background ingestion jobs, keyed by job id.
+    A job is a dict {job_id, uuid, kind, priority, status, attempts,
+    pages_done, pages_total, error, result, created_at, updated_at};
+    "result" is the response the synchronous endpoint would have returned.
+    """
+
+    @abstractmethod
+    def create(self, job: dict) -> None:
+        """
+        Stores a new job. Raises JobConflictError if the job's document
+        already has an active (queued or running) job.
+        """
+
+    @abstractmethod
+    def update(self, job_id: str, **fields) -> None:
+        """Sets fields of a job; unknown ids are ignored."""
+
+    @abstractmethod
+    def get(self, job_id: str) -> dict | None:
+        """Returns the job dict, or None if the id is unknown."""
+
+    @abstractmethod
+    def active(self, uuid: str) -> dict | None:
+        """Returns the active job of a document, or None if it is ready."""
+
+    @abstractmethod
+    def fail_active(self, error: str, updated_at: str) -> int:
+        """Marks every active job failed with `error`; returns how many."""
+
+    @abstractmethod
+    def delete_finished(self, before: str) -> int:
+        """Deletes finished jobs last updated before `before` (ISO time); returns how many."""
+
+    def close(self) -> None:
+        """Releases backend resources."""
+
+
+# -------------------------------
+# In-memory backend
+# -------------------------------
+class InMemoryJobStore(JobStore):
+    """
+    Process-local jobs dict. Contents are lost on restart.
+    The active job of every document is indexed by UUID, so the readiness
+    check of every query does not scan the retained jobs.
+    """
+
+    def __init__(self):
+        self._jobs: dict[str, dict] = {}
+        self._active_jobs: dict[str, str] = {}  # document uuid -> job_id of its active job
+        self._lock = threading.Lock()
+
+    def _active(self, uuid: str) -> dict | None:
+        job_id = self._active_jobs.get(uuid)
+        return self._jobs[job_id] if job_id is not None else None
+
+    def _track(self, job: dict) -> None:
+        """Keeps the active-job index in step with the status of `job`."""
+        if job["status"] in ACTIVE_STATUSES:
+            self._active_jobs[job["uuid"]] = job["job_id"]
+        elif self._active_jobs.get(job["uuid"]) == job["job_id"]:
+            del self._active_jobs[job["uuid"]]
+
+    def create(self, job: dict) -> None:
+        with self._lock:
+            active = self._active(job["uuid"])
+            if active is not None:
+                raise JobConflictError(dict(active))
+            self._jobs[job["job_id"]] = dict(job)
+            self._track(job)
+
+    def update(self, job_id: str, **fields) -> None:
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is not None:
+                job.update(fields)
+                if "status" in fields:
+                    self._track(job)
+
+    def get(self, job_id: str) -> dict | None:
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return dict(job) if job is not None else None
+
+    def active(self, uuid: str) -> dict | None:
+        with self._lock:
+            job = self._active(uuid)
+            return dict(job) if job is not None else None
+
+    def fail_active(self, error: str, updated_at: str) -> int:
+        with self._lock:
+            active = [self._jobs[job_id] for job_id in self._active_jobs.values()]
+            for job in active:
+                job.update(status="failed", error=error, updated_at=updated_at)
+            self._active_jobs.clear()
+        return len(active)
+
+    def delete_finished(self, before: str) -> int:
+        with self._lock:
+            expired = [
+                job_id for job_id, job in self._jobs.items()
+                if job["status"] in FINISHED_STATUSES and job["updated_at"] < before
+            ]
+            for job_id in expired:
+                del self._jobs[job_id]
+        return len(expired)
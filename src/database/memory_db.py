@@ -1,2 +1,32 @@
-users = {}     # key: email, value: user dict {user_id, name, email, password_hash, country, purpose
-next_user_id = 1
+# src/database/memory_db.py
+from src.data_store import DOCUMENT_STORE_BACKEND, DOCUMENT_STORE_PATH
+from src.database.job_store import JobStore, InMemoryJobStore
+from src.database.user_store import UserStore, InMemoryUserStore
+
+
+def create_user_store(backend: str = DOCUMENT_STORE_BACKEND) -> UserStore:
+    """
+    Builds the user store. Users follow the document store backend, so with
+    `sqlite` they live in the same file and are shared by all workers.
+    """
+    if backend == "sqlite":
+        from src.database.sqlite_store import SQLiteUserStore
+        return SQLiteUserStore(DOCUMENT_STORE_PATH)
+    return InMemoryUserStore()
+
+
+users = create_user_store()  # key: email, value: user dict {user_id, name, email, password_hash, country, purpose}
+
+
+def create_job_store(backend: str = DOCUMENT_STORE_BACKEND) -> JobStore:
+    """
+    Builds the ingestion job store. Like users, jobs follow the document
+    store backend, so with `sqlite` every worker sees every job.
+    """
+    if backend == "sqlite":
+        from src.database.sqlite_store import SQLiteJobStore
+        return SQLiteJobStore(DOCUMENT_STORE_PATH)
+    return InMemoryJobStore()
+
+
+job_store = create_job_store()
@@ -0,0 +1,664 @@
+# src/database/sqlite_store.py
+import json
+import os
+import sqlite3
+import threading
+from collections import OrderedDict
+
+from src.database.document_store import (
+    DocumentStore,
+    DocumentExistsError,
+    DocumentNotFoundError,
+    SEGMENT_SEPARATOR,
+    segment_metadata,
+    single_page,
+    text_digest,
+)
+from src.database.job_store import JobStore, JobConflictError, ACTIVE_STATUSES, FINISHED_STATUSES
+from src.database.user_store import UserStore
+
+
+# -------------------------------
+# Hot-document text cache
+# -------------------------------
+class TextLRUCache:
+    """
+    LRU cache of document texts bounded by total characters.
+    Entries are tagged with the document version so a stale text
+    (changed by another writer) is never served.
+    """
+
+    def __init__(self, max_chars: int):
+        self.max_chars = max_chars
+        self._entries: OrderedDict[str, tuple[int, str]] = OrderedDict()
+        self._chars = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, uuid: str, version: int) -> str | None:
+        with self._lock:
+            entry = self._entries.get(uuid)
+            if entry is None or entry[0] != version:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(uuid)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, uuid: str, version: int, text: str) -> None:
+        if len(text) > self.max_chars:
+            return
+        with self._lock:
+            self._discard(uuid)
+            self._entries[uuid] = (version, text)
+            self._chars += len(text)
+            while self._chars > self.max_chars:
+                _, (_, evicted) = self._entries.popitem(last=False)
+                self._chars -= len(evicted)
+
+    def invalidate(self, uuid: str) -> None:
+        with self._lock:
+            self._discard(uuid)
+
+    def _discard(self, uuid: str) -> None:
+        entry = self._entries.pop(uuid, None)
+        if entry is not None:
+            self._chars -= len(entry[1])
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "chars": self._chars,
+                "max_chars": self.max_chars,
+                "hits": self.hits,
+                "misses": self.misses,
+            }
+
+
+# -------------------------------
+# SQLite backend
+# -------------------------------
+SEGMENTS_TABLE = """
+CREATE TABLE IF NOT EXISTS document_segments (
+    uuid       TEXT NOT NULL REFERENCES documents(uuid) ON DELETE CASCADE,
+    seq        INTEGER NOT NULL,
+    file_name  TEXT NOT NULL,
+    date       TEXT,
+    page_count INTEGER NOT NULL DEFAULT 0,
+    start_char INTEGER NOT NULL,
+    end_char   INTEGER NOT NULL,
+    blob       TEXT NOT NULL,
+    normalized INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (uuid, seq)
+);
+"""
+
+SCHEMA = f"""
+CREATE TABLE IF NOT EXISTS documents (
+    uuid        TEXT PRIMARY KEY,
+    file_name   TEXT NOT NULL,
+    date        TEXT,
+    version     INTEGER NOT NULL DEFAULT 1,
+    text_chars  INTEGER NOT NULL DEFAULT 0,
+    token_count INTEGER
+);
+{SEGMENTS_TABLE}
+CREATE TABLE IF NOT EXISTS text_blobs (
+    digest TEXT PRIMARY KEY,
+    text   TEXT NOT NULL,
+    chars  INTEGER NOT NULL,
+    refs   INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS document_pages (
+    uuid       TEXT NOT NULL REFERENCES documents(uuid) ON DELETE CASCADE,
+    page_no    INTEGER NOT NULL,
+    tokens     INTEGER NOT NULL,
+    start_char INTEGER,
+    end_char   INTEGER,
+    PRIMARY KEY (uuid, page_no)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS store_state (
+    key   TEXT PRIMARY KEY,
+    value INTEGER NOT NULL
+);
+INSERT OR IGNORE INTO store_state (key, value) VALUES ('generation', 0);
+"""
+
+BUMP_GENERATION = "UPDATE store_state SET value = value + 1 WHERE key = 'generation'"
+
+# Columns added after the first release, as (table, column, definition)
+MIGRATIONS = [
+    ("documents", "token_count", "INTEGER"),
+    ("document_pages", "start_char", "INTEGER"),
+    ("document_pages", "end_char", "INTEGER"),
+    ("document_segments", "normalized", "INTEGER NOT NULL DEFAULT 0"),
+]
+
+
+# How long a writer waits for another process holding the write lock
+SQLITE_BUSY_TIMEOUT_MS = 10_000
+
+
+def connect(path: str) -> sqlite3.Connection:
+    """
+    Opens a SQLite connection that can be shared by several processes:
+    WAL journal (readers never block the writer), a busy timeout instead
+    of immediate "database is locked" errors, and autocommit mode so
+    transactions are explicit.
+    """
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+
+    conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+    conn.row_factory = sqlite3.Row
+    conn.execute(f"PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT_MS}")
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute("PRAGMA foreign_keys=ON")
+    return conn
+
+
+class SQLiteDocumentStore(DocumentStore):
+    """
+    Persistent store in a single SQLite file (WAL mode).
+
+    Metadata lives in `documents` and every uploaded PDF in its own
+    `document_segments` row, so listing documents never reads any text
+    and an append is a single insert. Segment texts live in `text_blobs`
+    under their SHA-256 with a reference count, so identical uploads are
+    stored once. Recently used texts are kept in a TextLRUCache, which
+    puts a ceiling on the memory held by stored text: single-segment
+    documents are cached by blob, so UUIDs sharing a text share one
+    string, and multi-segment documents by their assembled text.
+
+    Several uvicorn workers can open the same file: every read checks the
+    document version, so a cached text updated by another worker is
+    reloaded instead of served stale.
+    """
+
+    durable = True
+
+    def __init__(self, path: str, cache_max_chars: int):
+        self.path = path
+        self._conn = connect(path)
+        self._lock = threading.Lock()
+        self._cache = TextLRUCache(cache_max_chars)
+
+        with self._lock:
+            self._conn.executescript(SCHEMA)
+            self._migrate()
+
+    def _migrate(self) -> None:
+        """Upgrades a database file created by an older version."""
+        for table, column, definition in MIGRATIONS:
+            columns = {row["name"] for row in self._conn.execute(f"PRAGMA table_info({table})")}
+            if column in columns:
+                continue
+            try:
+                self._conn.execute(f"ALTER TABLE {table} ADD COLUMN {column} {definition}")
+            except sqlite3.OperationalError:
+                # Another worker added it first
+                pass
+
+        try:
+            self._conn.execute("BEGIN IMMEDIATE")
+            tables = {
+                row["name"] for row in self._conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")
+            }
+            segment_columns = {row["name"] for row in self._conn.execute("PRAGMA table_info(document_segments)")}
+            if "document_texts" in tables:
+                # Whole-document texts from before segments become each document's only segment
+                for row in self._conn.execute(
+                    "SELECT t.uuid, d.file_name, d.date, t.text "
+                    "FROM document_texts t JOIN documents d ON d.uuid = t.uuid"
+                ).fetchall():
+                    self._insert_segment(row["uuid"], 0, row["file_name"], row["date"], 0, 0, row["text"])
+                self._conn.execute("DROP TABLE document_texts")
+            if "text" in segment_columns:
+                # Segments that held their own text move it into shared blobs
+                self._conn.execute("ALTER TABLE document_segments RENAME TO document_segments_old")
+                self._conn.execute(SEGMENTS_TABLE)
+                for row in self._conn.execute("SELECT * FROM document_segments_old").fetchall():
+                    self._insert_segment(row["uuid"], row["seq"], row["file_name"], row["date"],
+                                         row["page_count"], row["start_char"], row["text"])
+                self._conn.execute("DROP TABLE document_segments_old")
+            # Versions come from the generation counter; files from before
+            # that numbered each document from 1, so start above all of them
+            self._conn.execute(
+                "UPDATE store_state SET value = MAX(value, (SELECT COALESCE(MAX(version), 0) FROM documents)) "
+                "WHERE key = 'generation'"
+            )
+            self._conn.execute("COMMIT")
+        except BaseException:
+            self._conn.execute("ROLLBACK")
+            raise
+
+    def _bump_generation(self) -> int:
+        """Bumps the generation counter inside the open write transaction and returns it (the new version)."""
+        self._conn.execute(BUMP_GENERATION)
+        return self._conn.execute("SELECT value FROM store_state WHERE key = 'generation'").fetchone()["value"]
+
+    def _insert_segment(self, uuid: str, seq: int, file_name: str, date: str,
+                        page_count: int, start: int, text: str, normalized: bool = False) -> dict:
+        """Inserts a segment row and takes a reference to the blob holding its text."""
+        digest = text_digest(text)
+        shared = self._conn.execute(
+            "UPDATE text_blobs SET refs = refs + 1 WHERE digest = ?", (digest,)
+        ).rowcount
+        if not shared:
+            self._conn.execute(
+                "INSERT INTO text_blobs (digest, text, chars, refs) VALUES (?, ?, ?, 1)",
+                (digest, text, len(text)),
+            )
+        self._conn.execute(
+            "INSERT INTO document_segments "
+            "(uuid, seq, file_name, date, page_count, start_char, end_char, blob, normalized) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (uuid, seq, file_name, date, page_count, start, start + len(text), digest, int(normalized)),
+        )
+        return segment_metadata(seq, file_name, date, page_count, start, start + len(text), normalized)
+
+    def _insert_pages(self, uuid: str, first_page: int, offset: int, pages: list[dict]) -> None:
+        self._conn.executemany(
+            "INSERT INTO document_pages (uuid, page_no, tokens, start_char, end_char) VALUES (?, ?, ?, ?, ?)",
+            [
+                (uuid, first_page + i, page["tokens"], offset + page["start"], offset + page["end"])
+                for i, page in enumerate(pages)
+            ],
+        )
+
+    def __contains__(self, uuid: str) -> bool:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT 1 FROM documents WHERE uuid = ?", (uuid,)
+            ).fetchone()
+        return row is not None
+
+    def create(self, uuid: str, file_name: str, date: str, text: str,
+               pages: list[dict] | None = None, normalized: bool = False) -> int:
+        pages = pages if pages is not None else single_page(text)
+        with self._lock:
+            try:
+                self._conn.execute("BEGIN IMMEDIATE")
+                version = self._bump_generation()
+                self._conn.execute(
+                    "INSERT INTO documents (uuid, file_name, date, version, text_chars, token_count) "
+                    "VALUES (?, ?, ?, ?, ?, ?)",
+                    (uuid, file_name, date, version, len(text), sum(page["tokens"] for page in pages)),
+                )
+                self._insert_segment(uuid, 0, file_name, date, len(pages), 0, text, normalized)
+                self._insert_pages(uuid, 0, 0, pages)
+                self._conn.execute("COMMIT")
+            except sqlite3.IntegrityError:
+                self._conn.execute("ROLLBACK")
+                raise DocumentExistsError(uuid)
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+        return version
+
+    def append_segment(self, uuid: str, file_name: str, date: str, text: str,
+                       pages: list[dict] | None = None, normalized: bool = False) -> dict:
+        pages = pages if pages is not None else single_page(text)
+        with self._lock:
+            try:
+                self._conn.execute("BEGIN IMMEDIATE")
+                row = self._conn.execute(
+                    "SELECT version, text_chars FROM documents WHERE uuid = ?", (uuid,)
+                ).fetchone()
+                if row is None:
+                    raise DocumentNotFoundError(uuid)
+                start = row["text_chars"] + len(SEGMENT_SEPARATOR)
+                version = self._bump_generation()
+                self._conn.execute(
+                    "UPDATE documents SET version = ?, text_chars = ?, "
+                    "token_count = token_count + ? WHERE uuid = ?",
+                    (version, start + len(text), sum(page["tokens"] for page in pages), uuid),
+                )
+                position = self._conn.execute(
+                    "SELECT (SELECT COALESCE(MAX(seq) + 1, 0) FROM document_segments WHERE uuid = ?) AS seq, "
+                    "(SELECT COALESCE(MAX(page_no) + 1, 0) FROM document_pages WHERE uuid = ?) AS page_no",
+                    (uuid, uuid),
+                ).fetchone()
+                segment = self._insert_segment(
+                    uuid, position["seq"], file_name, date, len(pages), start, text, normalized
+                )
+                self._insert_pages(uuid, position["page_no"], start, pages)
+                token_count = self._conn.execute(
+                    "SELECT token_count FROM documents WHERE uuid = ?", (uuid,)
+                ).fetchone()["token_count"]
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+        self._cache.invalidate(uuid)
+        return {"version": version, "previous_version": row["version"], "token_count": token_count,
+                "segment": segment}
+
+    def get(self, uuid: str) -> dict | None:
+        with self._lock:
+            # One read transaction, so version, segments and text come from the same snapshot
+            self._conn.execute("BEGIN")
+            try:
+                row = self._conn.execute(
+                    "SELECT file_name, date, version, token_count FROM documents WHERE uuid = ?", (uuid,)
+                ).fetchone()
+                if row is None:
+                    return None
+                rows = self._conn.execute(
+                    "SELECT seq, file_name, date, page_count, start_char, end_char, blob, normalized "
+                    "FROM document_segments WHERE uuid = ? ORDER BY seq",
+                    (uuid,),
+                ).fetchall()
+                segments = [
+                    segment_metadata(r["seq"], r["file_name"], r["date"], r["page_count"],
+                                     r["start_char"], r["end_char"], bool(r["normalized"]))
+                    for r in rows
+                ]
+                # Blobs are immutable, so their cache entries never need a version
+                cache_key, cache_version = (
+                    (f"blob:{rows[0]['blob']}", 0) if len(rows) == 1 else (uuid, row["version"])
+                )
+                text = self._cache.get(cache_key, cache_version)
+                if text is None:
+                    text = SEGMENT_SEPARATOR.join(
+                        r["text"] for r in self._conn.execute(
+                            "SELECT b.text FROM document_segments s "
+                            "JOIN text_blobs b ON b.digest = s.blob "
+                            "WHERE s.uuid = ? ORDER BY s.seq",
+                            (uuid,),
+                        )
+                    )
+                    self._cache.put(cache_key, cache_version, text)
+            finally:
+                self._conn.execute("COMMIT")
+
+        return {
+            "file_name": row["file_name"],
+            "date": row["date"],
+            "version": row["version"],
+            "token_count": row["token_count"],
+            "segments": segments,
+            "text": text,
+        }
+
+    def get_pages(self, uuid: str) -> list[dict] | None:
+        with self._lock:
+            self._conn.execute("BEGIN")
+            try:
+                if self._conn.execute(
+                    "SELECT 1 FROM documents WHERE uuid = ?", (uuid,)
+                ).fetchone() is None:
+                    return None
+                rows = self._conn.execute(
+                    "SELECT page_no, start_char, end_char, tokens FROM document_pages "
+                    "WHERE uuid = ? ORDER BY page_no",
+                    (uuid,),
+                ).fetchall()
+            finally:
+                self._conn.execute("COMMIT")
+        return [
+            {"page": row["page_no"] + 1, "start": row["start_char"], "end": row["end_char"], "tokens": row["tokens"]}
+            for row in rows
+        ]
+
+    def delete(self, uuid: str) -> dict | None:
+        with self._lock:
+            try:
+                self._conn.execute("BEGIN IMMEDIATE")
+                row = self._conn.execute(
+                    "SELECT file_name, date FROM documents WHERE uuid = ?", (uuid,)
+                ).fetchone()
+                blobs = [r["blob"] for r in self._conn.execute(
+                    "SELECT blob FROM document_segments WHERE uuid = ?", (uuid,)
+                )]
+                self._conn.executemany(
+                    "UPDATE text_blobs SET refs = refs - 1 WHERE digest = ?",
+                    [(digest,) for digest in blobs],
+                )
+                orphaned = [r["digest"] for r in self._conn.execute(
+                    "SELECT digest FROM text_blobs WHERE refs <= 0"
+                )]
+                self._conn.execute("DELETE FROM text_blobs WHERE refs <= 0")
+                self._conn.execute("DELETE FROM documents WHERE uuid = ?", (uuid,))
+                if row is not None:
+                    self._bump_generation()
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+        self._cache.invalidate(uuid)
+        for digest in orphaned:
+            self._cache.invalidate(f"blob:{digest}")
+        if row is None:
+            return None
+        return {"file_name": row["file_name"], "date": row["date"]}
+
+    def list_metadata(self) -> list[dict]:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT d.uuid, d.file_name, d.date, EXISTS("
+                "SELECT 1 FROM document_segments s WHERE s.uuid = d.uuid AND s.normalized) AS normalized "
+                "FROM documents d ORDER BY d.rowid"
+            ).fetchall()
+        return [{**dict(row), "normalized": bool(row["normalized"])} for row in rows]
+
+    def versions(self) -> dict[str, int]:
+        with self._lock:
+            rows = self._conn.execute("SELECT uuid, version FROM documents").fetchall()
+        return {row["uuid"]: row["version"] for row in rows}
+
+    def generation(self) -> int:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value FROM store_state WHERE key = 'generation'"
+            ).fetchone()
+        return row["value"]
+
+    def stats(self) -> dict:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT COUNT(*) AS documents, COALESCE(SUM(text_chars), 0) AS text_chars, "
+                "COALESCE(SUM(token_count), 0) AS token_count FROM documents"
+            ).fetchone()
+            segments = self._conn.execute("SELECT COUNT(*) FROM document_segments").fetchone()[0]
+            blobs = self._conn.execute(
+                "SELECT COUNT(*) AS blobs, COALESCE(SUM(chars), 0) AS chars FROM text_blobs"
+            ).fetchone()
+        return {
+            "backend": "sqlite",
+            "path": self.path,
+            "documents": row["documents"],
+            "segments": segments,
+            "text_chars": row["text_chars"],
+            "token_count": row["token_count"],
+            "blobs": blobs["blobs"],
+            "blob_chars": blobs["chars"],
+            "cache": self._cache.stats(),
+        }
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+# -------------------------------
+# SQLite user backend
+# -------------------------------
+USER_SCHEMA = """
+CREATE TABLE IF NOT EXISTS users (
+    user_id       INTEGER PRIMARY KEY AUTOINCREMENT,
+    name          TEXT NOT NULL,
+    email         TEXT NOT NULL UNIQUE,
+    country       TEXT,
+    password_hash TEXT NOT NULL,
+    purpose       TEXT
+);
+"""
+
+
+class SQLiteUserStore(UserStore):
+    """Users table in the shared SQLite file; user ids come from AUTOINCREMENT."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._conn = connect(path)
+        self._lock = threading.Lock()
+        with self._lock:
+            self._conn.executescript(USER_SCHEMA)
+
+    def __contains__(self, email: str) -> bool:
+        return self.get(email) is not None
+
+    def get(self, email: str) -> dict | None:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT * FROM users WHERE email = ?", (email,)
+            ).fetchone()
+        return dict(row) if row is not None else None
+
+    def add(self, name: str, email: str, country: str, password_hash: str, purpose: str = None) -> dict:
+        with self._lock:
+            try:
+                cursor = self._conn.execute(
+                    "INSERT INTO users (name, email, country, password_hash, purpose) "
+                    "VALUES (?, ?, ?, ?, ?)",
+                    (name, email, country, password_hash, purpose),
+                )
+            except sqlite3.IntegrityError:
+                raise ValueError("User already exists")
+        return {
+            "user_id": cursor.lastrowid,
+            "name": name,
+            "email": email,
+            "country": country,
+            "password_hash": password_hash,
+            "purpose": purpose,
+        }
+
+    def update_password_hash(self, email: str, password_hash: str) -> bool:
+        with self._lock:
+            cursor = self._conn.execute(
+                "UPDATE users SET password_hash = ? WHERE email = ?", (password_hash, email)
+            )
+        return cursor.rowcount > 0
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+# -------------------------------
+# SQLite ingestion job backend
+# -------------------------------
+JOB_SCHEMA = """
+CREATE TABLE IF NOT EXISTS ingest_jobs (
+    job_id      TEXT PRIMARY KEY,
+    uuid        TEXT NOT NULL,
+    kind        TEXT NOT NULL,
+    priority    TEXT NOT NULL,
+    status      TEXT NOT NULL,
+    attempts    INTEGER NOT NULL DEFAULT 0,
+    pages_done  INTEGER NOT NULL DEFAULT 0,
+    pages_total INTEGER,
+    error       TEXT,
+    result      TEXT,
+    created_at  TEXT NOT NULL,
+    updated_at  TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS ingest_jobs_uuid ON ingest_jobs (uuid, status);
+"""
+
+JOB_COLUMNS = ("job_id", "uuid", "kind", "priority", "status", "attempts", "pages_done",
+               "pages_total", "error", "result", "created_at", "updated_at")
+
+
+def _job_row(row: sqlite3.Row) -> dict:
+    job = dict(row)
+    job["result"] = json.loads(job["result"]) if job["result"] is not None else None
+    return job
+
+
+class SQLiteJobStore(JobStore):
+    """
+    Jobs table in the shared SQLite file, so any worker can report on a
+    job and see that a document is still being ingested elsewhere.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._conn = connect(path)
+        self._lock = threading.Lock()
+        with self._lock:
+            self._conn.executescript(JOB_SCHEMA)
+
+    def create(self, job: dict) -> None:
+        row = {**job, "result": json.dumps(job["result"]) if job.get("result") is not None else None}
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                active = self._conn.execute(
+                    f"SELECT * FROM ingest_jobs WHERE uuid = ? AND status IN ({', '.join('?' * len(ACTIVE_STATUSES))})",
+                    (job["uuid"], *ACTIVE_STATUSES),
+                ).fetchone()
+                if active is not None:
+                    raise JobConflictError(_job_row(active))
+                self._conn.execute(
+                    f"INSERT INTO ingest_jobs ({', '.join(JOB_COLUMNS)}) "
+                    f"VALUES ({', '.join('?' * len(JOB_COLUMNS))})",
+                    tuple(row.get(column) for column in JOB_COLUMNS),
+                )
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def update(self, job_id: str, **fields) -> None:
+        columns = [column for column in fields if column in JOB_COLUMNS and column != "job_id"]
+        if "result" in fields and fields["result"] is not None:
+            fields = {**fields, "result": json.dumps(fields["result"])}
+        with self._lock:
+            self._conn.execute(
+                f"UPDATE ingest_jobs SET {', '.join(f'{column} = ?' for column in columns)} WHERE job_id = ?",
+                (*(fields[column] for column in columns), job_id),
+            )
+
+    def get(self, job_id: str) -> dict | None:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT * FROM ingest_jobs WHERE job_id = ?", (job_id,)
+            ).fetchone()
+        return _job_row(row) if row is not None else None
+
+    def active(self, uuid: str) -> dict | None:
+        with self._lock:
+            row = self._conn.execute(
+                f"SELECT * FROM ingest_jobs WHERE uuid = ? AND status IN ({', '.join('?' * len(ACTIVE_STATUSES))})",
+                (uuid, *ACTIVE_STATUSES),
+            ).fetchone()
+        return _job_row(row) if row is not None else None
+
+    def fail_active(self, error: str, updated_at: str) -> int:
+        with self._lock:
+            cursor = self._conn.execute(
+                "UPDATE ingest_jobs SET status = 'failed', error = ?, updated_at = ? "
+                f"WHERE status IN ({', '.join('?' * len(ACTIVE_STATUSES))})",
+                (error, updated_at, *ACTIVE_STATUSES),
+            )
+        return cursor.rowcount
+
+    def delete_finished(self, before: str) -> int:
+        with self._lock:
+            cursor = self._conn.execute(
+                f"DELETE FROM ingest_jobs WHERE status IN ({', '.join('?' * len(FINISHED_STATUSES))}) "
+                "AND updated_at < ?",
+                (*FINISHED_STATUSES, before),
+            )
+        return cursor.rowcount
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,76 @@
+# src/database/user_store.py
+import threading
+from abc import ABC, abstractmethod
+
+
+# -------------------------------
+# User storage interface
+# -------------------------------
+class UserStore(ABC):
+    """
+    Storage interface for registered users, keyed by email.
+    A user is a dict {user_id, name, email, country, password_hash, purpose}.
+    """
+
+    @abstractmethod
+    def __contains__(self, email: str) -> bool: ...
+
+    @abstractmethod
+    def get(self, email: str) -> dict | None:
+        """Returns the user dict, or None if the email is not registered."""
+
+    @abstractmethod
+    def add(self, name: str, email: str, country: str, password_hash: str, purpose: str = None) -> dict:
+        """
+        Stores a new user with the next free user_id and returns it.
+        Raises ValueError if the email already exists.
+        """
+
+    @abstractmethod
+    def update_password_hash(self, email: str, password_hash: str) -> bool:
+        """Replaces a user's password hash; returns False if the email is not registered."""
+
+    def close(self) -> None:
+        """Releases backend resources."""
+
+
+# -------------------------------
+# In-memory backend
+# -------------------------------
+class InMemoryUserStore(UserStore):
+    """Process-local users dict. Contents are lost on restart."""
+
+    def __init__(self):
+        self._users: dict[str, dict] = {}
+        self._next_user_id = 1
+        self._lock = threading.Lock()
+
+    def __contains__(self, email: str) -> bool:
+        return email in self._users
+
+    def get(self, email: str) -> dict | None:
+        return self._users.get(email)
+
+    def add(self, name: str, email: str, country: str, password_hash: str, purpose: str = None) -> dict:
+        with self._lock:
+            if email in self._users:
+                raise ValueError("User already exists")
+            user = {
+                "user_id": self._next_user_id,
+                "name": name,
+                "email": email,
+                "country": country,
+                "password_hash": password_hash,
+                "purpose": purpose,
+            }
+            self._users[email] = user
+            self._next_user_id += 1
+        return user
+
+    def update_password_hash(self, email: str, password_hash: str) -> bool:
+        with self._lock:
+            user = self._users.get(email)
+            if user is None:
+                return False
+            user["password_hash"] = password_hash
+        return True
@@ -1,21 +1,60 @@
-from fastapi import APIRouter, UploadFile, File, HTTPException, Form, Depends, Query
+from fastapi import APIRouter, UploadFile, File, HTTPException, Form, Depends, Query, Request
+from fastapi.responses import JSONResponse, StreamingResponse
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
+from starlette.background import BackgroundTask
+import asyncio
+import json
+import logging
+import time
 import uuid
-import os
-from typing import Optional
+from contextlib import aclosing
+from typing import Literal, Optional
 
 from src.routers.models.post_request import PostRequest
+from src.routers.models.query_models import BatchQueryRequest, MultiQueryRequest
 from src.data_store import data_store
-from src.utils.pdf_processor import extract_text_from_pdf
-from src.utils.llm_client import get_llm_response
+from src.database.document_store import DocumentExistsError, DocumentNotFoundError
+from src.database.job_store import JobConflictError
+from src.database.memory_db import job_store
+from src.services.extraction_executor import (
+    extraction_executor,
+    ExtractionQueueFull,
+    ExtractionTimeout,
+)
+from src.services.extraction_cache import extraction_cache
+from src.services.ingest_pipeline import ingest_and_store, delete_document, NORMALIZE_TEXT
+from src.services.ingest_jobs import ingest_jobs, JobQueueFull
+from src.services.password_hasher import password_hasher
+from src.services.bulk_ingest import BulkUpload
+from src.services.retrieval import retrieval_indexes, RETRIEVAL_TOP_K
+from src.services.search_index import search_index, resolve_hits, InvalidSearchQuery
+from src.services.dense_index import dense_index, ROUTE_DOCUMENTS
+from src.services.context_cache import context_cache
+from src.services.context_packer import ContextTooLargeError
+from src.services.llm_limiter import llm_limiter, LLMBusyError
+from src.services.answer_cache import answer_cache
+from src.services.query_service import (
+    user_key,
+    answer_query,
+    answer_batch,
+    answer_multi_document,
+    stream_answer,
+    select_pages,
+    pages_label,
+    query_flights,
+    MULTI_QUERY_TOKEN_BUDGET,
+)
+from src.utils.llm_client import llm_client_manager
 from src.services.jwt_service import verify_access_token
 from src.utils.filename_sanitizer import sanitize_filename
 from src.utils.uuid_utils import generate_uuid
+from src.utils.upload_reader import read_pdf_upload, InvalidPDFError, UploadTooLargeError
 
 router = APIRouter()
+logger = logging.getLogger(__name__)
 
-UPLOAD_DIR = "/tmp/cag_uploads"
-os.makedirs(UPLOAD_DIR, exist_ok=True)
+# Seconds a client is told to wait before querying a document that is still being ingested
+NOT_READY_RETRY_AFTER_SECONDS = 5
 
 # ----------------------------
 # Security Scheme
@@ -43,6 +82,112 @@ async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(s
     return payload
 
 
+# ----------------------------
+# Upload / Extraction helpers
+# ----------------------------
+async def read_upload_or_raise(file: UploadFile) -> tuple[bytes, str]:
+    """
+    Streams the upload into memory, rejecting non-PDFs (400)
+    and files over the size limit (413) before the whole body is read.
+    Returns the bytes and their SHA-256 digest.
+    """
+    if file.content_type != "application/pdf":
+        raise HTTPException(400, "Invalid file type. Only PDF files are accepted.")
+    try:
+        return await read_pdf_upload(file)
+    except UploadTooLargeError as e:
+        raise HTTPException(413, str(e))
+    except InvalidPDFError as e:
+        raise HTTPException(400, str(e))
+
+
+async def ingest_or_raise(kind: str, uuid_str: str, pdf_bytes: bytes, digest: str,
+                          file_name: str, date: str, raw: bool) -> dict:
+    """
+    Extracts, normalizes (unless `raw`), stores and indexes an upload page
+    by page (see ingest_and_store), reusing the extraction cache.
+    Maps a full queue to 503 and a slow job to 504.
+    """
+    try:
+        return await ingest_and_store(kind, uuid_str, pdf_bytes, digest, file_name, date,
+                                      normalize=NORMALIZE_TEXT and not raw)
+    except ExtractionQueueFull as e:
+        raise HTTPException(503, str(e))
+    except ExtractionTimeout as e:
+        raise HTTPException(504, str(e))
+
+
+async def submit_job_or_raise(request: Request, kind: str, uuid_str: str, pdf_bytes: bytes, digest: str,
+                              file_name: str, date: str, raw: bool, priority: str) -> JSONResponse:
+    """
+    Queues a background ingestion job and returns the 202 response.
+    Maps a full job queue to 503 and a job already running for the document to 409.
+    """
+    try:
+        job = await ingest_jobs.submit(kind, uuid_str, pdf_bytes, digest, file_name, date,
+                                       normalize=NORMALIZE_TEXT and not raw, priority=priority)
+    except JobQueueFull as e:
+        raise HTTPException(503, str(e))
+    except JobConflictError as e:
+        raise HTTPException(409, str(e))
+    status_url = str(request.url_for("get_ingestion_job", job_id=job["job_id"]))
+    return JSONResponse(
+        status_code=202,
+        headers={"Location": status_url},
+        content={
+            "message": "PDF accepted for background ingestion.",
+            "job_id": job["job_id"],
+            "uuid": uuid_str,
+            "status": job["status"],
+            "status_url": status_url,
+        },
+    )
+
+
+async def ensure_ready_or_raise(uuid_str: str) -> None:
+    """Answers 409 (with Retry-After) while a background job is ingesting the document."""
+    job = await asyncio.to_thread(job_store.active, uuid_str)
+    if job is None:
+        return
+    if job["pages_total"]:
+        progress = f"{job['pages_done']}/{job['pages_total']} pages"
+    else:
+        progress = "waiting to start" if job["status"] == "queued" else "starting"
+    raise HTTPException(
+        409,
+        f"Document {uuid_str} is not ready: ingestion job {job['job_id']} is {job['status']} ({progress}). "
+        f"Poll GET /jobs/{job['job_id']}.",
+        headers={"Retry-After": str(NOT_READY_RETRY_AFTER_SECONDS)},
+    )
+
+
+async def route_or_raise(query: str, limit: int) -> list[dict]:
+    """Routes a question to the most relevant documents; 404 if none matches."""
+    await asyncio.to_thread(dense_index.sync, data_store)
+    routed = await asyncio.to_thread(dense_index.route, query, limit)
+    if not routed:
+        raise HTTPException(404, "No stored document matches the question. Pass \"uuids\" explicitly.")
+    return routed
+
+
+async def select_pages_or_raise(uuid_str: str, spec: str | None) -> list[dict] | None:
+    """
+    Resolves the `pages` query parameter to the selected page records,
+    or None when no selection was given. Maps an invalid selection to 400.
+    """
+    if spec is None:
+        return None
+    try:
+        return select_pages(await asyncio.to_thread(data_store.get_pages, uuid_str), spec)
+    except ValueError as e:
+        raise HTTPException(400, str(e))
+
+
+def is_normalized(stored: dict) -> bool:
+    """Whether headers, footers and page numbers were removed from any segment of a stored document."""
+    return any(segment["normalized"] for segment in stored["segments"])
+
+
 # ----------------------------
 # 1) Generate UUID (Public - No Auth Required)
 # ----------------------------
@@ -62,13 +207,18 @@ async def get_uuid_for_data():
 @router.post("/upload/{uuid}", status_code=201)
 async def upload_pdf(
     uuid: uuid.UUID,
+    request: Request,
     file: UploadFile = File(...),
     file_name: Optional[str] = Form(None),
     date: Optional[str] = Form(None),
+    raw: bool = Form(False, description="Store the text exactly as extracted, without header/footer and whitespace cleanup"),
+    background: bool = Form(False, description="Answer 202 with a job id at once and ingest in the background"),
+    priority: Literal["high", "normal", "low"] = Form("normal", description="Queue priority of a background job"),
     current_user: dict = Depends(get_current_user)
 ):
     """
     Upload a PDF file and extract its text.
+    With background=true the response is 202 with a job to poll at GET /jobs/{job_id}.
     Requires JWT authentication via Bearer token.
     """
     post_request = PostRequest(
@@ -77,11 +227,9 @@ async def upload_pdf(
     )
 
     uuid_str = str(uuid)
-    
-    if file.content_type != "application/pdf":
-        raise HTTPException(400, "Invalid file type. Only PDF files are accepted.")
 
-    if uuid_str in data_store:
+    await ensure_ready_or_raise(uuid_str)
+    if await asyncio.to_thread(data_store.__contains__, uuid_str):
         raise HTTPException(
             400, 
             f"UUID {uuid_str} already exists. Use PUT /update/{uuid_str} to append data."
@@ -89,32 +237,68 @@ async def upload_pdf(
 
     raw_name = post_request.file_name or f"{uuid_str}_{post_request.date}.pdf"
     final_file_name = sanitize_filename(raw_name)
-    file_path = os.path.join(UPLOAD_DIR, final_file_name)
-    
-    try:
-        with open(file_path, "wb") as buffer:
-            buffer.write(file.file.read())
 
-        extracted_text = extract_text_from_pdf(file_path)
-        if extracted_text is None:
-            raise HTTPException(500, "Failed to extract text from PDF.")
+    pdf_bytes, digest = await read_upload_or_raise(file)
+    if background:
+        return await submit_job_or_raise(
+            request, "upload", uuid_str, pdf_bytes, digest, final_file_name, post_request.date, raw, priority
+        )
 
-        data_store[uuid_str] = {
-            "file_name": final_file_name,
-            "date": post_request.date,
-            "text": extracted_text
-        }
+    try:
+        return await ingest_or_raise("upload", uuid_str, pdf_bytes, digest, final_file_name, post_request.date, raw)
+    except DocumentExistsError:
+        raise HTTPException(
+            400,
+            f"UUID {uuid_str} already exists. Use PUT /update/{uuid_str} to append data."
+        )
 
-        return {
-            "message": "File uploaded and text extracted successfully.",
-            "uuid": uuid_str,
-            "file_name": final_file_name,
-            "date": post_request.date
-        }
 
-    finally:
-        if os.path.exists(file_path):
-            os.remove(file_path)
+# ----------------------------
+# 2a) Bulk Upload Many PDFs or ZIP Archives (JWT Protected)
+# ----------------------------
+@router.post("/upload_bulk")
+async def upload_pdfs_bulk(
+    files: list[UploadFile] = File(..., description="PDFs and/or ZIP archives of PDFs"),
+    date: Optional[str] = Form(None),
+    raw: bool = Form(False, description="Store the text exactly as extracted, without header/footer and whitespace cleanup"),
+    current_user: dict = Depends(get_current_user)
+):
+    """
+    Upload many PDFs at once, each stored under a new UUID.
+    Parts may be PDFs or ZIP archives of PDFs; the PDFs are extracted in
+    parallel across the extraction workers. The response is NDJSON: one
+    line per PDF as soon as it is stored (the single upload response plus
+    "index" and "status" 201, or "status" and "detail" on failure), then
+    a final {"summary": ...} line.
+    Requires JWT authentication via Bearer token.
+    """
+    post_request = PostRequest(date=date)
+    bulk = BulkUpload(files, post_request.date, normalize=NORMALIZE_TEXT and not raw)
+    # The form files may be closed once this function returns, before the stream is read
+    await bulk.spool()
+
+    async def lines():
+        started = time.perf_counter()
+        async with aclosing(bulk.results()) as results:
+            async for result in results:
+                yield json.dumps(result) + "\n"
+        seconds = time.perf_counter() - started
+        files_done = bulk.succeeded + bulk.failed
+        yield json.dumps({"summary": {
+            "files": files_done,
+            "succeeded": bulk.succeeded,
+            "failed": bulk.failed,
+            "concurrency": bulk.concurrency,
+            "seconds": round(seconds, 3),
+            "files_per_second": round(files_done / seconds, 2) if seconds else None,
+        }}) + "\n"
+
+    return StreamingResponse(
+        lines(),
+        media_type="application/x-ndjson",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        background=BackgroundTask(bulk.close),
+    )
 
 
 # ----------------------------
@@ -123,13 +307,18 @@ async def upload_pdf(
 @router.put("/update/{uuid}")
 async def update_pdf_data(
     uuid: uuid.UUID,
+    request: Request,
     file: UploadFile = File(...),
     file_name: Optional[str] = Form(None),
     date: Optional[str] = Form(None),
+    raw: bool = Form(False, description="Store the text exactly as extracted, without header/footer and whitespace cleanup"),
+    background: bool = Form(False, description="Answer 202 with a job id at once and ingest in the background"),
+    priority: Literal["high", "normal", "low"] = Form("normal", description="Queue priority of a background job"),
     current_user: dict = Depends(get_current_user)
 ):
     """
     Append new PDF text to existing UUID data.
+    With background=true the response is 202 with a job to poll at GET /jobs/{job_id}.
     Requires JWT authentication via Bearer token.
     """
     post_request = PostRequest(
@@ -139,36 +328,43 @@ async def update_pdf_data(
 
     uuid_str = str(uuid)
 
-    if file.content_type != "application/pdf":
-        raise HTTPException(400, "Invalid file type. Only PDF files are accepted.")
-
-    if uuid_str not in data_store:
+    await ensure_ready_or_raise(uuid_str)
+    if not await asyncio.to_thread(data_store.__contains__, uuid_str):
         raise HTTPException(404, f"UUID {uuid_str} not found. Upload first.")
     
     raw_name = post_request.file_name or f"{uuid_str}_{post_request.date}.pdf"
     final_file_name = sanitize_filename(raw_name)
-    file_path = os.path.join(UPLOAD_DIR, final_file_name)
-
-    try:
-        with open(file_path, "wb") as buffer:
-            buffer.write(file.file.read())
 
-        new_text = extract_text_from_pdf(file_path)
-        if new_text is None:
-            raise HTTPException(500, "Failed to extract text from PDF.")
+    pdf_bytes, digest = await read_upload_or_raise(file)
+    if background:
+        return await submit_job_or_raise(
+            request, "update", uuid_str, pdf_bytes, digest, final_file_name, post_request.date, raw, priority
+        )
 
-        data_store[uuid_str]["text"] += "\n\n" + new_text
+    try:
+        return await ingest_or_raise("update", uuid_str, pdf_bytes, digest, final_file_name, post_request.date, raw)
+    except DocumentNotFoundError:
+        raise HTTPException(404, f"UUID {uuid_str} not found. Upload first.")
 
-        return {
-            "message": "New PDF text appended successfully.",
-            "uuid": uuid_str,
-            "file_name": final_file_name,
-            "date": post_request.date
-        }
 
-    finally:
-        if os.path.exists(file_path):
-            os.remove(file_path)
+# ----------------------------
+# 3a) Background Ingestion Job Status (JWT Protected)
+# ----------------------------
+@router.get("/jobs/{job_id}")
+async def get_ingestion_job(
+    job_id: uuid.UUID,
+    current_user: dict = Depends(get_current_user)
+):
+    """
+    Report the state of a background upload or update: queued, running,
+    succeeded or failed, with pages done out of the total, the attempts
+    made, the last error and, once succeeded, the upload response.
+    Requires JWT authentication via Bearer token.
+    """
+    job = await asyncio.to_thread(job_store.get, str(job_id))
+    if job is None:
+        raise HTTPException(404, f"Job {job_id} not found.")
+    return job
 
 
 # ----------------------------
@@ -178,6 +374,13 @@ async def update_pdf_data(
 async def query_data(
     uuid: uuid.UUID,
     query: str = Query(..., description="The question you want to ask"),
+    mode: Literal["full", "retrieve"] = Query(
+        "full", description="full: send the whole document; retrieve: send only the best BM25 chunks"
+    ),
+    top_k: int = Query(RETRIEVAL_TOP_K, ge=1, le=50, description="Chunks to send in retrieve mode"),
+    pages: Optional[str] = Query(
+        None, description="Limit the context to these pages, e.g. 3-9 or 1,4-6 (1-based, inclusive)"
+    ),
     current_user: dict = Depends(get_current_user)
 ):
     """
@@ -185,19 +388,207 @@ async def query_data(
     Requires JWT authentication via Bearer token.
     """
     uuid_str = str(uuid)
-    
-    if uuid_str not in data_store:
+
+    await ensure_ready_or_raise(uuid_str)
+    stored = await asyncio.to_thread(data_store.get, uuid_str)
+    if stored is None:
         raise HTTPException(404, f"UUID {uuid_str} not found.")
+    selected_pages = await select_pages_or_raise(uuid_str, pages)
 
-    stored = data_store[uuid_str]
-    llm_response = get_llm_response(context=stored["text"], query=query)
+    try:
+        answer = await answer_query(
+            uuid_str, stored, query, user_key(current_user), mode, top_k, selected_pages
+        )
+    except ContextTooLargeError as e:
+        raise HTTPException(413, str(e))
+    except LLMBusyError as e:
+        raise HTTPException(503, str(e))
 
     return {
         "uuid": uuid_str,
         "file_name": stored["file_name"],
         "date": stored["date"],
+        "normalized": is_normalized(stored),
         "query": query,
-        "llm_response": llm_response
+        "mode": mode,
+        "pages": pages_label(selected_pages) if selected_pages else None,
+        "context_chars": answer["context_chars"],
+        "context_tokens": answer["context_tokens"],
+        "truncated": answer["truncated"],
+        "cached": answer["cached"],
+        "coalesced": answer["coalesced"],
+        "llm_response": answer["llm_response"]
+    }
+
+
+# ----------------------------
+# 4a) Batch Questions on One Document (JWT Protected)
+# ----------------------------
+@router.post("/query/{uuid}/batch")
+async def batch_query_data(
+    uuid: uuid.UUID,
+    batch: BatchQueryRequest,
+    current_user: dict = Depends(get_current_user)
+):
+    """
+    Answer a list of questions about one document with bounded concurrency.
+    With pack_size > 1 several questions share one LLM call.
+    Requires JWT authentication via Bearer token.
+    """
+    uuid_str = str(uuid)
+
+    await ensure_ready_or_raise(uuid_str)
+    stored = await asyncio.to_thread(data_store.get, uuid_str)
+    if stored is None:
+        raise HTTPException(404, f"UUID {uuid_str} not found.")
+
+    try:
+        answers = await answer_batch(
+            uuid_str,
+            stored,
+            batch.questions,
+            user_key(current_user),
+            batch.mode,
+            batch.top_k,
+            batch.pack_size,
+        )
+    except ContextTooLargeError as e:
+        raise HTTPException(413, str(e))
+
+    return {
+        "uuid": uuid_str,
+        "file_name": stored["file_name"],
+        "date": stored["date"],
+        "normalized": is_normalized(stored),
+        "mode": batch.mode,
+        "pack_size": batch.pack_size,
+        **answers
+    }
+
+
+# ----------------------------
+# 4b) Stream Query Answer as Server-Sent Events (JWT Protected)
+# ----------------------------
+def format_sse(event: str, data: dict) -> str:
+    """Formats one server-sent event."""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+@router.get("/query/{uuid}/stream")
+async def stream_query_data(
+    uuid: uuid.UUID,
+    request: Request,
+    query: str = Query(..., description="The question you want to ask"),
+    mode: Literal["full", "retrieve"] = Query(
+        "full", description="full: send the whole document; retrieve: send only the best BM25 chunks"
+    ),
+    top_k: int = Query(RETRIEVAL_TOP_K, ge=1, le=50, description="Chunks to send in retrieve mode"),
+    pages: Optional[str] = Query(
+        None, description="Limit the context to these pages, e.g. 3-9 or 1,4-6 (1-based, inclusive)"
+    ),
+    current_user: dict = Depends(get_current_user)
+):
+    """
+    Stream the LLM answer as server-sent events while it is generated.
+    Sends `token` events with text chunks and a final `done` event with
+    `tokens_used`; failures after the stream started arrive as an `error` event.
+    If the client disconnects, the upstream generation is cancelled.
+    Requires JWT authentication via Bearer token.
+    """
+    uuid_str = str(uuid)
+
+    await ensure_ready_or_raise(uuid_str)
+    stored = await asyncio.to_thread(data_store.get, uuid_str)
+    if stored is None:
+        raise HTTPException(404, f"UUID {uuid_str} not found.")
+    selected_pages = await select_pages_or_raise(uuid_str, pages)
+
+    user = user_key(current_user)
+
+    async def event_stream():
+        try:
+            async with aclosing(stream_answer(uuid_str, stored, query, user, mode, top_k, selected_pages)) as events:
+                async for event in events:
+                    if await request.is_disconnected():
+                        break
+                    if "text" in event:
+                        yield format_sse("token", {"text": event["text"]})
+                    else:
+                        yield format_sse("done", {
+                            "uuid": uuid_str,
+                            "normalized": is_normalized(stored),
+                            "mode": mode,
+                            "cached": event["cached"],
+                            "tokens_used": event["tokens_used"],
+                        })
+        except ContextTooLargeError as e:
+            yield format_sse("error", {"status": 413, "detail": str(e)})
+        except LLMBusyError as e:
+            yield format_sse("error", {"status": 503, "detail": str(e)})
+        except Exception as e:
+            logger.exception("Streaming query for %s failed: %s", uuid_str, e)
+            yield format_sse("error", {"status": 502, "detail": "LLM request failed."})
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+# ----------------------------
+# 4c) Query Across Several Documents (JWT Protected)
+# ----------------------------
+@router.post("/query/multi")
+async def multi_query_data(
+    request: MultiQueryRequest,
+    current_user: dict = Depends(get_current_user)
+):
+    """
+    Answer one question from the best passages of several documents.
+    Without "uuids" the question is routed to the "route_documents" most
+    relevant documents first.
+    The answer cites passages as [S1], [S2], ... listed in "sources".
+    Requires JWT authentication via Bearer token.
+    """
+    routed = None
+    if request.uuids:
+        uuids = list(dict.fromkeys(str(u) for u in request.uuids))
+    else:
+        routed = await route_or_raise(request.query, request.route_documents)
+        uuids = [document["uuid"] for document in routed]
+    for uuid_str in uuids:
+        await ensure_ready_or_raise(uuid_str)
+    stored_documents = await asyncio.gather(*(asyncio.to_thread(data_store.get, uuid_str) for uuid_str in uuids))
+    documents = dict(zip(uuids, stored_documents))
+    missing = [uuid_str for uuid_str, stored in documents.items() if stored is None]
+    if missing and routed is not None:
+        # Deleted since routing
+        documents = {uuid_str: stored for uuid_str, stored in documents.items() if stored is not None}
+        uuids = list(documents)
+        missing = [] if documents else missing
+    if missing:
+        raise HTTPException(404, f"UUIDs not found: {', '.join(missing)}")
+
+    try:
+        answer = await answer_multi_document(
+            documents,
+            request.query,
+            user_key(current_user),
+            request.top_k,
+            request.token_budget or MULTI_QUERY_TOKEN_BUDGET,
+        )
+    except LLMBusyError as e:
+        raise HTTPException(503, str(e))
+
+    return {
+        "uuids": uuids,
+        "routed": routed,
+        "query": request.query,
+        "context_chars": answer["context_chars"],
+        "context_tokens": answer["context_tokens"],
+        "sources": answer["sources"],
+        "llm_response": answer["llm_response"]
     }
 
 
@@ -214,12 +605,11 @@ async def delete_data(
     Requires JWT authentication via Bearer token.
     """
     uuid_str = str(uuid)
-    
-    if uuid_str not in data_store:
+
+    deleted = await delete_document(uuid_str)
+    if deleted is None:
         raise HTTPException(404, f"UUID {uuid_str} not found.")
 
-    deleted = data_store.pop(uuid_str)
-    
     return {
         "message": f"Data for UUID {uuid_str} deleted successfully.",
         "file_name": deleted["file_name"],
@@ -236,12 +626,80 @@ async def list_all_uuids(current_user: dict = Depends(get_current_user)):
     List all stored UUIDs with their metadata.
     Requires JWT authentication via Bearer token.
     """
-    result = []
-    for uuid_key, data in data_store.items():
-        result.append({
-            "uuid": uuid_key,
-            "file_name": data["file_name"],
-            "date": data["date"]
-        })
-    
-    return {"items": result}
\ No newline at end of file
+    return {"items": await asyncio.to_thread(data_store.list_metadata)}
+
+
+# ----------------------------
+# 6a) Full-Text Search Across All Documents (JWT Protected)
+# ----------------------------
+@router.get("/search")
+async def search_documents(
+    q: str = Query(..., min_length=1, max_length=500, description='Words, "exact phrases" and prefix* terms; all must match'),
+    limit: int = Query(10, ge=1, le=100, description="Maximum number of results"),
+    current_user: dict = Depends(get_current_user)
+):
+    """
+    Search the text of every stored document without calling the LLM.
+    Returns ranked matches with their UUID, page, character offset and a snippet.
+    Requires JWT authentication via Bearer token.
+    """
+    await asyncio.to_thread(search_index.sync, data_store)
+    try:
+        hits = await asyncio.to_thread(search_index.search, q, limit)
+    except InvalidSearchQuery as e:
+        raise HTTPException(400, str(e))
+    results = await asyncio.to_thread(resolve_hits, data_store, hits)
+
+    return {
+        "query": q,
+        "count": len(results),
+        "results": results
+    }
+
+
+# ----------------------------
+# 6b) Route a Question to Documents (JWT Protected)
+# ----------------------------
+@router.get("/route")
+async def route_question(
+    q: str = Query(..., min_length=1, max_length=2000, description="Question to find documents for"),
+    limit: int = Query(ROUTE_DOCUMENTS, ge=1, le=100, description="Maximum number of documents"),
+    current_user: dict = Depends(get_current_user)
+):
+    """
+    Rank stored documents by how closely their best chunk matches a question,
+    without calling the LLM. POST /query/multi without "uuids" routes this way.
+    Requires JWT authentication via Bearer token.
+    """
+    await asyncio.to_thread(dense_index.sync, data_store)
+    documents = await asyncio.to_thread(dense_index.route, q, limit)
+    return {
+        "query": q,
+        "documents": documents
+    }
+
+
+# ----------------------------
+# 7) Runtime Stats (JWT Protected)
+# ----------------------------
+@router.get("/stats")
+async def runtime_stats(current_user: dict = Depends(get_current_user)):
+    """
+    Report extraction queue depth, job wait times and document store usage.
+    Requires JWT authentication via Bearer token.
+    """
+    return {
+        "extraction": extraction_executor.stats(),
+        "extraction_cache": extraction_cache.stats(),
+        "document_store": await asyncio.to_thread(data_store.stats),
+        "retrieval_indexes": retrieval_indexes.stats(),
+        "search_index": search_index.stats(),
+        "dense_index": dense_index.stats(),
+        "ingest_jobs": ingest_jobs.stats(),
+        "password_hasher": password_hasher.stats(),
+        "context_cache": context_cache.stats(),
+        "llm_client": llm_client_manager.stats(),
+        "llm_limiter": llm_limiter.stats(),
+        "answer_cache": answer_cache.stats(),
+        "query_coalescing": query_flights.stats(),
+    }
@@ -0,0 +1,40 @@
+# src/routers/models/query_models.py
+from typing import Literal
+from uuid import UUID
+from pydantic import BaseModel, Field
+
+# -------------------------------
+# 1. Batch Query Model
+# -------------------------------
+class BatchQueryRequest(BaseModel):
+    # Checklist of questions about the same document
+    questions: list[str] = Field(..., min_length=1, max_length=100)
+
+    # full: whole document as context; retrieve: best BM25 chunks only
+    mode: Literal["full", "retrieve"] = "full"
+
+    # Chunks per question in retrieve mode
+    top_k: int = Field(8, ge=1, le=50)
+
+    # Questions answered by one LLM call (1 = one call per question)
+    pack_size: int = Field(1, ge=1, le=20)
+
+
+# -------------------------------
+# 2. Multi-Document Query Model
+# -------------------------------
+class MultiQueryRequest(BaseModel):
+    # Documents to answer from (None = route the question to the most relevant documents)
+    uuids: list[UUID] | None = Field(None, min_length=1, max_length=20)
+
+    # Documents picked by routing when no UUIDs are given
+    route_documents: int = Field(5, ge=1, le=20)
+
+    # The question you want to ask across all documents
+    query: str = Field(..., min_length=1)
+
+    # Passages considered per document
+    top_k: int = Field(5, ge=1, le=50)
+
+    # Token budget shared by the passages of all documents (None = server default)
+    token_budget: int | None = Field(None, ge=100, le=200_000)
@@ -2,6 +2,7 @@
 from fastapi import APIRouter, Depends, HTTPException
 from src.routers.models.user_models import SignupModel, LoginModel, UserResponseModel
 from src.services.user_service import create_user, authenticate_user
+from src.services.password_hasher import PasswordHasherBusy
 from src.services.jwt_service import create_access_token
 
 router = APIRouter()
@@ -10,9 +11,9 @@ router = APIRouter()
 # 1. User Signup 
 # -------------------------------
 @router.post("/signup", response_model=UserResponseModel)
-def signup(user: SignupModel = Depends(SignupModel.as_form)):
+async def signup(user: SignupModel = Depends(SignupModel.as_form)):
     try:
-        new_user = create_user(
+        new_user = await create_user(
             name=user.name,
             email=user.email,
             country=user.country,
@@ -28,14 +29,19 @@ def signup(user: SignupModel = Depends(SignupModel.as_form)):
 
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
+    except PasswordHasherBusy as e:
+        raise HTTPException(status_code=503, detail=str(e))
 
 
 # -------------------------------
 # 2. User Login
 # -------------------------------
 @router.post("/login")
-def login(user: LoginModel = Depends(LoginModel.as_form)):
-    authenticated_user = authenticate_user(user.email, user.password)
+async def login(user: LoginModel = Depends(LoginModel.as_form)):
+    try:
+        authenticated_user = await authenticate_user(user.email, user.password)
+    except PasswordHasherBusy as e:
+        raise HTTPException(status_code=503, detail=str(e))
 
     if not authenticated_user:
         raise HTTPException(status_code=401, detail="Invalid email or password")
@@ -0,0 +1,138 @@
+# src/services/answer_cache.py
+import os
+import re
+import sys
+import threading
+import time
+from collections import OrderedDict
+
+from dotenv import load_dotenv, find_dotenv
+
+load_dotenv(find_dotenv())
+
+# -------------------------------
+# Config
+# -------------------------------
+ANSWER_CACHE_MAX_ENTRIES = int(os.getenv("ANSWER_CACHE_MAX_ENTRIES", "10000"))
+ANSWER_CACHE_MAX_BYTES = int(os.getenv("ANSWER_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+ANSWER_CACHE_TTL_SECONDS = int(os.getenv("ANSWER_CACHE_TTL_SECONDS", "3600"))
+
+PUNCTUATION_PATTERN = re.compile(r"[^\w\s]")
+WHITESPACE_PATTERN = re.compile(r"\s+")
+
+
+def normalize_query(query: str) -> str:
+    """Lowercases a query, drops punctuation and collapses whitespace."""
+    query = PUNCTUATION_PATTERN.sub(" ", query.lower())
+    return WHITESPACE_PATTERN.sub(" ", query).strip()
+
+
+def _entry_size(key: tuple, value: dict) -> int:
+    """Approximate memory held by one entry (key strings + answer text)."""
+    text = value.get("llm_response", {}).get("text") or ""
+    return sum(sys.getsizeof(part) for part in key) + sys.getsizeof(text) + 200
+
+
+class AnswerCache:
+    """
+    LRU + TTL cache of LLM answers.
+
+    Keys are (document UUID, document version, query options, normalized
+    query), so an answer is never served for a different version of the
+    document. Versions only increase, so caching an answer for a new
+    version drops the document's answers for older ones, including
+    those left behind by a delete or append in another worker. Size is
+    bounded both by entry count and approximate bytes.
+    `invalidate(uuid)` drops every answer of a document at once.
+    """
+
+    def __init__(self, max_entries: int, max_bytes: int, ttl_seconds: int):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self._entries: OrderedDict[tuple, tuple[float, int, dict]] = OrderedDict()
+        self._keys_by_uuid: dict[str, set[tuple]] = {}
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    @staticmethod
+    def make_key(uuid: str, version: int, query: str, options: str = "") -> tuple:
+        return (uuid, version, options, normalize_query(query))
+
+    def get(self, key: tuple) -> dict | None:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            expires_at, _, value = entry
+            if expires_at <= time.time():
+                self._remove(key)
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key: tuple, value: dict) -> None:
+        size = _entry_size(key, value)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            for stale in [k for k in self._keys_by_uuid.get(key[0], ()) if k[1] != key[1]]:
+                self._remove(stale)
+            self._remove(key)
+            self._entries[key] = (time.time() + self.ttl_seconds, size, value)
+            self._keys_by_uuid.setdefault(key[0], set()).add(key)
+            self._bytes += size
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+                self.evictions += 1
+
+    def invalidate(self, uuid: str) -> None:
+        """Drops all cached answers of a document."""
+        with self._lock:
+            for key in list(self._keys_by_uuid.get(uuid, ())):
+                self._remove(key)
+
+    def _remove(self, key: tuple) -> None:
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        self._bytes -= entry[1]
+        keys = self._keys_by_uuid.get(key[0])
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._keys_by_uuid[key[0]]
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "documents": len(self._keys_by_uuid),
+                "bytes": self._bytes,
+                "max_entries": self.max_entries,
+                "max_bytes": self.max_bytes,
+                "ttl_seconds": self.ttl_seconds,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": round(self.hits / lookups, 3) if lookups else 0.0,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+            }
+
+
+answer_cache = AnswerCache(
+    max_entries=ANSWER_CACHE_MAX_ENTRIES,
+    max_bytes=ANSWER_CACHE_MAX_BYTES,
+    ttl_seconds=ANSWER_CACHE_TTL_SECONDS,
+)
@@ -0,0 +1,287 @@
+# src/services/bulk_ingest.py
+import asyncio
+import hashlib
+import logging
+import os
+import shutil
+import tempfile
+import zipfile
+from collections.abc import AsyncIterator
+from dataclasses import dataclass
+
+from dotenv import load_dotenv, find_dotenv
+from fastapi import UploadFile
+from pypdf.errors import PdfReadError
+
+from src.services.extraction_executor import extraction_executor, ExtractionQueueFull, ExtractionTimeout
+from src.services.ingest_pipeline import ingest_and_store, NORMALIZE_TEXT
+from src.utils.filename_sanitizer import sanitize_filename
+from src.utils.upload_reader import (
+    read_pdf_upload,
+    InvalidPDFError,
+    UploadTooLargeError,
+    MAX_UPLOAD_BYTES,
+    PDF_MAGIC,
+    PDF_HEADER_WINDOW,
+    UPLOAD_CHUNK_SIZE,
+)
+from src.utils.uuid_utils import generate_uuid
+
+load_dotenv(find_dotenv())
+logger = logging.getLogger(__name__)
+
+# -------------------------------
+# Config
+# -------------------------------
+# PDFs of one bulk upload ingested at the same time (0: two per extraction worker)
+BULK_UPLOAD_CONCURRENCY = int(os.getenv("BULK_UPLOAD_CONCURRENCY", "0"))
+# PDFs accepted per bulk upload, counting the members of ZIP archives
+BULK_UPLOAD_MAX_FILES = int(os.getenv("BULK_UPLOAD_MAX_FILES", "1000"))
+
+ZIP_MAGIC = b"PK\x03\x04"
+# Bytes of a spooled part kept in memory before it rolls over to disk (as Starlette does)
+SPOOL_MAX_MEMORY = 1024 * 1024
+
+
+class TooManyFilesError(ValueError):
+    """Raised for the PDFs of a bulk upload past BULK_UPLOAD_MAX_FILES."""
+
+
+@dataclass
+class BulkItem:
+    """One PDF of a bulk upload: a multipart part, or a member of a ZIP part."""
+    index: int
+    name: str
+    upload: UploadFile | None = None
+    archive: zipfile.ZipFile | None = None
+    archive_name: str | None = None
+    member: zipfile.ZipInfo | None = None
+
+
+def spool_upload(file: UploadFile) -> UploadFile:
+    """
+    Copies an uploaded part into a temporary file the caller owns and
+    returns it as a new UploadFile with the same name and headers.
+    Blocking; run it in a thread from async code.
+    """
+    spooled = tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_MEMORY)
+    try:
+        file.file.seek(0)
+        shutil.copyfileobj(file.file, spooled, UPLOAD_CHUNK_SIZE)
+        spooled.seek(0)
+    except BaseException:
+        spooled.close()
+        raise
+    return UploadFile(spooled, size=file.size, filename=file.filename, headers=file.headers)
+
+
+def is_zip_upload(file: UploadFile) -> bool:
+    """Tells a ZIP part from a PDF part by its first bytes (the spooled file is rewound)."""
+    head = file.file.read(len(ZIP_MAGIC))
+    file.file.seek(0)
+    return head == ZIP_MAGIC
+
+
+def pdf_members(archive: zipfile.ZipFile) -> list[zipfile.ZipInfo]:
+    """PDF members of an archive in archive order, skipping folders and macOS resource forks."""
+    return [
+        info for info in archive.infolist()
+        if not info.is_dir()
+        and info.filename.lower().endswith(".pdf")
+        and not info.filename.startswith("__MACOSX/")
+    ]
+
+
+def read_member(archive: zipfile.ZipFile, info: zipfile.ZipInfo, max_bytes: int) -> tuple[bytes, str]:
+    """
+    Reads one archive member and returns (bytes, SHA-256 hex digest).
+    The declared size is checked before anything is decompressed; zipfile
+    stops at the declared size, so a forged header cannot inflate past it.
+    Raises UploadTooLargeError, InvalidPDFError or zipfile.BadZipFile.
+    """
+    if info.file_size > max_bytes:
+        raise UploadTooLargeError(f"File is larger than the {max_bytes // (1024 * 1024)} MB upload limit.")
+    with archive.open(info) as member:
+        data = member.read(max_bytes + 1)
+    if not data:
+        raise InvalidPDFError("Uploaded file is empty.")
+    if PDF_MAGIC not in data[:PDF_HEADER_WINDOW]:
+        raise InvalidPDFError("Uploaded file is not a valid PDF.")
+    return data, hashlib.sha256(data).hexdigest()
+
+
+def error_status(error: Exception) -> int:
+    """HTTP status the single-file upload endpoint would answer for `error`."""
+    if isinstance(error, (UploadTooLargeError, TooManyFilesError)):
+        return 413
+    if isinstance(error, (InvalidPDFError, PdfReadError, zipfile.BadZipFile)):
+        return 400
+    if isinstance(error, ExtractionQueueFull):
+        return 503
+    if isinstance(error, ExtractionTimeout):
+        return 504
+    return 500
+
+
+class BulkUpload:
+    """
+    Ingests every PDF of a bulk upload under a new UUID each and reports
+    them as they finish.
+
+    Parts are either PDFs or ZIP archives of PDFs. Starlette has already
+    spooled the parts to temporary files, and a ZIP part is read through
+    its central directory one member at a time, so only the PDFs being
+    ingested are held in memory. Up to `concurrency` PDFs run the upload
+    pipeline at once; with two per extraction worker, one document can be
+    stored and indexed while the next one is being parsed, so files per
+    second grow with EXTRACTION_WORKERS. The concurrency is capped so
+    that the windows the documents stream through the process pool fit
+    its queue.
+
+    Results come out in completion order, one dict per PDF: the
+    single-file upload response plus "index" and "status" (201), or
+    {"index", "file_name", "status", "detail"} with the status the
+    single-file endpoint would answer. A failed PDF does not stop the
+    others.
+    """
+
+    def __init__(self, files: list[UploadFile], date: str, normalize: bool = NORMALIZE_TEXT,
+                 concurrency: int = BULK_UPLOAD_CONCURRENCY, max_files: int = BULK_UPLOAD_MAX_FILES):
+        self.files = files
+        self.date = date
+        self.normalize = normalize
+        pool_capacity = (extraction_executor.workers + extraction_executor.queue_size) // extraction_executor.workers
+        self.concurrency = max(1, min(concurrency or 2 * extraction_executor.workers, pool_capacity))
+        self.max_files = max_files
+        self.spooled = False
+        self.succeeded = 0
+        self.failed = 0
+
+    async def spool(self) -> None:
+        """Takes its own copy of every part; call it before the endpoint returns."""
+        spooled = []
+        try:
+            for file in self.files:
+                spooled.append(await asyncio.to_thread(spool_upload, file))
+        except BaseException:
+            for file in spooled:
+                file.file.close()
+            raise
+        self.files = spooled
+        self.spooled = True
+
+    def close(self) -> None:
+        """Removes the spooled copies; safe to call more than once."""
+        if self.spooled:
+            for file in self.files:
+                file.file.close()
+
+    def _items(self, archives: list[zipfile.ZipFile]) -> list[BulkItem | dict]:
+        """
+        Lists the PDFs to ingest in upload order. Parts that cannot be
+        listed (an unreadable archive) and PDFs past `max_files` become
+        error results. Opened archives are added to `archives`.
+        """
+        items: list[BulkItem | dict] = []
+        for file in self.files:
+            name = file.filename or "file.pdf"
+            if not is_zip_upload(file):
+                items.append(BulkItem(len(items), name, upload=file))
+                continue
+            try:
+                archive = zipfile.ZipFile(file.file)
+            except zipfile.BadZipFile as e:
+                items.append({"index": len(items), "file_name": name, "status": 400,
+                              "detail": f"Unreadable ZIP archive: {e}"})
+                continue
+            archives.append(archive)
+            for info in pdf_members(archive):
+                items.append(BulkItem(len(items), info.filename, archive=archive, archive_name=name, member=info))
+
+        for item in items[self.max_files:]:
+            if isinstance(item, BulkItem):
+                items[item.index] = self._failure(item, TooManyFilesError(
+                    f"Bulk uploads are limited to {self.max_files} PDFs; upload the rest separately."
+                ))
+        return items
+
+    async def _read(self, item: BulkItem) -> tuple[bytes, str]:
+        if item.upload is None:
+            return await asyncio.to_thread(read_member, item.archive, item.member, MAX_UPLOAD_BYTES)
+        if item.upload.content_type not in (None, "application/pdf", "application/octet-stream"):
+            raise InvalidPDFError("Invalid file type. Only PDF files are accepted.")
+        return await read_pdf_upload(item.upload)
+
+    async def _ingest(self, item: BulkItem, pdf_bytes: bytes, digest: str) -> dict:
+        uuid_str = generate_uuid()
+        file_name = sanitize_filename(os.path.basename(item.name) or f"{uuid_str}_{self.date}.pdf")
+        result = await ingest_and_store("upload", uuid_str, pdf_bytes, digest, file_name, self.date, self.normalize)
+        if item.archive_name is not None:
+            result["archive"] = item.archive_name
+        return {"index": item.index, "status": 201, **result}
+
+    def _failure(self, item: BulkItem, error: Exception) -> dict:
+        status = error_status(error)
+        if status == 500:
+            logger.error("Bulk upload of %s failed", item.name, exc_info=error)
+        failure = {"index": item.index, "file_name": item.name, "status": status,
+                   "detail": str(error) if status != 500 else "Ingestion failed."}
+        if item.archive_name is not None:
+            failure["archive"] = item.archive_name
+        return failure
+
+    async def results(self) -> AsyncIterator[dict]:
+        """
+        Yields one result per PDF as it finishes, in completion order.
+        Closing the generator cancels the PDFs still running.
+        """
+        archives: list[zipfile.ZipFile] = []
+        items = await asyncio.to_thread(self._items, archives)
+        done: asyncio.Queue[dict] = asyncio.Queue()
+        slots = asyncio.Semaphore(self.concurrency)
+        tasks: set[asyncio.Task] = set()
+
+        async def run(item: BulkItem, pdf_bytes: bytes, digest: str) -> None:
+            try:
+                result = await self._ingest(item, pdf_bytes, digest)
+            except Exception as e:
+                result = self._failure(item, e)
+            finally:
+                slots.release()
+            done.put_nowait(result)
+
+        async def feed() -> None:
+            # The next PDF is read only once a slot is free, so at most
+            # `concurrency` PDFs are held in memory at a time
+            for item in items:
+                if isinstance(item, dict):
+                    done.put_nowait(item)
+                    continue
+                await slots.acquire()
+                try:
+                    pdf_bytes, digest = await self._read(item)
+                except Exception as e:
+                    slots.release()
+                    done.put_nowait(self._failure(item, e))
+                    continue
+                task = asyncio.create_task(run(item, pdf_bytes, digest))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+
+        feeder = asyncio.create_task(feed())
+        try:
+            for _ in items:
+                result = await done.get()
+                if result["status"] == 201:
+                    self.succeeded += 1
+                else:
+                    self.failed += 1
+                yield result
+        finally:
+            pending = [feeder, *tasks]
+            for task in pending:
+                task.cancel()
+            await asyncio.gather(*pending, return_exceptions=True)
+            for archive in archives:
+                archive.close()
+            self.close()
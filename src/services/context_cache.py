@@ -0,0 +1,215 @@
+# src/services/context_cache.py
+import hashlib
+import logging
+import os
+import threading
+import time
+from abc import ABC, abstractmethod
+
+from dotenv import load_dotenv, find_dotenv
+
+from src.utils.llm_client import MODEL, build_system_instruction, get_genai_client
+
+load_dotenv(find_dotenv())
+logger = logging.getLogger(__name__)
+
+# -------------------------------
+# Config
+# -------------------------------
+CONTEXT_CACHE_BACKEND = os.getenv("CONTEXT_CACHE_BACKEND", "gemini")  # gemini | local | none
+CONTEXT_CACHE_TTL_SECONDS = int(os.getenv("CONTEXT_CACHE_TTL_SECONDS", "3600"))
+# Gemini refuses caches below a minimum token count, and tiny contexts gain nothing
+CONTEXT_CACHE_MIN_CHARS = int(os.getenv("CONTEXT_CACHE_MIN_CHARS", "16000"))
+# Stop using a handle this long before it expires so no query races the expiry
+CONTEXT_CACHE_EXPIRY_MARGIN_SECONDS = 30
+
+
+# -------------------------------
+# Backends
+# -------------------------------
+class ContextCacheBackend(ABC):
+    """Registers a context prefix with an LLM backend and returns a handle name."""
+
+    @abstractmethod
+    def create(self, display_name: str, system_instruction: str, ttl_seconds: int) -> str: ...
+
+    @abstractmethod
+    def delete(self, name: str) -> None: ...
+
+
+class GeminiContextCacheBackend(ContextCacheBackend):
+    """Explicit context caching through the Gemini `caches` API."""
+
+    def create(self, display_name: str, system_instruction: str, ttl_seconds: int) -> str:
+        from google.genai import types
+
+        cached = get_genai_client().caches.create(
+            model=MODEL,
+            config=types.CreateCachedContentConfig(
+                display_name=display_name,
+                system_instruction=system_instruction,
+                ttl=f"{ttl_seconds}s",
+            ),
+        )
+        return cached.name
+
+    def delete(self, name: str) -> None:
+        get_genai_client().caches.delete(name=name)
+
+
+class LocalContextCacheBackend(ContextCacheBackend):
+    """
+    In-process stand-in for the Gemini cache API, for tests and offline
+    development. `resolve` returns the instruction registered under a handle.
+    """
+
+    def __init__(self):
+        self._entries: dict[str, str] = {}
+        self._counter = 0
+        self._lock = threading.Lock()
+
+    def create(self, display_name: str, system_instruction: str, ttl_seconds: int) -> str:
+        with self._lock:
+            self._counter += 1
+            name = f"cachedContents/local-{self._counter}"
+            self._entries[name] = system_instruction
+        return name
+
+    def delete(self, name: str) -> None:
+        with self._lock:
+            self._entries.pop(name, None)
+
+    def resolve(self, name: str) -> str | None:
+        return self._entries.get(name)
+
+
+# -------------------------------
+# Manager
+# -------------------------------
+class ContextCacheManager:
+    """
+    Keeps one backend cache handle per document.
+
+    Entries are keyed by document UUID and validated against the SHA-256 of
+    the document text, so a handle is only reused for identical context.
+    Handles are dropped shortly before their TTL runs out, and explicitly on
+    update/delete via `invalidate`.
+    """
+
+    def __init__(self, backend: ContextCacheBackend | None, ttl_seconds: int, min_chars: int):
+        self.backend = backend
+        self.ttl_seconds = ttl_seconds
+        self.min_chars = min_chars
+        self._entries: dict[str, dict] = {}
+        self._lock = threading.Lock()
+        self._create_locks: dict[str, threading.Lock] = {}
+
+        self.hits = 0
+        self.misses = 0
+        self.failures = 0
+
+    def get_handle(self, uuid: str, version: int, text: str) -> str | None:
+        """
+        Returns a cache handle holding the system instruction for `text`,
+        creating one if needed. Returns None when caching is disabled, the
+        context is too small, or the backend refused to create a cache;
+        callers then send the context inline.
+        Makes network calls, so run it in a thread from async code.
+        """
+        if self.backend is None or len(text) < self.min_chars:
+            return None
+
+        with self._lock:
+            create_lock = self._create_locks.setdefault(uuid, threading.Lock())
+
+        with create_lock:
+            now = time.time()
+            with self._lock:
+                entry = self._entries.get(uuid)
+
+            if entry is not None and entry["version"] == version:
+                content_hash = entry["content_hash"]
+            else:
+                content_hash = hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+            if (
+                entry is not None
+                and entry["content_hash"] == content_hash
+                and entry["expires_at"] - CONTEXT_CACHE_EXPIRY_MARGIN_SECONDS > now
+            ):
+                with self._lock:
+                    entry["version"] = version
+                    self.hits += 1
+                return entry["name"]
+
+            if entry is not None:
+                self._delete_remote(entry["name"])
+
+            try:
+                name = self.backend.create(
+                    display_name=f"cag-{uuid}",
+                    system_instruction=build_system_instruction(text),
+                    ttl_seconds=self.ttl_seconds,
+                )
+            except Exception as e:
+                logger.warning("Context cache creation failed for %s: %s", uuid, e)
+                with self._lock:
+                    self._entries.pop(uuid, None)
+                    self.failures += 1
+                return None
+
+            with self._lock:
+                self._entries[uuid] = {
+                    "name": name,
+                    "version": version,
+                    "content_hash": content_hash,
+                    "expires_at": now + self.ttl_seconds,
+                }
+                self.misses += 1
+            return name
+
+    def invalidate(self, uuid: str) -> None:
+        """Drops the handle for a document and deletes it on the backend."""
+        with self._lock:
+            entry = self._entries.pop(uuid, None)
+            self._create_locks.pop(uuid, None)
+        if entry is not None:
+            self._delete_remote(entry["name"])
+
+    def _delete_remote(self, name: str) -> None:
+        try:
+            self.backend.delete(name)
+        except Exception as e:
+            # The cache expires on its own; a failed delete only costs storage
+            logger.warning("Could not delete context cache %s: %s", name, e)
+
+    def stats(self) -> dict:
+        now = time.time()
+        with self._lock:
+            return {
+                "backend": type(self.backend).__name__ if self.backend else None,
+                "entries": len(self._entries),
+                "live_entries": sum(1 for e in self._entries.values() if e["expires_at"] > now),
+                "hits": self.hits,
+                "misses": self.misses,
+                "failures": self.failures,
+                "ttl_seconds": self.ttl_seconds,
+            }
+
+
+def create_context_cache_backend(name: str = CONTEXT_CACHE_BACKEND) -> ContextCacheBackend | None:
+    """Builds the backend selected by CONTEXT_CACHE_BACKEND ('none' disables caching)."""
+    if name == "gemini":
+        return GeminiContextCacheBackend()
+    if name == "local":
+        return LocalContextCacheBackend()
+    if name == "none":
+        return None
+    raise ValueError(f"Unknown CONTEXT_CACHE_BACKEND: {name!r} (expected 'gemini', 'local' or 'none')")
+
+
+context_cache = ContextCacheManager(
+    backend=create_context_cache_backend(),
+    ttl_seconds=CONTEXT_CACHE_TTL_SECONDS,
+    min_chars=CONTEXT_CACHE_MIN_CHARS,
+)
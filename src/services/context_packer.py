@@ -0,0 +1,66 @@
+# src/services/context_packer.py
+import os
+
+from dotenv import load_dotenv, find_dotenv
+
+from src.utils.llm_client import SYSTEM_PROMPT
+from src.utils.token_estimator import estimate_tokens, truncate_to_tokens
+
+load_dotenv(find_dotenv())
+
+# -------------------------------
+# Config
+# -------------------------------
+# Input tokens one request may use; Gemini 2.5 Flash accepts about 1M
+LLM_CONTEXT_TOKEN_BUDGET = int(os.getenv("LLM_CONTEXT_TOKEN_BUDGET", "1000000"))
+# What to do with a document over the budget: reject (413) | truncate
+CONTEXT_OVERFLOW_POLICY = os.getenv("CONTEXT_OVERFLOW_POLICY", "reject").lower()
+
+# System prompt, delimiters and the "Query:" line around the context
+PROMPT_OVERHEAD_TOKENS = estimate_tokens(SYSTEM_PROMPT) + 16
+
+
+class ContextTooLargeError(ValueError):
+    """Raised when a request would exceed the model token budget."""
+
+    def __init__(self, tokens: int, budget: int):
+        super().__init__(
+            f"The request needs about {tokens} tokens, more than the model budget of {budget}. "
+            "Use mode=retrieve to send only the relevant passages."
+        )
+        self.tokens = tokens
+        self.budget = budget
+
+
+def document_tokens(stored: dict) -> int:
+    """Estimated tokens of a stored document, counted now if it predates token accounting."""
+    tokens = stored.get("token_count")
+    return tokens if tokens is not None else estimate_tokens(stored["text"])
+
+
+def pack_document(text: str, text_tokens: int, query: str,
+                  budget: int = LLM_CONTEXT_TOKEN_BUDGET,
+                  policy: str = CONTEXT_OVERFLOW_POLICY) -> dict:
+    """
+    Fits a whole document into the token budget of one request.
+
+    A document that fits is returned unchanged. Otherwise the "reject"
+    policy raises ContextTooLargeError before any LLM call is made, and
+    the "truncate" policy keeps the longest prefix of the document that
+    fits, cut at a word boundary.
+    Returns {"text", "tokens", "truncated"}.
+    """
+    available = budget - PROMPT_OVERHEAD_TOKENS - estimate_tokens(query)
+    if text_tokens <= available:
+        return {"text": text, "tokens": text_tokens, "truncated": False}
+
+    if policy != "truncate" or available <= 0:
+        raise ContextTooLargeError(text_tokens + budget - available, budget)
+
+    kept, tokens = truncate_to_tokens(text, available)
+    return {"text": kept, "tokens": tokens, "truncated": True}
+
+
+def pack_stored_document(stored: dict, query: str) -> dict:
+    """pack_document for a document as returned by the document store."""
+    return pack_document(stored["text"], document_tokens(stored), query)
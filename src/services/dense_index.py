@@ -0,0 +1,498 @@
+# src/services/dense_index.py
+import json
+import logging
+import math
+import os
+import tempfile
+import threading
+import time
+import zlib
+from array import array
+from collections import Counter
+from functools import lru_cache
+
+import numpy as np
+from dotenv import load_dotenv, find_dotenv
+
+from src.database.document_store import DocumentStore
+from src.services.retrieval import segment_chunks, tokenize
+
+load_dotenv(find_dotenv())
+logger = logging.getLogger(__name__)
+
+# -------------------------------
+# Config
+# -------------------------------
+# Width of the hashed TF-IDF vectors (one float32 per dimension per chunk)
+DENSE_DIM = int(os.getenv("DENSE_DIM", "512"))
+# Directory holding the persisted vectors (sqlite store only); empty keeps the index in memory only
+DENSE_INDEX_DIR = os.getenv("DENSE_INDEX_DIR", "data/dense_index")
+# Document changes between two saves of the index
+DENSE_SAVE_EVERY = int(os.getenv("DENSE_SAVE_EVERY", "50"))
+# IVF coarse quantizer: number of lists (0 = exact search) and lists probed per query
+DENSE_IVF_LISTS = int(os.getenv("DENSE_IVF_LISTS", "0"))
+DENSE_IVF_PROBES = int(os.getenv("DENSE_IVF_PROBES", "8"))
+# Documents a multi-document query is routed to when no UUIDs are given
+ROUTE_DOCUMENTS = int(os.getenv("ROUTE_DOCUMENTS", "5"))
+
+# The quantizer is trained once there are this many chunks per list,
+# and retrained whenever the number of chunks has doubled since
+IVF_MIN_ROWS_PER_LIST = 32
+IVF_TRAIN_ITERATIONS = 10
+
+METADATA_FILE = "index.json"
+# Vector files no manifest points to are deleted once they are this old;
+# younger ones may belong to a save still in progress in another worker
+ORPHAN_GRACE_SECONDS = 60
+
+
+@lru_cache(maxsize=1 << 16)
+def feature(term: str, dim: int) -> tuple[int, float]:
+    """Hashes a term to (dimension, sign); crc32 keeps it stable across processes."""
+    h = zlib.crc32(term.encode("utf-8"))
+    return h % dim, 1.0 if h >> 31 else -1.0
+
+
+def vectorize(term_counts: list[Counter], dim: int) -> np.ndarray:
+    """
+    Hashed, sublinear-TF vectors of several chunks as one (n, dim) float32
+    matrix with unit rows (all-zero rows for chunks without terms).
+    """
+    rows, columns, weights = [], [], []
+    for row, counts in enumerate(term_counts):
+        for term, tf in counts.items():
+            column, sign = feature(term, dim)
+            rows.append(row)
+            columns.append(column)
+            weights.append(sign * (1.0 + math.log(tf)))
+    vectors = np.zeros((len(term_counts), dim), dtype=np.float32)
+    np.add.at(vectors, (np.array(rows, dtype=np.intp), np.array(columns, dtype=np.intp)),
+              np.array(weights, dtype=np.float32))
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    np.divide(vectors, norms, out=vectors, where=norms > 0)
+    return vectors
+
+
+def train_centroids(sample: np.ndarray, lists: int) -> np.ndarray:
+    """Spherical k-means: `lists` unit centroids for the rows of `sample`."""
+    rng = np.random.default_rng(0)
+    centroids = sample[rng.choice(len(sample), lists, replace=False)].copy()
+    for _ in range(IVF_TRAIN_ITERATIONS):
+        assignment = np.argmax(sample @ centroids.T, axis=1)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assignment, sample)
+        norms = np.linalg.norm(sums, axis=1, keepdims=True)
+        filled = norms[:, 0] > 0
+        centroids[filled] = sums[filled] / norms[filled]
+    return centroids
+
+
+class DenseIndex:
+    """
+    Vector index of every stored document's chunks, used to route a
+    question to the few documents likely to answer it before any LLM call.
+
+    Chunks (the BM25 chunks, see retrieval.chunk_record) are embedded as
+    hashed TF vectors and stored as rows of one contiguous float32 matrix.
+    IDF weights are applied to the query only (squared), so rows never
+    need rewriting as document frequencies change: scoring a question is a
+    single matrix-vector product followed by a per-document max. With
+    DENSE_IVF_LISTS set, a spherical k-means quantizer keeps an inverted
+    list of row ids per centroid and only the rows of the lists nearest
+    the question are scored.
+
+    Rows of deleted documents are zeroed and reused. Like the search
+    index, each worker process keeps its own copy, updated directly by its
+    own writes and synced with the store's write generation before each
+    query. With a durable document store the matrix is saved as an .npy
+    file next to a JSON manifest and loaded memory-mapped (copy-on-write),
+    so a restart only reindexes the documents that changed while it was
+    down; an in-memory store starts empty anyway, so nothing is saved.
+    """
+
+    def __init__(self, dim: int = DENSE_DIM, directory: str = DENSE_INDEX_DIR,
+                 save_every: int = DENSE_SAVE_EVERY, ivf_lists: int = DENSE_IVF_LISTS,
+                 ivf_probes: int = DENSE_IVF_PROBES):
+        self.dim = dim
+        self.directory = directory
+        self.save_every = save_every
+        self.ivf_lists = ivf_lists
+        self.ivf_probes = ivf_probes
+        self.generation: int | None = None  # store generation last synced with; None = not built
+        self.persist = False  # set on the first sync when the store is durable
+
+        self._matrix = np.zeros((0, dim), dtype=np.float32)
+        self._owners = np.zeros(0, dtype=np.int32)  # row -> document slot, -1 = free
+        self._rows = 0  # rows in use, including free ones below the high-water mark
+        self._free: list[int] = []
+        self._documents: dict[str, tuple[int, list[int]]] = {}  # uuid -> (version, rows)
+        self._slots: dict[str, int] = {}
+        self._slot_uuids: list[str | None] = []
+        self._free_slots: list[int] = []
+        self._df = np.zeros(dim, dtype=np.float64)
+        self._live_rows = 0
+
+        self._centroids: np.ndarray | None = None
+        self._lists = np.zeros(0, dtype=np.int32)  # row -> IVF list
+        self._ivf: list[array] = []  # IVF list -> row ids (uint32), may hold freed rows
+        self._ivf_stale = np.zeros(0, dtype=np.int64)  # IVF list -> freed rows still listed
+        self._trained_rows = 0
+
+        self._changes = 0
+        self._loaded_rows = 0
+        self._last_vectors: str | None = None  # vector file of the manifest this worker last loaded or wrote
+        self._saves = 0
+        self._lock = threading.Lock()
+        self._sync_lock = threading.Lock()
+        self._save_lock = threading.Lock()
+        self._train_lock = threading.Lock()
+
+    # ---------- writes (hold self._lock) ----------
+    def _reserve(self, count: int) -> list[int]:
+        rows = self._free[-count:] if count else []
+        del self._free[len(self._free) - len(rows):]
+        missing = count - len(rows)
+        if self._rows + missing > len(self._matrix):
+            capacity = max(1024, len(self._matrix) * 2, self._rows + missing)
+            matrix = np.zeros((capacity, self.dim), dtype=np.float32)
+            matrix[:self._rows] = self._matrix[:self._rows]
+            owners = np.full(capacity, -1, dtype=np.int32)
+            owners[:self._rows] = self._owners[:self._rows]
+            lists = np.zeros(capacity, dtype=np.int32)
+            lists[:self._rows] = self._lists[:self._rows]
+            self._matrix, self._owners, self._lists = matrix, owners, lists
+        rows.extend(range(self._rows, self._rows + missing))
+        self._rows += missing
+        return rows
+
+    def _slot(self, uuid: str) -> int:
+        slot = self._slots.get(uuid)
+        if slot is None:
+            if self._free_slots:
+                slot = self._free_slots.pop()
+                self._slot_uuids[slot] = uuid
+            else:
+                slot = len(self._slot_uuids)
+                self._slot_uuids.append(uuid)
+            self._slots[uuid] = slot
+        return slot
+
+    def _insert(self, uuid: str, vectors: np.ndarray) -> list[int]:
+        vectors = vectors[np.any(vectors != 0, axis=1)]
+        rows = self._reserve(len(vectors))
+        if rows:
+            self._matrix[rows] = vectors
+            self._owners[rows] = self._slot(uuid)
+            self._df += np.count_nonzero(vectors, axis=0)
+            if self._centroids is not None:
+                assignment = np.argmax(vectors @ self._centroids.T, axis=1)
+                self._lists[rows] = assignment
+                for row, ivf_list in zip(rows, assignment.tolist()):
+                    self._ivf[ivf_list].append(row)
+        self._live_rows += len(rows)
+        return rows
+
+    def _remove(self, uuid: str) -> None:
+        entry = self._documents.pop(uuid, None)
+        if entry is None:
+            return
+        rows = entry[1]
+        if rows:
+            self._df -= np.count_nonzero(self._matrix[rows], axis=0)
+            self._matrix[rows] = 0
+            self._owners[rows] = -1
+            self._free.extend(rows)
+            if self._centroids is not None:
+                touched = self._lists[rows]
+                np.add.at(self._ivf_stale, touched, 1)
+                # A list is rewritten once a quarter of it is freed rows, so it never grows with deletes
+                for ivf_list in np.unique(touched).tolist():
+                    if self._ivf_stale[ivf_list] * 4 > len(self._ivf[ivf_list]):
+                        self._rebuild_list(ivf_list)
+        self._live_rows -= len(rows)
+        slot = self._slots.pop(uuid, None)
+        if slot is not None:
+            self._slot_uuids[slot] = None
+            self._free_slots.append(slot)
+        self._changes += 1
+
+    def _index_document(self, uuid: str, stored: dict) -> None:
+        """Replaces the rows of a document with vectors of its current chunks (embedding outside the lock)."""
+        text = stored["text"]
+        counts = [chunk[2] for segment in stored["segments"]
+                  for chunk in segment_chunks(text[segment["start"]:segment["end"]])]
+        vectors = vectorize(counts, self.dim)
+        with self._lock:
+            self._remove(uuid)
+            self._documents[uuid] = (stored["version"], self._insert(uuid, vectors))
+            self._changes += 1
+
+    # ---------- keeping up with the store ----------
+    def sync(self, store: DocumentStore) -> None:
+        """
+        Brings the index up to date with the store (blocking). The first
+        call loads the saved index, if any, and reindexes only documents
+        whose version differs from the saved one.
+        """
+        generation = store.generation()
+        if generation == self.generation:
+            return
+        with self._sync_lock:
+            if generation == self.generation:
+                return
+            if self.generation is None:
+                self.persist = bool(self.directory) and store.durable
+                self._load()
+            versions = store.versions()
+            with self._lock:
+                for uuid in [uuid for uuid in self._documents if uuid not in versions]:
+                    self._remove(uuid)
+                changed = [uuid for uuid, version in versions.items()
+                           if self._documents.get(uuid, (None,))[0] != version]
+            for uuid in changed:
+                stored = store.get(uuid)
+                if stored is None:
+                    with self._lock:
+                        self._remove(uuid)
+                else:
+                    self._index_document(uuid, stored)
+            self.generation = generation
+        self.train()
+        self._maybe_save()
+
+    def add_chunks(self, uuid: str, version: int, previous_version: int | None, chunks: list[tuple]) -> bool:
+        """
+        Adds the chunk records of a segment just written by this worker:
+        the first segment of a new document (`previous_version` None) or
+        one appended to the version indexed here. Returns False when the
+        index has not been built yet or does not hold the previous
+        version; the next sync catches up.
+        """
+        if self.generation is None:
+            return False
+        vectors = vectorize([chunk[2] for chunk in chunks], self.dim)
+        with self._lock:
+            if previous_version is None:
+                self._remove(uuid)
+                rows = []
+            else:
+                entry = self._documents.get(uuid)
+                if entry is None or entry[0] != previous_version:
+                    self._remove(uuid)
+                    return False
+                rows = entry[1]
+            self._documents[uuid] = (version, rows + self._insert(uuid, vectors))
+            self._changes += 1
+        self.train()
+        self._maybe_save()
+        return True
+
+    def remove_document(self, uuid: str) -> None:
+        with self._lock:
+            self._remove(uuid)
+        self._maybe_save()
+
+    # ---------- coarse quantizer ----------
+    def _training_due(self) -> bool:
+        if self.ivf_lists <= 0 or self._live_rows < self.ivf_lists * IVF_MIN_ROWS_PER_LIST:
+            return False
+        return self._centroids is None or self._live_rows >= 2 * self._trained_rows
+
+    def train(self) -> None:
+        """
+        Trains the IVF quantizer once there are enough chunks, and again
+        whenever their number has doubled (blocking). Called after writes,
+        never by queries; k-means runs on a copied sample outside the
+        lock, which is only held to sample and to assign rows to lists.
+        """
+        if self.ivf_lists <= 0:
+            return
+        with self._train_lock:
+            with self._lock:
+                if not self._training_due():
+                    return
+                live = np.flatnonzero(self._owners[:self._rows] >= 0)
+                rng = np.random.default_rng(0)
+                sample = self._matrix[rng.choice(live, min(len(live), self.ivf_lists * 256), replace=False)]
+            centroids = train_centroids(sample, self.ivf_lists)
+            with self._lock:
+                self._centroids = centroids
+                self._lists[:self._rows] = np.argmax(self._matrix[:self._rows] @ centroids.T, axis=1)
+                self._ivf = [array("I") for _ in range(len(centroids))]
+                self._ivf_stale = np.zeros(len(centroids), dtype=np.int64)
+                for ivf_list in range(len(centroids)):
+                    self._rebuild_list(ivf_list)
+                self._trained_rows = self._live_rows
+
+    def _rebuild_list(self, ivf_list: int) -> None:
+        """Rewrites one inverted list with exactly the live rows assigned to it (hold self._lock)."""
+        rows = np.flatnonzero((self._lists[:self._rows] == ivf_list) & (self._owners[:self._rows] >= 0))
+        self._ivf[ivf_list] = array("I", rows.astype(np.uint32).tobytes())
+        self._ivf_stale[ivf_list] = 0
+
+    def _probe(self, probes: np.ndarray) -> np.ndarray:
+        """Live row ids of the probed lists."""
+        rows = np.concatenate([np.frombuffer(self._ivf[ivf_list], dtype=np.uint32) for ivf_list in probes.tolist()])
+        return rows[self._owners[rows] >= 0]
+
+    # ---------- queries ----------
+    def _query_vector(self, query: str) -> np.ndarray | None:
+        counts = Counter(tokenize(query))
+        if not counts:
+            return None
+        vector = vectorize([counts], self.dim)[0]
+        idf = np.log((1 + self._live_rows) / (1 + self._df)) + 1
+        vector *= (idf * idf).astype(np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else None
+
+    def route(self, query: str, limit: int = ROUTE_DOCUMENTS) -> list[dict]:
+        """
+        Ranks documents by the best cosine between the question and one of
+        their chunks. Returns up to `limit` {"uuid", "score"} dicts with a
+        positive score, best first. Read-only: until the quantizer has been
+        trained (see train) every chunk is scored.
+        """
+        with self._lock:
+            if not self._live_rows:
+                return []
+            vector = self._query_vector(query)
+            if vector is None:
+                return []
+            if self._centroids is not None:
+                probes = np.argsort(self._centroids @ vector)[-self.ivf_probes:]
+                rows = self._probe(probes)
+                scores = self._matrix[rows] @ vector
+                owners = self._owners[rows]
+            else:
+                scores = self._matrix[:self._rows] @ vector
+                owners = self._owners[:self._rows]
+            live = owners >= 0
+            best = np.full(len(self._slot_uuids), -np.inf, dtype=np.float32)
+            np.maximum.at(best, owners[live], scores[live])
+            top = np.argsort(best)[::-1][:limit]
+            return [
+                {"uuid": self._slot_uuids[slot], "score": round(float(best[slot]), 4)}
+                for slot in top if best[slot] > 0
+            ]
+
+    # ---------- persistence ----------
+    def _maybe_save(self) -> None:
+        if self.persist and self.save_every > 0 and self._changes >= self.save_every:
+            self.save()
+
+    def save(self) -> None:
+        """
+        Writes the matrix to a new .npy file and then swaps the manifest
+        pointing at it (blocking I/O). Readers keep whatever file they
+        mapped; several workers may save, the last manifest wins, and
+        vector files no manifest points to are deleted afterwards.
+        """
+        if not self.persist or self.generation is None:
+            return
+        with self._save_lock:
+            with self._lock:
+                if not self._changes:
+                    return
+                matrix = self._matrix[:self._rows].copy()
+                manifest = {
+                    "dim": self.dim,
+                    "rows": self._rows,
+                    "documents": {uuid: [version, rows] for uuid, (version, rows) in self._documents.items()},
+                    "df": self._df.tolist(),
+                }
+                self._changes = 0
+
+            os.makedirs(self.directory, exist_ok=True)
+            fd, vectors_path = tempfile.mkstemp(dir=self.directory, prefix="vectors-", suffix=".npy")
+            tmp_path = None
+            try:
+                with os.fdopen(fd, "wb") as f:
+                    np.save(f, matrix)
+                manifest["vectors"] = os.path.basename(vectors_path)
+                fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+                with os.fdopen(fd, "w", encoding="utf-8") as f:
+                    json.dump(manifest, f)
+                replaced = (self._read_manifest() or {}).get("vectors")
+                os.replace(tmp_path, os.path.join(self.directory, METADATA_FILE))
+            except BaseException:
+                for path in (vectors_path, tmp_path):
+                    if path and os.path.exists(path):
+                        os.remove(path)
+                raise
+            self._saves += 1
+            self._remove_orphans({replaced, self._last_vectors})
+
+    def _remove_orphans(self, superseded: set[str | None]) -> None:
+        """
+        Deletes vector and manifest temp files the current manifest does
+        not point to. The `superseded` files (of manifests replaced since)
+        go at once; others, such as those of a worker whose manifest lost
+        the race to another one, once they are older than any save.
+        """
+        current = (self._read_manifest() or {}).get("vectors")
+        now = time.time()
+        for name in os.listdir(self.directory):
+            if name == current or not (name.startswith("vectors-") or name.endswith(".tmp")):
+                continue
+            path = os.path.join(self.directory, name)
+            try:
+                if name in superseded or now - os.path.getmtime(path) > ORPHAN_GRACE_SECONDS:
+                    os.remove(path)
+            except OSError:
+                # Gone already, or still mapped by a reader on a platform that forbids removing it
+                pass
+        self._last_vectors = current
+
+    def _read_manifest(self) -> dict | None:
+        try:
+            with open(os.path.join(self.directory, METADATA_FILE), encoding="utf-8") as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+
+    def _load(self) -> None:
+        """Maps the saved matrix copy-on-write; a missing or mismatched save is ignored."""
+        if not self.persist:
+            return
+        manifest = self._read_manifest()
+        if manifest is None or manifest.get("dim") != self.dim:
+            return
+        self._last_vectors = manifest.get("vectors")
+        try:
+            matrix = np.load(os.path.join(self.directory, manifest["vectors"]), mmap_mode="c")
+        except (FileNotFoundError, ValueError) as e:
+            logger.warning("Could not load dense index %s: %s", manifest.get("vectors"), e)
+            return
+        if matrix.shape != (manifest["rows"], self.dim):
+            return
+
+        with self._lock:
+            self._matrix = matrix
+            self._rows = len(matrix)
+            self._owners = np.full(self._rows, -1, dtype=np.int32)
+            self._lists = np.zeros(self._rows, dtype=np.int32)
+            for uuid, (version, rows) in manifest["documents"].items():
+                self._owners[rows] = self._slot(uuid)
+                self._documents[uuid] = (version, rows)
+                self._live_rows += len(rows)
+            self._free = np.flatnonzero(self._owners < 0).tolist()
+            self._df = np.array(manifest["df"], dtype=np.float64)
+            self._loaded_rows = self._live_rows
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "built": self.generation is not None,
+                "documents": len(self._documents),
+                "chunks": self._live_rows,
+                "free_rows": len(self._free),
+                "matrix_bytes": int(self._matrix.nbytes),
+                "dim": self.dim,
+                "ivf_lists": len(self._centroids) if self._centroids is not None else 0,
+                "loaded_chunks": self._loaded_rows,
+                "saves": self._saves,
+            }
+
+
+dense_index = DenseIndex()
@@ -0,0 +1,184 @@
+# src/services/extraction_cache.py
+import json
+import os
+import tempfile
+import threading
+
+import pypdf
+from dotenv import load_dotenv, find_dotenv
+
+load_dotenv(find_dotenv())
+
+# -------------------------------
+# Config
+# -------------------------------
+# Directory of cached extraction results; empty disables the cache
+EXTRACTION_CACHE_DIR = os.getenv("EXTRACTION_CACHE_DIR", "data/extraction_cache")
+EXTRACTION_CACHE_MAX_BYTES = int(os.getenv("EXTRACTION_CACHE_MAX_BYTES", str(1024 * 1024 * 1024)))  # 1 GB
+
+# Results of a different extractor are never reused; bump the suffix when
+# extraction or token estimation changes its output.
+EXTRACTOR_VERSION = f"pypdf-{pypdf.__version__}-1"
+
+
+class ExtractionCache:
+    """
+    Content-addressed cache of extraction results on disk.
+
+    Entries are keyed by the SHA-256 of the uploaded PDF bytes and hold
+    the page texts and page token counts as JSON, one file per PDF under
+    a directory named after EXTRACTOR_VERSION. Files are written to a
+    temporary name and renamed, so several workers can share the
+    directory and readers never see a partial entry. Reading an entry
+    refreshes its mtime; when the directory grows over `max_bytes`, the
+    least recently used entries are deleted.
+    """
+
+    def __init__(self, directory: str, max_bytes: int):
+        self.enabled = bool(directory)
+        self.directory = os.path.join(directory, EXTRACTOR_VERSION) if directory else ""
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._bytes: int | None = None
+
+        self.hits = 0
+        self.misses = 0
+        self.writes = 0
+        self.evictions = 0
+
+    def _path(self, digest: str) -> str:
+        return os.path.join(self.directory, digest[:2], f"{digest}.json")
+
+    def get(self, digest: str) -> tuple[list[str], list[int]] | None:
+        """Returns the cached (pages, page_tokens) of a PDF, or None (blocking I/O)."""
+        if not self.enabled:
+            return None
+        path = self._path(digest)
+        try:
+            with open(path, encoding="utf-8") as f:
+                entry = json.load(f)
+            os.utime(path)
+        except (FileNotFoundError, json.JSONDecodeError):
+            with self._lock:
+                self.misses += 1
+            return None
+        with self._lock:
+            self.hits += 1
+        return entry["pages"], entry["page_tokens"]
+
+    def writer(self, digest: str) -> "ExtractionCacheWriter | None":
+        """
+        Starts the entry of a PDF, written page by page as extraction goes
+        (blocking I/O). Returns None when the cache is disabled.
+        """
+        if not self.enabled:
+            return None
+        return ExtractionCacheWriter(self, self._path(digest))
+
+    def _added(self, size: int) -> None:
+        with self._lock:
+            self.writes += 1
+            if self._bytes is None:
+                self._bytes = self._scan_bytes()
+            else:
+                self._bytes += size
+            if self._bytes > self.max_bytes:
+                self._evict()
+
+    def _entries(self) -> list[tuple[float, int, str]]:
+        entries = []
+        for root, _, files in os.walk(self.directory):
+            for name in files:
+                if not name.endswith(".json"):
+                    continue
+                path = os.path.join(root, name)
+                try:
+                    st = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                entries.append((st.st_mtime, st.st_size, path))
+        return entries
+
+    def _scan_bytes(self) -> int:
+        return sum(size for _, size, _ in self._entries())
+
+    def _evict(self) -> None:
+        """Deletes least recently used entries until the cache is at 90% of its limit."""
+        entries = sorted(self._entries())
+        self._bytes = sum(size for _, size, _ in entries)
+        target = self.max_bytes * 0.9
+        for _, size, path in entries:
+            if self._bytes <= target:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            self._bytes -= size
+            self.evictions += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "enabled": self.enabled,
+                "directory": self.directory,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": round(self.hits / lookups, 3) if lookups else 0.0,
+                "writes": self.writes,
+                "evictions": self.evictions,
+            }
+
+
+class ExtractionCacheWriter:
+    """
+    One cache entry being written: page texts go to a temporary file as
+    they are added, so the raw pages are not held in memory next to the
+    document being built; only the page token counts are. commit() adds
+    the token counts and renames the file into place, discard() removes
+    it. Every method is blocking I/O.
+    """
+
+    def __init__(self, cache: ExtractionCache, path: str):
+        self.cache = cache
+        self.path = path
+        self.page_tokens: list[int] = []
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, self.tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        self._file = os.fdopen(fd, "w", encoding="utf-8")
+        self._file.write('{"pages": [')
+
+    def add(self, pages: list[tuple[str, int]]) -> None:
+        """Appends (page text, page tokens) pairs, in page order."""
+        try:
+            for text, tokens in pages:
+                if self.page_tokens:
+                    self._file.write(", ")
+                self._file.write(json.dumps(text))
+                self.page_tokens.append(tokens)
+        except BaseException:
+            self.discard()
+            raise
+
+    def commit(self) -> None:
+        """Completes the entry; later readers see it whole or not at all."""
+        try:
+            self._file.write(f'], "page_tokens": {json.dumps(self.page_tokens)}}}')
+            self._file.close()
+            size = os.path.getsize(self.tmp_path)
+            os.replace(self.tmp_path, self.path)
+        except BaseException:
+            self.discard()
+            raise
+        self.cache._added(size)
+
+    def discard(self) -> None:
+        """Drops the partial entry; safe to call more than once."""
+        self._file.close()
+        if os.path.exists(self.tmp_path):
+            os.remove(self.tmp_path)
+
+
+extraction_cache = ExtractionCache(EXTRACTION_CACHE_DIR, EXTRACTION_CACHE_MAX_BYTES)
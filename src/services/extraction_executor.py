@@ -0,0 +1,357 @@
+# src/services/extraction_executor.py
+import asyncio
+import multiprocessing
+import os
+import tempfile
+import threading
+import time
+from collections import deque
+from collections.abc import AsyncIterator
+from contextlib import aclosing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Callable
+
+from dotenv import load_dotenv, find_dotenv
+
+from src.utils.pdf_processor import count_pdf_pages, extract_pages_from_pdf
+from src.utils.token_estimator import estimate_page_tokens
+
+load_dotenv(find_dotenv())
+
+# -------------------------------
+# Config
+# -------------------------------
+# Every uvicorn worker owns a pool, so by default the cores are split between them
+APP_WORKERS = int(os.getenv("APP_WORKERS", "1"))
+EXTRACTION_WORKERS = int(os.getenv(
+    "EXTRACTION_WORKERS", str(max(1, (os.cpu_count() or 1) // max(1, APP_WORKERS)))
+))
+EXTRACTION_QUEUE_SIZE = int(os.getenv("EXTRACTION_QUEUE_SIZE", "32"))
+EXTRACTION_TIMEOUT_SECONDS = float(os.getenv("EXTRACTION_TIMEOUT_SECONDS", "120"))
+# Documents with at least this many pages are split across workers
+PDF_SHARD_THRESHOLD_PAGES = int(os.getenv("PDF_SHARD_THRESHOLD_PAGES", "200"))
+# Smallest page range worth shipping to a separate process
+PDF_SHARD_MIN_PAGES = int(os.getenv("PDF_SHARD_MIN_PAGES", "25"))
+# Pages per job when a PDF is extracted as a stream of pages
+PDF_STREAM_WINDOW_PAGES = int(os.getenv("PDF_STREAM_WINDOW_PAGES", "25"))
+
+
+class ExtractionQueueFull(Exception):
+    """Raised when the extraction queue has no free slot for a new job."""
+
+
+class ExtractionTimeout(Exception):
+    """Raised when an extraction job does not finish within the per-job timeout."""
+
+
+# -------------------------------
+# Worker-side wrapper
+# -------------------------------
+def _timed_call(fn: Callable, args: tuple) -> tuple[float, Any]:
+    """
+    Runs inside a worker process.
+    Returns the wall-clock start time together with the result so the
+    parent can measure how long the job waited in the queue.
+    """
+    started_at = time.time()
+    return started_at, fn(*args)
+
+
+def extract_counted_pages(pdf_source: str | bytes, start: int = 0, stop: int | None = None,
+                          keep_open: bool = False) -> tuple[list[str], list[int]]:
+    """
+    Runs inside a worker process.
+    Extracts pages [start, stop) and estimates their tokens while the text
+    is still in the worker. `keep_open` is passed to extract_pages_from_pdf.
+    Returns (page texts, page token counts).
+    """
+    pages = extract_pages_from_pdf(pdf_source, start, stop, keep_open)
+    return pages, estimate_page_tokens(pages)
+
+
+def spool_pdf(pdf_bytes: bytes) -> str:
+    """
+    Writes upload bytes to a temporary file the caller removes, so jobs
+    can be sent its path instead of a copy of the bytes each.
+    Blocking; run it in a thread from async code.
+    """
+    fd, path = tempfile.mkstemp(prefix="upload-", suffix=".pdf")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(pdf_bytes)
+    except BaseException:
+        os.remove(path)
+        raise
+    return path
+
+
+# -------------------------------
+# Executor
+# -------------------------------
+class ExtractionExecutor:
+    """
+    Process pool for CPU-bound PDF work, shared by all requests of a worker.
+
+    - At most `workers` jobs run at once; up to `queue_size` more may wait.
+      Anything beyond that is rejected with ExtractionQueueFull.
+    - Each job is awaited with a timeout. A timed-out job that is already
+      running cannot be killed, so it keeps its process until it finishes;
+      the caller simply stops waiting for it.
+    """
+
+    def __init__(
+        self,
+        workers: int,
+        queue_size: int,
+        timeout: float,
+        shard_threshold: int = PDF_SHARD_THRESHOLD_PAGES,
+        shard_min_pages: int = PDF_SHARD_MIN_PAGES,
+        stream_window: int = PDF_STREAM_WINDOW_PAGES,
+    ):
+        self.workers = max(1, workers)
+        self.queue_size = max(0, queue_size)
+        self.timeout = timeout
+        self.shard_threshold = shard_threshold
+        self.shard_min_pages = max(1, shard_min_pages)
+        self.stream_window = max(1, stream_window)
+
+        self._pool: ProcessPoolExecutor | None = None
+        self._lock = threading.Lock()
+
+        self._in_flight = 0
+        self._completed = 0
+        self._failed = 0
+        self._timed_out = 0
+        self._rejected = 0
+        self._total_wait = 0.0
+        self._max_wait = 0.0
+        self._total_run = 0.0
+        self._sharded = 0
+        self._streamed = 0
+
+    # ---------- lifecycle ----------
+    def start(self) -> None:
+        """Creates the process pool (called from the app lifespan)."""
+        with self._lock:
+            if self._pool is None:
+                self._pool = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=multiprocessing.get_context("spawn"),
+                )
+
+    def shutdown(self) -> None:
+        """Stops the pool; queued jobs that have not started are cancelled."""
+        with self._lock:
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.shutdown(wait=False, cancel_futures=True)
+
+    # ---------- jobs ----------
+    def _admit(self) -> None:
+        with self._lock:
+            if self._in_flight >= self.workers + self.queue_size:
+                self._rejected += 1
+                raise ExtractionQueueFull(
+                    f"Extraction queue is full ({self._in_flight} jobs in flight)."
+                )
+            self._in_flight += 1
+
+    def _release(self, _future=None) -> None:
+        with self._lock:
+            self._in_flight -= 1
+
+    async def run(self, fn: Callable, *args) -> Any:
+        """
+        Runs `fn(*args)` in the pool and awaits the result.
+        `fn` must be a picklable top-level function.
+        Raises:
+            ExtractionQueueFull: no free queue slot.
+            ExtractionTimeout: the job exceeded the per-job timeout.
+        """
+        self._admit()
+        try:
+            self.start()
+            submitted_at = time.time()
+            future = self._pool.submit(_timed_call, fn, args)
+        except BrokenProcessPool:
+            # A worker died; drop the pool so the next job gets a fresh one
+            self.shutdown()
+            self._release()
+            raise
+        except BaseException:
+            self._release()
+            raise
+        future.add_done_callback(self._release)
+
+        try:
+            started_at, result = await asyncio.wait_for(
+                asyncio.wrap_future(future), timeout=self.timeout
+            )
+        except asyncio.TimeoutError:
+            with self._lock:
+                self._timed_out += 1
+            raise ExtractionTimeout(
+                f"Extraction did not finish within {self.timeout:.0f} seconds."
+            )
+        except BrokenProcessPool:
+            self.shutdown()
+            with self._lock:
+                self._failed += 1
+            raise
+        except Exception:
+            with self._lock:
+                self._failed += 1
+            raise
+
+        finished_at = time.time()
+        wait = max(0.0, started_at - submitted_at)
+        with self._lock:
+            self._completed += 1
+            self._total_wait += wait
+            self._max_wait = max(self._max_wait, wait)
+            self._total_run += max(0.0, finished_at - started_at)
+        return result
+
+    async def extract_pages(self, pdf_source: str | bytes) -> tuple[list[str], list[int]]:
+        """
+        Extracts every page of a PDF (path or bytes) without blocking the
+        event loop, together with the estimated tokens of each page.
+        Large documents are split into page ranges extracted in parallel.
+        Returns (page texts, page token counts), in page order.
+        """
+        if self.workers < 2:
+            return await self.run(extract_counted_pages, pdf_source)
+
+        page_count = await self.run(count_pdf_pages, pdf_source)
+        if page_count < self.shard_threshold:
+            return await self.run(extract_counted_pages, pdf_source)
+
+        return await self.extract_pages_sharded(pdf_source, page_count)
+
+    def shard_ranges(self, page_count: int) -> list[tuple[int, int]]:
+        """Splits [0, page_count) into at most `workers` contiguous ranges."""
+        shards = max(1, min(self.workers, page_count // self.shard_min_pages))
+        size, extra = divmod(page_count, shards)
+        ranges, start = [], 0
+        for i in range(shards):
+            stop = start + size + (1 if i < extra else 0)
+            ranges.append((start, stop))
+            start = stop
+        return ranges
+
+    async def extract_pages_sharded(self, pdf_source: str | bytes, page_count: int) -> tuple[list[str], list[int]]:
+        """
+        Extracts every page of the document, one page range per worker,
+        and returns (page texts, page token counts) in page order.
+        """
+        tasks = [
+            asyncio.ensure_future(self.run(extract_counted_pages, pdf_source, start, stop))
+            for start, stop in self.shard_ranges(page_count)
+        ]
+        try:
+            shards = await asyncio.gather(*tasks)
+        except BaseException:
+            for task in tasks:
+                task.cancel()
+            raise
+
+        with self._lock:
+            self._sharded += 1
+        pages = [text for shard_pages, _ in shards for text in shard_pages]
+        page_tokens = [tokens for _, shard_tokens in shards for tokens in shard_tokens]
+        return pages, page_tokens
+
+    async def stream_pages(self, pdf_source: str | bytes,
+                           page_count: int | None = None) -> AsyncIterator[tuple[str, int]]:
+        """
+        Yields (page text, page tokens) for every page, in page order, while
+        the rest of the document is still being extracted.
+
+        Pages are extracted in windows of `stream_window` pages. With
+        several workers up to `workers` windows run ahead of the consumer;
+        the next window is only submitted when the consumer takes the
+        pages of the oldest one, so a slow consumer holds back extraction
+        instead of letting finished pages pile up. Without a page count
+        and with a single worker, windows run one after the other until
+        one comes back short. Closing the generator cancels the windows
+        that have not started.
+
+        Bytes are spooled to a temporary file for the duration, so every
+        window is sent the path rather than the whole upload; the file is
+        removed when the generator finishes or is closed.
+        """
+        if isinstance(pdf_source, (bytes, bytearray)):
+            path = await asyncio.to_thread(spool_pdf, pdf_source)
+            try:
+                async with aclosing(self.stream_pages(path, page_count)) as pages:
+                    async for page in pages:
+                        yield page
+            finally:
+                await asyncio.to_thread(os.remove, path)
+            return
+
+        if page_count is None and self.workers > 1:
+            page_count = await self.run(count_pdf_pages, pdf_source)
+
+        window = self.stream_window
+        if page_count is None:
+            lookahead, windows = 1, ((start, start + window) for start in range(0, 1 << 62, window))
+        else:
+            lookahead = self.workers
+            windows = ((start, min(start + window, page_count)) for start in range(0, page_count, window))
+
+        pending: deque[tuple[int, asyncio.Future]] = deque()
+
+        def submit() -> None:
+            bounds = next(windows, None)
+            if bounds is not None:
+                pending.append((bounds[1] - bounds[0], asyncio.ensure_future(
+                    self.run(extract_counted_pages, pdf_source, *bounds, True)
+                )))
+
+        try:
+            for _ in range(lookahead):
+                submit()
+            while pending:
+                size, task = pending.popleft()
+                pages, page_tokens = await task
+                if page_count is not None or len(pages) == size:
+                    submit()
+                for page in zip(pages, page_tokens):
+                    yield page
+        finally:
+            for _, task in pending:
+                task.cancel()
+            await asyncio.gather(*(task for _, task in pending), return_exceptions=True)
+
+        with self._lock:
+            self._streamed += 1
+
+    # ---------- metrics ----------
+    def stats(self) -> dict:
+        """Returns pool size, queue depth and wait/run time statistics."""
+        with self._lock:
+            done = self._completed
+            return {
+                "workers": self.workers,
+                "queue_size": self.queue_size,
+                "in_flight": self._in_flight,
+                "queue_depth": max(0, self._in_flight - self.workers),
+                "completed": done,
+                "failed": self._failed,
+                "timed_out": self._timed_out,
+                "rejected": self._rejected,
+                "avg_wait_ms": round(self._total_wait / done * 1000, 2) if done else 0.0,
+                "max_wait_ms": round(self._max_wait * 1000, 2),
+                "avg_run_ms": round(self._total_run / done * 1000, 2) if done else 0.0,
+                "sharded_documents": self._sharded,
+                "streamed_documents": self._streamed,
+            }
+
+
+extraction_executor = ExtractionExecutor(
+    workers=EXTRACTION_WORKERS,
+    queue_size=EXTRACTION_QUEUE_SIZE,
+    timeout=EXTRACTION_TIMEOUT_SECONDS,
+)
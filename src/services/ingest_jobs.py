@@ -0,0 +1,264 @@
+# src/services/ingest_jobs.py
+import asyncio
+import itertools
+import logging
+import os
+import time
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+
+from dotenv import load_dotenv, find_dotenv
+from pypdf.errors import PdfReadError
+
+from src.database.document_store import DocumentExistsError, DocumentNotFoundError
+from src.database.job_store import JobStore
+from src.database.memory_db import job_store
+from src.services.extraction_executor import extraction_executor
+from src.services.ingest_pipeline import ingest_and_store, NORMALIZE_TEXT
+from src.utils.pdf_processor import count_pdf_pages
+from src.utils.uuid_utils import generate_uuid
+
+load_dotenv(find_dotenv())
+logger = logging.getLogger(__name__)
+
+# -------------------------------
+# Config
+# -------------------------------
+# Background ingestion jobs run at the same time per worker process
+INGEST_JOB_WORKERS = int(os.getenv("INGEST_JOB_WORKERS", "2"))
+# Jobs waiting to run before new background uploads are rejected (503)
+INGEST_JOB_QUEUE_SIZE = int(os.getenv("INGEST_JOB_QUEUE_SIZE", "64"))
+# Attempts per job; a failed attempt is retried after an exponential delay
+INGEST_JOB_MAX_ATTEMPTS = int(os.getenv("INGEST_JOB_MAX_ATTEMPTS", "3"))
+INGEST_JOB_RETRY_SECONDS = float(os.getenv("INGEST_JOB_RETRY_SECONDS", "2"))
+# How long finished jobs stay visible through GET /jobs/{id}
+INGEST_JOB_RETENTION_SECONDS = int(os.getenv("INGEST_JOB_RETENTION_SECONDS", "86400"))
+# How often finished jobs past the retention are deleted
+INGEST_JOB_PURGE_SECONDS = float(os.getenv("INGEST_JOB_PURGE_SECONDS", "300"))
+
+# Queue order: lower runs first
+PRIORITIES = {"high": 0, "normal": 1, "low": 2}
+
+# Minimum time between two progress writes of a running job
+PROGRESS_INTERVAL_SECONDS = 0.5
+
+
+class JobQueueFull(Exception):
+    """Raised when the background ingestion queue is at capacity."""
+
+
+def now_iso(offset_seconds: float = 0) -> str:
+    """Current UTC time (shifted by `offset_seconds`) as the ISO string stored in jobs."""
+    return (datetime.now(timezone.utc) + timedelta(seconds=offset_seconds)).isoformat(timespec="milliseconds")
+
+
+@dataclass
+class IngestJob:
+    """What a worker needs to run a job; only the job's state goes to the job store."""
+    job_id: str
+    kind: str  # upload | update
+    uuid: str
+    pdf_bytes: bytes
+    digest: str
+    file_name: str
+    date: str
+    normalize: bool
+    priority: str
+    attempts: int = 0
+
+
+class IngestJobQueue:
+    """
+    Background ingestion for uploads that should not hold the HTTP
+    connection open: the endpoint answers 202 with a job id and the job
+    runs the same extraction, normalization, storing and indexing here.
+
+    Jobs wait in a priority queue (high, normal, low; first come first
+    served within a priority) served by `workers` tasks of this process.
+    An attempt that fails for a reason other than the document itself
+    (a full extraction pool, a timeout, a storage error) is retried after
+    `retry_seconds`, doubled for every further attempt, up to
+    `max_attempts`. Job state, including pages done out of pages total,
+    lives in the job store, so with the sqlite backend every worker can
+    report on every job; the PDF bytes stay in the process that accepted
+    the upload. Finished jobs are deleted `retention_seconds` after they
+    finished by a purge task that runs every `purge_seconds`.
+    """
+
+    def __init__(self, store: JobStore, workers: int = INGEST_JOB_WORKERS,
+                 queue_size: int = INGEST_JOB_QUEUE_SIZE, max_attempts: int = INGEST_JOB_MAX_ATTEMPTS,
+                 retry_seconds: float = INGEST_JOB_RETRY_SECONDS,
+                 retention_seconds: int = INGEST_JOB_RETENTION_SECONDS,
+                 purge_seconds: float = INGEST_JOB_PURGE_SECONDS):
+        self.store = store
+        self.workers = max(1, workers)
+        self.queue_size = queue_size
+        self.max_attempts = max(1, max_attempts)
+        self.retry_seconds = retry_seconds
+        self.retention_seconds = retention_seconds
+        self.purge_seconds = purge_seconds
+        self._queue: asyncio.PriorityQueue | None = None
+        self._tasks: list[asyncio.Task] = []
+        self._purger: asyncio.Task | None = None
+        self._retries: set[asyncio.Task] = set()
+        self._order = itertools.count()
+        self._running = 0
+
+        self.submitted = 0
+        self.succeeded = 0
+        self.failed = 0
+        self.retried = 0
+        self.purged = 0
+
+    def start(self, sole_worker: bool = False) -> None:
+        """
+        Starts the worker tasks; call from the running event loop (app
+        startup). `sole_worker` means no other process serves the job
+        store, so jobs left active by a previous run are marked failed.
+        """
+        if self._tasks:
+            return
+        if sole_worker:
+            self.store.fail_active("Interrupted by a server restart; upload the PDF again.", now_iso())
+        self._queue = asyncio.PriorityQueue()
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+        self._purger = asyncio.create_task(self._purge_finished())
+
+    async def aclose(self) -> None:
+        """Cancels the workers, the purge task and pending retries; unfinished jobs are marked failed."""
+        tasks = self._tasks + list(self._retries) + ([self._purger] if self._purger is not None else [])
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._tasks = []
+        self._purger = None
+        self._retries.clear()
+        while self._queue is not None and not self._queue.empty():
+            _, _, job = self._queue.get_nowait()
+            self._finish(job, "failed", error="Server shut down before the job ran.")
+
+    def _enqueue(self, job: IngestJob) -> None:
+        self._queue.put_nowait((PRIORITIES[job.priority], next(self._order), job))
+
+    async def submit(self, kind: str, uuid_str: str, pdf_bytes: bytes, digest: str, file_name: str,
+                     date: str, normalize: bool = NORMALIZE_TEXT, priority: str = "normal") -> dict:
+        """
+        Records a queued job and schedules it.
+        Returns the job dict.
+        Raises JobQueueFull, or JobConflictError if the document already
+        has an active job.
+        """
+        if self._queue is None:
+            self.start()
+        if self._queue.qsize() >= self.queue_size:
+            raise JobQueueFull(
+                f"Background ingestion queue is full ({self.queue_size} jobs waiting). Try again shortly."
+            )
+        created = now_iso()
+        record = {
+            "job_id": generate_uuid(),
+            "uuid": uuid_str,
+            "kind": kind,
+            "priority": priority,
+            "status": "queued",
+            "attempts": 0,
+            "pages_done": 0,
+            "pages_total": None,
+            "error": None,
+            "result": None,
+            "created_at": created,
+            "updated_at": created,
+        }
+        await asyncio.to_thread(self.store.create, record)
+        self._enqueue(IngestJob(record["job_id"], kind, uuid_str, pdf_bytes, digest, file_name, date,
+                                normalize, priority))
+        self.submitted += 1
+        return record
+
+    def _finish(self, job: IngestJob, status: str, **fields) -> None:
+        self.store.update(job.job_id, status=status, updated_at=now_iso(), **fields)
+        if status == "succeeded":
+            self.succeeded += 1
+        else:
+            self.failed += 1
+
+    async def _purge_finished(self) -> None:
+        while True:
+            await asyncio.sleep(self.purge_seconds)
+            try:
+                self.purged += await asyncio.to_thread(self.store.delete_finished, now_iso(-self.retention_seconds))
+            except Exception as e:
+                logger.warning("Purging finished ingestion jobs failed: %s", e)
+
+    async def _retry_later(self, job: IngestJob, delay: float) -> None:
+        try:
+            await asyncio.sleep(delay)
+        except asyncio.CancelledError:
+            await asyncio.to_thread(self._finish, job, "failed", error="Server shut down before the job was retried.")
+            raise
+        self._enqueue(job)
+
+    async def _worker(self) -> None:
+        while True:
+            _, _, job = await self._queue.get()
+            self._running += 1
+            try:
+                await self._run(job)
+            except asyncio.CancelledError:
+                await asyncio.to_thread(self._finish, job, "failed", error="Server shut down while the job ran.")
+                raise
+            finally:
+                self._running -= 1
+
+    async def _run(self, job: IngestJob) -> None:
+        job.attempts += 1
+        await asyncio.to_thread(self.store.update, job.job_id, status="running",
+                                attempts=job.attempts, updated_at=now_iso())
+        last_write = 0.0
+
+        def progress(pages_done: int) -> None:
+            nonlocal last_write
+            if time.monotonic() - last_write >= PROGRESS_INTERVAL_SECONDS:
+                last_write = time.monotonic()
+                self.store.update(job.job_id, pages_done=pages_done, updated_at=now_iso())
+
+        try:
+            page_count = await extraction_executor.run(count_pdf_pages, job.pdf_bytes)
+            await asyncio.to_thread(self.store.update, job.job_id, pages_total=page_count, updated_at=now_iso())
+            result = await ingest_and_store(job.kind, job.uuid, job.pdf_bytes, job.digest, job.file_name,
+                                            job.date, job.normalize, page_count, progress)
+        except (DocumentExistsError, DocumentNotFoundError, PdfReadError) as e:
+            # An unreadable PDF, or a document changed since the job was accepted: retrying cannot help
+            await asyncio.to_thread(self._finish, job, "failed", error=f"{type(e).__name__}: {e}")
+        except Exception as e:
+            error = f"{type(e).__name__}: {e}"
+            if job.attempts >= self.max_attempts:
+                await asyncio.to_thread(self._finish, job, "failed", error=error)
+                return
+            self.retried += 1
+            await asyncio.to_thread(self.store.update, job.job_id, status="queued", error=error,
+                                    updated_at=now_iso())
+            task = asyncio.create_task(self._retry_later(job, self.retry_seconds * 2 ** (job.attempts - 1)))
+            self._retries.add(task)
+            task.add_done_callback(self._retries.discard)
+        else:
+            job.pdf_bytes = b""
+            await asyncio.to_thread(self._finish, job, "succeeded", pages_done=result["pages"],
+                                    pages_total=result["pages"], error=None, result=result)
+
+    def stats(self) -> dict:
+        return {
+            "workers": self.workers,
+            "queue_size": self.queue_size,
+            "queued": self._queue.qsize() if self._queue is not None else 0,
+            "waiting_retry": len(self._retries),
+            "running": self._running,
+            "submitted": self.submitted,
+            "succeeded": self.succeeded,
+            "failed": self.failed,
+            "retried": self.retried,
+            "purged": self.purged,
+        }
+
+
+ingest_jobs = IngestJobQueue(job_store)
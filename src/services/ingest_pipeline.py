@@ -0,0 +1,398 @@
+# src/services/ingest_pipeline.py
+import asyncio
+import logging
+import os
+from collections.abc import AsyncIterator, Callable, Iterable
+from contextlib import aclosing
+
+from dotenv import load_dotenv, find_dotenv
+
+from src.data_store import data_store
+from src.services.answer_cache import answer_cache
+from src.services.context_cache import context_cache
+from src.services.dense_index import dense_index
+from src.services.extraction_cache import extraction_cache
+from src.services.extraction_executor import extraction_executor
+from src.services.retrieval import (
+    chunk_record,
+    retrieval_indexes,
+    RETRIEVAL_CHUNK_WORDS,
+    RETRIEVAL_CHUNK_OVERLAP_WORDS,
+)
+from src.services.search_index import search_index
+from src.services.single_flight import SingleFlight
+from src.utils.pdf_processor import join_pages
+from src.utils.text_chunker import ChunkStream
+from src.utils.text_normalizer import find_page_number_offsets, find_repeated_lines, normalize_page
+from src.utils.token_estimator import estimate_tokens
+
+load_dotenv(find_dotenv())
+logger = logging.getLogger(__name__)
+
+# -------------------------------
+# Config
+# -------------------------------
+# Extracted pages that may wait for the indexing stage before extraction pauses
+INGEST_QUEUE_PAGES = int(os.getenv("INGEST_QUEUE_PAGES", "32"))
+# Strip running headers/footers and ragged whitespace from uploads (true | false)
+NORMALIZE_TEXT = os.getenv("NORMALIZE_TEXT", "true").lower() == "true"
+# Leading pages used to learn which header/footer lines repeat
+NORMALIZE_SAMPLE_PAGES = int(os.getenv("NORMALIZE_SAMPLE_PAGES", "24"))
+
+
+class PageNormalizer:
+    """
+    Normalization stage of the pipeline (see text_normalizer): drops
+    running headers, footers and page numbers, collapses whitespace and
+    joins hyphenated line breaks.
+
+    Repeated lines and the page numbering are learned from the first
+    `sample_pages` pages, which are held back until the sample is
+    complete (or the document ends); later pages are normalized as they
+    arrive. A bare number is only dropped as a page number when it fits
+    the numbering learned from the sample. Byte and token totals
+    before and after normalization are kept for the upload response.
+    """
+
+    def __init__(self, sample_pages: int = NORMALIZE_SAMPLE_PAGES):
+        self.sample_pages = max(1, sample_pages)
+        self.repeated: set[str] | None = None
+        self.page_number_offsets: set[int] = set()
+        self._held: list[tuple[str, int]] = []
+        self._index = 0
+        self.raw_bytes = 0
+        self.bytes = 0
+        self.raw_tokens = 0
+        self.tokens = 0
+
+    def _normalize(self, text: str, tokens: int) -> tuple[str, int]:
+        page_numbers = {self._index + offset for offset in self.page_number_offsets}
+        self._index += 1
+        clean = normalize_page(text, self.repeated, page_numbers)
+        clean_tokens = tokens if clean == text else estimate_tokens(clean)
+        self.raw_bytes += len(text.encode("utf-8"))
+        self.bytes += len(clean.encode("utf-8"))
+        self.raw_tokens += tokens
+        self.tokens += clean_tokens
+        return clean, clean_tokens
+
+    def _release(self) -> list[tuple[str, int]]:
+        sample = [text for text, _ in self._held]
+        self.repeated = find_repeated_lines(sample)
+        self.page_number_offsets = find_page_number_offsets(sample)
+        held, self._held = self._held, []
+        return [self._normalize(text, tokens) for text, tokens in held]
+
+    def add(self, text: str, tokens: int) -> list[tuple[str, int]]:
+        """Takes one extracted page; returns the normalized pages that are ready, in order."""
+        if self.repeated is not None:
+            return [self._normalize(text, tokens)]
+        self._held.append((text, tokens))
+        return self._release() if len(self._held) >= self.sample_pages else []
+
+    def finish(self) -> list[tuple[str, int]]:
+        """Returns the pages still held back when the document has fewer pages than the sample."""
+        return self._release() if self.repeated is None else []
+
+    def report(self) -> dict:
+        return {
+            "raw_bytes": self.raw_bytes,
+            "bytes_saved": self.raw_bytes - self.bytes,
+            "raw_tokens": self.raw_tokens,
+            "tokens_saved": self.raw_tokens - self.tokens,
+            "repeated_lines": sorted(self.repeated or ()),
+        }
+
+
+class SegmentBuilder:
+    """
+    Turns the pages of one PDF, fed one at a time, into everything that
+    storing and indexing it as a segment needs: the page records (offsets
+    into join_pages(pages) and token counts) and the BM25 chunk records.
+    Chunks are cut across page boundaries exactly as if the joined text
+    had been chunked at once.
+
+    The builder holds the whole segment until finish(): every page, every
+    chunk record and, while finish() joins them, the document text too.
+    Segments are stored in one transaction, so peak memory grows with the
+    extracted text of the document (about twice its size), not with the
+    window size.
+    """
+
+    def __init__(self):
+        self.pages: list[str] = []
+        self.page_tokens: list[int] = []
+        self.records: list[dict] = []
+        self.chunks: list[tuple] = []
+        self._position = 0
+        self._chunker = ChunkStream(RETRIEVAL_CHUNK_WORDS, RETRIEVAL_CHUNK_OVERLAP_WORDS)
+
+    def add_page(self, text: str, tokens: int) -> None:
+        start = self._position
+        if text:
+            piece = text
+            if self._position:
+                piece = "\n" + text  # join_pages separator
+                start += 1
+            self._position += len(piece)
+            for chunk in self._chunker.feed(piece):
+                self.chunks.append(chunk_record(*chunk))
+        self.pages.append(text)
+        self.page_tokens.append(tokens)
+        self.records.append({"start": start, "end": start + len(text), "tokens": tokens})
+
+    def finish(self) -> dict:
+        """
+        Returns {"text", "pages", "token_count", "chunks"}; "pages" are page
+        records for the document store and "chunks" are chunk records
+        relative to the segment.
+        """
+        for chunk in self._chunker.finish():
+            self.chunks.append(chunk_record(*chunk))
+        return {
+            "text": join_pages(self.pages),
+            "pages": self.records,
+            "token_count": sum(self.page_tokens),
+            "chunks": self.chunks,
+        }
+
+
+async def _iterate(pages: Iterable[tuple[str, int]]) -> AsyncIterator[tuple[str, int]]:
+    for page in pages:
+        yield page
+
+
+async def build_segment(pages: AsyncIterator[tuple[str, int]], normalize: bool = NORMALIZE_TEXT,
+                        queue_pages: int = INGEST_QUEUE_PAGES,
+                        progress: Callable[[int], None] | None = None,
+                        raw_pages: Callable[[list[tuple[str, int]]], None] | None = None) -> dict:
+    """
+    Runs the extraction and the normalization/indexing stages of a PDF
+    concurrently.
+
+    The extraction stage drains `pages` into a bounded queue; the other
+    stage takes whatever pages are waiting and normalizes, chunks and
+    tokenizes them in a worker thread, so page N is indexed while page
+    N+1 is parsed. When indexing falls behind, the full queue stops the
+    extraction stage, which in turn stops submitting page windows to the
+    pool. `progress`, if given, is called from the indexing thread with
+    the number of pages processed so far after every batch; `raw_pages`,
+    if given, is called there with every batch of pages as extracted,
+    before normalization. The queue bounds how far extraction runs ahead,
+    not the memory of the result (see SegmentBuilder).
+    Returns SegmentBuilder.finish() plus "normalization" (the
+    PageNormalizer report, None when `normalize` is off); the first error
+    of either stage is raised and the other stage is cancelled.
+    """
+    queue: asyncio.Queue = asyncio.Queue(maxsize=max(1, queue_pages))
+    normalizer = PageNormalizer() if normalize else None
+    builder = SegmentBuilder()
+    processed = 0
+
+    async def extract_stage() -> None:
+        async with aclosing(pages) as source:
+            async for page in source:
+                await queue.put(page)
+        await queue.put(None)
+
+    def index_pages(batch: list[tuple[str, int]]) -> None:
+        nonlocal processed
+        if raw_pages:
+            raw_pages(batch)
+        for text, tokens in batch:
+            ready = normalizer.add(text, tokens) if normalizer else [(text, tokens)]
+            for page in ready:
+                builder.add_page(*page)
+        processed += len(batch)
+        if progress and batch:
+            progress(processed)
+
+    def finish() -> dict:
+        if normalizer:
+            for page in normalizer.finish():
+                builder.add_page(*page)
+        return {**builder.finish(), "normalization": normalizer.report() if normalizer else None}
+
+    async def index_stage() -> None:
+        done = False
+        while not done:
+            batch = [await queue.get()]
+            while not queue.empty():
+                batch.append(queue.get_nowait())
+            if batch[-1] is None:
+                batch.pop()
+                done = True
+            await asyncio.to_thread(index_pages, batch)
+
+    tasks = [asyncio.ensure_future(extract_stage()), asyncio.ensure_future(index_stage())]
+    try:
+        await asyncio.gather(*tasks)
+    except BaseException:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        raise
+    return await asyncio.to_thread(finish)
+
+
+# Concurrent uploads of the same bytes share one pipeline run
+ingest_flights = SingleFlight()
+
+
+async def ingest_pdf(pdf_bytes: bytes, digest: str, normalize: bool = NORMALIZE_TEXT,
+                     page_count: int | None = None,
+                     progress: Callable[[int], None] | None = None) -> dict:
+    """
+    Extracts, normalizes and indexes an uploaded PDF, ready to be stored
+    as a segment; `normalize=False` keeps the text exactly as extracted.
+    `page_count` spares the extractor counting pages when the caller
+    already did; `progress` is passed to build_segment (it is not called
+    when the run is shared with a concurrent upload of the same bytes).
+    A PDF whose digest is in the extraction cache is not parsed again;
+    its cached pages only go through the later stages. Otherwise the
+    pool extracts the PDF window by window into the pipeline (once,
+    however many requests upload the same bytes) and the raw pages are
+    written to the extraction cache as they come, so either form can be
+    rebuilt without parsing the PDF again. The whole segment is held in
+    memory until it is stored (see SegmentBuilder).
+    Returns build_segment()'s dict plus "extraction_cached".
+    Raises the extraction executor's ExtractionQueueFull / ExtractionTimeout.
+    """
+    cached = await asyncio.to_thread(extraction_cache.get, digest)
+    if cached is not None:
+        segment = await build_segment(_iterate(zip(*cached)), normalize, progress=progress)
+        return {**segment, "extraction_cached": True}
+
+    async def ingest() -> dict:
+        entry = None
+
+        def cache_failed(e: OSError) -> None:
+            nonlocal entry
+            entry = None
+            logger.warning("Could not cache extraction result %s: %s", digest, e)
+
+        def cache_pages(batch: list[tuple[str, int]]) -> None:
+            if entry is not None:
+                try:
+                    entry.add(batch)
+                except OSError as e:
+                    cache_failed(e)
+
+        try:
+            entry = await asyncio.to_thread(extraction_cache.writer, digest)
+        except OSError as e:
+            cache_failed(e)
+
+        try:
+            segment = await build_segment(extraction_executor.stream_pages(pdf_bytes, page_count), normalize,
+                                          progress=progress, raw_pages=cache_pages)
+        except BaseException:
+            if entry is not None:
+                await asyncio.to_thread(entry.discard)
+            raise
+        if entry is not None:
+            try:
+                await asyncio.to_thread(entry.commit)
+            except OSError as e:
+                cache_failed(e)
+        return segment
+
+    segment, _ = await ingest_flights.do(f"{digest}:{'normalized' if normalize else 'raw'}", ingest)
+    return {**segment, "extraction_cached": False}
+
+
+# -------------------------------
+# Storing an ingested PDF
+# -------------------------------
+async def store_new_document(uuid_str: str, file_name: str, date: str, segment: dict) -> int:
+    """
+    Stores an ingested PDF (see ingest_pdf) as a new document and adds it
+    to this worker's retrieval, search and routing indexes.
+    Returns the document version.
+    Raises DocumentExistsError if the UUID is taken.
+    """
+    version = await asyncio.to_thread(data_store.create, uuid_str, file_name=file_name, date=date,
+                                      text=segment["text"], pages=segment["pages"],
+                                      normalized=segment["normalization"] is not None)
+    await asyncio.to_thread(retrieval_indexes.build_from_chunks, uuid_str, version, segment["chunks"])
+    await asyncio.to_thread(search_index.add_segment, uuid_str, version, None, 0, segment["text"])
+    await asyncio.to_thread(dense_index.add_chunks, uuid_str, version, None, segment["chunks"])
+    return version
+
+
+async def store_appended_segment(uuid_str: str, file_name: str, date: str, segment: dict) -> dict:
+    """
+    Appends an ingested PDF to a document as a new segment, drops the
+    document's cached answers and contexts and extends the indexes.
+    Returns data_store.append_segment()'s dict.
+    Raises DocumentNotFoundError if the document is missing.
+    """
+    appended = await asyncio.to_thread(data_store.append_segment, uuid_str, file_name=file_name, date=date,
+                                       text=segment["text"], pages=segment["pages"],
+                                       normalized=segment["normalization"] is not None)
+    answer_cache.invalidate(uuid_str)
+    await asyncio.to_thread(context_cache.invalidate, uuid_str)
+    await asyncio.to_thread(
+        retrieval_indexes.extend, uuid_str, appended["version"], appended["previous_version"],
+        segment["chunks"], appended["segment"]["start"]
+    )
+    await asyncio.to_thread(
+        search_index.add_segment, uuid_str, appended["version"], appended["previous_version"],
+        appended["segment"]["seq"], segment["text"]
+    )
+    await asyncio.to_thread(
+        dense_index.add_chunks, uuid_str, appended["version"], appended["previous_version"], segment["chunks"]
+    )
+    return appended
+
+
+# -------------------------------
+# Deleting a document
+# -------------------------------
+async def delete_document(uuid_str: str) -> dict | None:
+    """
+    Deletes a document and evicts everything derived from it in this
+    worker: retrieval, search and routing index entries and cached
+    answers and contexts. Other workers never serve these, as they are
+    tagged with a version the store will not hand out again, and drop
+    them on their next sync or cache write.
+    Returns data_store.delete()'s metadata, or None if the document did not exist.
+    """
+    deleted = await asyncio.to_thread(data_store.delete, uuid_str)
+    if deleted is None:
+        return None
+    retrieval_indexes.invalidate(uuid_str)
+    answer_cache.invalidate(uuid_str)
+    await asyncio.to_thread(search_index.remove_document, uuid_str)
+    await asyncio.to_thread(dense_index.remove_document, uuid_str)
+    await asyncio.to_thread(context_cache.invalidate, uuid_str)
+    return deleted
+
+
+async def ingest_and_store(kind: str, uuid_str: str, pdf_bytes: bytes, digest: str, file_name: str,
+                           date: str, normalize: bool = NORMALIZE_TEXT, page_count: int | None = None,
+                           progress: Callable[[int], None] | None = None) -> dict:
+    """
+    Runs an upload ("upload": new document) or update ("update": appended
+    segment) from the PDF bytes to the stored, indexed document.
+    Returns the response body of the matching endpoint.
+    Raises ExtractionQueueFull / ExtractionTimeout, DocumentExistsError
+    (upload) or DocumentNotFoundError (update).
+    """
+    segment = await ingest_pdf(pdf_bytes, digest, normalize, page_count, progress)
+    result = {
+        "uuid": uuid_str,
+        "file_name": file_name,
+        "date": date,
+        "pages": len(segment["pages"]),
+        "sha256": digest,
+        "extraction_cached": segment["extraction_cached"],
+        "normalization": segment["normalization"],
+    }
+    if kind == "upload":
+        await store_new_document(uuid_str, file_name, date, segment)
+        return {"message": "File uploaded and text extracted successfully.", **result,
+                "token_count": segment["token_count"]}
+    appended = await store_appended_segment(uuid_str, file_name, date, segment)
+    return {"message": "New PDF text appended successfully.", **result,
+            "segment": appended["segment"]["seq"], "token_count": appended["token_count"]}
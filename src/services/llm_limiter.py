@@ -0,0 +1,107 @@
+# src/services/llm_limiter.py
+import asyncio
+import os
+from contextlib import asynccontextmanager
+
+from dotenv import load_dotenv, find_dotenv
+
+load_dotenv(find_dotenv())
+
+# -------------------------------
+# Config
+# -------------------------------
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "64"))
+LLM_MAX_CONCURRENCY_PER_USER = int(os.getenv("LLM_MAX_CONCURRENCY_PER_USER", "4"))
+LLM_QUEUE_TIMEOUT_SECONDS = float(os.getenv("LLM_QUEUE_TIMEOUT_SECONDS", "30"))
+
+
+class LLMBusyError(Exception):
+    """Raised when no LLM slot frees up within the queue timeout; `user_key` is the caller that waited."""
+
+    def __init__(self, message: str, user_key: str | None = None):
+        super().__init__(message)
+        self.user_key = user_key
+
+
+class ConcurrencyLimiter:
+    """
+    Caps in-flight LLM calls of this worker, globally and per user.
+
+    A caller first takes a slot of its own user, then a global slot, so
+    one chatty user can never hold more than `per_user_limit` of the
+    global slots. Per-user semaphores are dropped once nobody uses them.
+    """
+
+    def __init__(self, global_limit: int, per_user_limit: int, queue_timeout: float):
+        self.global_limit = global_limit
+        self.per_user_limit = per_user_limit
+        self.queue_timeout = queue_timeout
+        self._global = asyncio.Semaphore(global_limit)
+        self._users: dict[str, list] = {}  # user key -> [semaphore, holders + waiters]
+
+        self.active = 0
+        self.waiting = 0
+        self.peak_active = 0
+        self.completed = 0
+        self.rejected = 0
+
+    @asynccontextmanager
+    async def acquire(self, user_key: str):
+        """
+        Holds one global and one per-user slot for the duration of the block.
+        Raises LLMBusyError if both cannot be obtained within `queue_timeout`.
+        """
+        entry = self._users.setdefault(user_key, [asyncio.Semaphore(self.per_user_limit), 0])
+        entry[1] += 1
+        user_semaphore = entry[0]
+        self.waiting += 1
+        try:
+            try:
+                async with asyncio.timeout(self.queue_timeout):
+                    await user_semaphore.acquire()
+                    try:
+                        await self._global.acquire()
+                    except BaseException:
+                        user_semaphore.release()
+                        raise
+            except TimeoutError:
+                self.rejected += 1
+                raise LLMBusyError(
+                    f"Too many LLM requests in progress; no slot within {self.queue_timeout:.0f} seconds.",
+                    user_key,
+                )
+            finally:
+                self.waiting -= 1
+
+            self.active += 1
+            self.peak_active = max(self.peak_active, self.active)
+            try:
+                yield
+            finally:
+                self.active -= 1
+                self.completed += 1
+                self._global.release()
+                user_semaphore.release()
+        finally:
+            entry[1] -= 1
+            if entry[1] == 0 and self._users.get(user_key) is entry:
+                del self._users[user_key]
+
+    def stats(self) -> dict:
+        return {
+            "global_limit": self.global_limit,
+            "per_user_limit": self.per_user_limit,
+            "active": self.active,
+            "waiting": self.waiting,
+            "peak_active": self.peak_active,
+            "completed": self.completed,
+            "rejected": self.rejected,
+            "users_in_flight": len(self._users),
+        }
+
+
+llm_limiter = ConcurrencyLimiter(
+    global_limit=LLM_MAX_CONCURRENCY,
+    per_user_limit=LLM_MAX_CONCURRENCY_PER_USER,
+    queue_timeout=LLM_QUEUE_TIMEOUT_SECONDS,
+)
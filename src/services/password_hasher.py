@@ -0,0 +1,183 @@
+# src/services/password_hasher.py
+import asyncio
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable
+
+from dotenv import load_dotenv, find_dotenv
+
+from src.data_store import APP_WORKERS
+from src.utils.password_utils import (
+    build_context,
+    calibrate_rounds,
+    hash_password,
+    verify_and_update,
+    BCRYPT_DEFAULT_ROUNDS,
+)
+
+load_dotenv(find_dotenv())
+logger = logging.getLogger(__name__)
+
+# -------------------------------
+# Config
+# -------------------------------
+# bcrypt releases the GIL, so threads hash in parallel; more threads than cores only queue
+PASSWORD_HASH_WORKERS = int(os.getenv(
+    "PASSWORD_HASH_WORKERS", str(max(1, (os.cpu_count() or 1) // max(1, APP_WORKERS)))
+))
+PASSWORD_HASH_QUEUE_SIZE = int(os.getenv("PASSWORD_HASH_QUEUE_SIZE", "64"))
+# Fixed bcrypt cost; 0 picks the cost that takes about BCRYPT_TARGET_MS at startup
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "0"))
+BCRYPT_TARGET_MS = float(os.getenv("BCRYPT_TARGET_MS", "250"))
+
+
+class PasswordHasherBusy(Exception):
+    """Raised when the password hashing queue has no free slot."""
+
+
+def _timed_call(fn: Callable, args: tuple) -> tuple[float, Any]:
+    """Runs in a hashing thread; returns the start time with the result."""
+    started_at = time.perf_counter()
+    return started_at, fn(*args)
+
+
+class PasswordHasher:
+    """
+    Dedicated thread pool for bcrypt, so a burst of signups and logins
+    queues here instead of on the event loop or Starlette's shared
+    thread pool that every sync endpoint and to_thread call uses.
+
+    - At most `workers` hashes run at once; up to `queue_size` more may
+      wait. Anything beyond that is rejected with PasswordHasherBusy.
+    - The bcrypt cost is `rounds`, or with rounds=0 the highest cost that
+      stays within `target_ms` on this host (see `calibrate`).
+    - `verify` re-hashes a password whose stored hash has a lower cost
+      than the current one and returns the new hash for the caller to save.
+    """
+
+    def __init__(self, workers: int, queue_size: int, rounds: int = 0, target_ms: float = BCRYPT_TARGET_MS):
+        self.workers = max(1, workers)
+        self.queue_size = max(0, queue_size)
+        self.target_ms = target_ms
+        self.pinned = rounds > 0
+        self.rounds = rounds if self.pinned else BCRYPT_DEFAULT_ROUNDS
+        self.estimated_ms: float | None = None
+        self.context = build_context(self.rounds)
+
+        self._pool: ThreadPoolExecutor | None = None
+        self._lock = threading.Lock()
+
+        self._in_flight = 0
+        self._completed = 0
+        self._rejected = 0
+        self._rehashed = 0
+        self._total_wait = 0.0
+        self._max_wait = 0.0
+        self._total_run = 0.0
+
+    # ---------- lifecycle ----------
+    def start(self) -> None:
+        """Creates the thread pool (called from the app lifespan)."""
+        with self._lock:
+            if self._pool is None:
+                self._pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="bcrypt")
+
+    async def calibrate(self) -> None:
+        """Picks the bcrypt cost for this host unless BCRYPT_ROUNDS fixes it."""
+        if self.pinned:
+            return
+        self.rounds, self.estimated_ms = await self.run(calibrate_rounds, self.target_ms)
+        self.context = build_context(self.rounds)
+        logger.info("Password hashing: bcrypt cost %d (~%.0f ms per hash)", self.rounds, self.estimated_ms)
+
+    def shutdown(self) -> None:
+        """Stops the pool; hashes that have not started are cancelled."""
+        with self._lock:
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.shutdown(wait=False, cancel_futures=True)
+
+    # ---------- jobs ----------
+    def _admit(self) -> None:
+        with self._lock:
+            if self._in_flight >= self.workers + self.queue_size:
+                self._rejected += 1
+                raise PasswordHasherBusy(
+                    f"Too many sign-ins in progress ({self._in_flight} password hashes in flight). Try again shortly."
+                )
+            self._in_flight += 1
+
+    def _release(self, _future=None) -> None:
+        with self._lock:
+            self._in_flight -= 1
+
+    async def run(self, fn: Callable, *args) -> Any:
+        """
+        Runs `fn(*args)` in the pool and awaits the result.
+        Raises PasswordHasherBusy if no queue slot is free.
+        """
+        self._admit()
+        try:
+            self.start()
+            submitted_at = time.perf_counter()
+            future = self._pool.submit(_timed_call, fn, args)
+        except BaseException:
+            self._release()
+            raise
+        future.add_done_callback(self._release)
+
+        started_at, result = await asyncio.wrap_future(future)
+        finished_at = time.perf_counter()
+        wait = max(0.0, started_at - submitted_at)
+        with self._lock:
+            self._completed += 1
+            self._total_wait += wait
+            self._max_wait = max(self._max_wait, wait)
+            self._total_run += finished_at - started_at
+        return result
+
+    async def hash(self, password: str) -> str:
+        """Hashes a password with the current cost."""
+        return await self.run(hash_password, password, self.context)
+
+    async def verify(self, password: str, password_hash: str) -> tuple[bool, str | None]:
+        """
+        Checks a password against its stored hash.
+        Returns (valid, new hash to store or None when the cost is current).
+        """
+        valid, new_hash = await self.run(verify_and_update, password, password_hash, self.context)
+        if new_hash is not None:
+            with self._lock:
+                self._rehashed += 1
+        return valid, new_hash
+
+    # ---------- metrics ----------
+    def stats(self) -> dict:
+        """Returns pool size, queue depth, wait/run times and the bcrypt cost."""
+        with self._lock:
+            done = self._completed
+            return {
+                "workers": self.workers,
+                "queue_size": self.queue_size,
+                "in_flight": self._in_flight,
+                "queue_depth": max(0, self._in_flight - self.workers),
+                "completed": done,
+                "rejected": self._rejected,
+                "rehashed": self._rehashed,
+                "avg_wait_ms": round(self._total_wait / done * 1000, 2) if done else 0.0,
+                "max_wait_ms": round(self._max_wait * 1000, 2),
+                "avg_run_ms": round(self._total_run / done * 1000, 2) if done else 0.0,
+                "bcrypt_rounds": self.rounds,
+                "calibrated": self.estimated_ms is not None,
+                "target_ms": None if self.pinned else self.target_ms,
+            }
+
+
+password_hasher = PasswordHasher(
+    workers=PASSWORD_HASH_WORKERS,
+    queue_size=PASSWORD_HASH_QUEUE_SIZE,
+    rounds=BCRYPT_ROUNDS,
+)
@@ -0,0 +1,554 @@
+# src/services/query_service.py
+import asyncio
+import bisect
+import hashlib
+import logging
+import os
+from contextlib import aclosing
+
+from dotenv import load_dotenv, find_dotenv
+
+from src.database.document_store import SEGMENT_SEPARATOR
+from src.services.answer_cache import answer_cache, normalize_query
+from src.services.context_cache import context_cache
+from src.services.context_packer import (
+    pack_document,
+    pack_stored_document,
+    ContextTooLargeError,
+    CONTEXT_OVERFLOW_POLICY,
+)
+from src.services.llm_limiter import llm_limiter, LLMBusyError
+from src.services.retrieval import retrieval_indexes, RETRIEVAL_TOKEN_BUDGET
+from src.services.single_flight import SingleFlight
+from src.utils.llm_client import (
+    aget_llm_response,
+    aget_llm_batch_response,
+    astream_llm_response,
+    CachedContentError,
+    build_batch_query,
+)
+from src.utils.page_ranges import parse_page_ranges, format_page_ranges, group_pages
+from src.utils.token_estimator import estimate_tokens
+
+load_dotenv(find_dotenv())
+logger = logging.getLogger(__name__)
+
+# LLM calls a single batch request may have in flight at once
+BATCH_MAX_CONCURRENCY = int(os.getenv("BATCH_MAX_CONCURRENCY", "4"))
+
+# Token budget shared by all documents of a multi-document query
+MULTI_QUERY_TOKEN_BUDGET = int(os.getenv("MULTI_QUERY_TOKEN_BUDGET", "8000"))
+
+MULTI_QUERY_INSTRUCTION = (
+    "The context consists of passages from several documents, each labelled "
+    "like [S1]. Cite the labels of the passages you used, e.g. [S1][S3]."
+)
+
+PAGE_CITATION_INSTRUCTION = (
+    "The context is split into pages marked like [Page 12]. "
+    "Cite the pages you used, e.g. (p. 12)."
+)
+
+# Tokens of one "[Page N]" marker in a page-scoped context
+PAGE_MARKER_TOKENS = 6
+
+
+# Identical queries in flight at the same time share one LLM call
+query_flights = SingleFlight()
+
+
+def user_key(current_user: dict) -> str:
+    """Key used for per-user limits: the JWT user_id, falling back to the email."""
+    return str(current_user.get("user_id") or current_user.get("email") or "anonymous")
+
+
+async def ask_llm(context: str, query: str, user: str, cached_content: str | None = None) -> dict:
+    """
+    Sends one query to the LLM through the worker's concurrency limiter.
+    Raises LLMBusyError when no slot frees up in time.
+    """
+    async with llm_limiter.acquire(user):
+        return await aget_llm_response(context=context, query=query, cached_content=cached_content)
+
+
+async def ask_full_document(uuid_str: str, stored: dict, query: str, user: str) -> dict:
+    """
+    Answers a query over the whole document, reusing the document's
+    context cache handle when one is available. A handle that expired on
+    the backend is dropped and the query is re-sent with inline context.
+    """
+    handle = await asyncio.to_thread(
+        context_cache.get_handle, uuid_str, stored["version"], stored["text"]
+    )
+    if handle:
+        try:
+            return await ask_llm(stored["text"], query, user, cached_content=handle)
+        except CachedContentError:
+            await asyncio.to_thread(context_cache.invalidate, uuid_str)
+    return await ask_llm(stored["text"], query, user)
+
+
+async def retrieve_context(uuid_str: str, stored: dict, query: str, top_k: int,
+                           token_budget: int = RETRIEVAL_TOKEN_BUDGET) -> str:
+    """Returns the best BM25 chunks of the document for a query, joined in document order."""
+    index = retrieval_indexes.get(uuid_str, stored["version"])
+    if index is None:
+        index = await asyncio.to_thread(retrieval_indexes.build_document, uuid_str, stored)
+    chunks = index.select_context(stored["text"], query, top_k=top_k, token_budget=token_budget)
+    return "\n\n---\n\n".join(chunks)
+
+
+# -------------------------------
+# Page-scoped context
+# -------------------------------
+def select_pages(page_records: list[dict] | None, spec: str) -> list[dict]:
+    """
+    Resolves a page selection such as "3-9" against the page records of a
+    document (DocumentStore.get_pages).
+    Returns the selected page records in page order.
+    Raises:
+        ValueError: If the selection is invalid or the document was stored
+                    without page offsets.
+    """
+    if not page_records or page_records[0]["start"] is None:
+        raise ValueError("This document has no page information; upload it again to query by page.")
+    ranges = parse_page_ranges(spec, len(page_records))
+    return [page_records[n - 1] for first, last in ranges for n in range(first, last + 1)]
+
+
+def pages_label(pages: list[dict]) -> str:
+    """Canonical selection string of page records, e.g. "1,4-6"."""
+    return format_page_ranges(group_pages([page["page"] for page in pages]))
+
+
+def page_char_ranges(pages: list[dict]) -> list[tuple[int, int]]:
+    """Sorted, merged character ranges covered by page records."""
+    ranges = []
+    for page in pages:
+        if page["end"] <= page["start"]:
+            continue
+        if ranges and page["start"] <= ranges[-1][1] + len(SEGMENT_SEPARATOR):
+            ranges[-1] = (ranges[-1][0], page["end"])
+        else:
+            ranges.append((page["start"], page["end"]))
+    return ranges
+
+
+def page_context(text: str, pages: list[dict]) -> str:
+    """The text of the selected non-empty pages, each headed by its page marker."""
+    return "\n\n".join(
+        f"[Page {page['page']}]\n{text[page['start']:page['end']]}"
+        for page in pages if page["end"] > page["start"]
+    )
+
+
+def span_pages(span: tuple[int, int], pages: list[dict]) -> list[int]:
+    """Numbers of the pages (from `pages`, sorted by offset) a character span overlaps."""
+    starts = [page["start"] for page in pages]
+    i = max(bisect.bisect_right(starts, span[0]) - 1, 0)
+    numbers = []
+    while i < len(pages) and pages[i]["start"] < span[1]:
+        if pages[i]["end"] > span[0]:
+            numbers.append(pages[i]["page"])
+        i += 1
+    return numbers
+
+
+async def retrieve_page_context(uuid_str: str, stored: dict, pages: list[dict], query: str,
+                                top_k: int, token_budget: int = RETRIEVAL_TOKEN_BUDGET) -> str:
+    """
+    Returns the best BM25 chunks within the selected pages, in document
+    order. Chunks are clipped to the selected pages and labelled with the
+    pages they come from.
+    """
+    index = retrieval_indexes.get(uuid_str, stored["version"])
+    if index is None:
+        index = await asyncio.to_thread(retrieval_indexes.build_document, uuid_str, stored)
+    within = page_char_ranges(pages)
+    text = stored["text"]
+
+    blocks = []
+    for chunk_id in index.select_chunks(query, top_k, token_budget, within):
+        chunk_start, chunk_end = index.spans[chunk_id]
+        for start, end in within:
+            start, end = max(start, chunk_start), min(end, chunk_end)
+            if start >= end:
+                continue
+            numbers = span_pages((start, end), pages)
+            label = f"Page {numbers[0]}" if len(numbers) == 1 else f"Pages {numbers[0]}-{numbers[-1]}"
+            blocks.append(f"[{label}]\n{text[start:end]}")
+    return "\n\n---\n\n".join(blocks)
+
+
+async def build_context(uuid_str: str, stored: dict, query: str, mode: str, top_k: int,
+                        pages: list[dict] | None = None) -> dict:
+    """
+    Builds the context of a query: the best chunks (retrieve mode) or the
+    document packed into the model token budget (full mode), limited to
+    the selected pages when `pages` is given.
+    Returns {"text", "tokens", "truncated", "full_document"}; "full_document"
+    is True when the text is the whole stored document, which can then be
+    served from the context cache.
+    Raises ContextTooLargeError under the reject policy.
+    """
+    if mode == "retrieve":
+        if pages is None:
+            text = await retrieve_context(uuid_str, stored, query, top_k)
+        else:
+            text = await retrieve_page_context(uuid_str, stored, pages, query, top_k)
+        return {"text": text, "tokens": estimate_tokens(text), "truncated": False, "full_document": False}
+
+    if pages is None:
+        packed = await asyncio.to_thread(pack_stored_document, stored, query)
+        return {**packed, "full_document": not packed["truncated"]}
+
+    text = page_context(stored["text"], pages)
+    tokens = sum(page["tokens"] for page in pages) + PAGE_MARKER_TOKENS * len(pages)
+    packed = await asyncio.to_thread(pack_document, text, tokens, query)
+    return {**packed, "full_document": False}
+
+
+def query_options(mode: str, top_k: int, pages: list[dict] | None = None) -> str:
+    """Part of the answer cache key describing how the context was built."""
+    options = f"retrieve:{top_k}" if mode == "retrieve" else "full"
+    if pages is not None:
+        options += f"|pages:{pages_label(pages)}"
+    return options
+
+
+def page_query(query: str, pages: list[dict] | None) -> str:
+    """The query sent to the model; page-scoped queries ask for page citations."""
+    return query if pages is None else f"{query}\n\n{PAGE_CITATION_INSTRUCTION}"
+
+
+async def answer_query(uuid_str: str, stored: dict, query: str, user: str, mode: str, top_k: int,
+                       pages: list[dict] | None = None) -> dict:
+    """
+    Answers a query, serving repeated questions from the answer cache.
+    Concurrent identical queries (same key as the cache) are coalesced
+    into one LLM call whose result or error reaches every caller. The
+    call runs under the limits of the caller that started it; when that
+    caller's slot wait times out, callers of other users ask again under
+    their own limits instead of failing with it.
+    With `pages` (from select_pages) the context is limited to those
+    pages and the model is asked to cite page numbers.
+    In full mode the context is fitted into the model token budget first
+    (raises ContextTooLargeError under the reject policy).
+    Returns {"llm_response", "context_chars", "context_tokens", "truncated",
+    "cached", "coalesced"}.
+    """
+    key = answer_cache.make_key(uuid_str, stored["version"], query, query_options(mode, top_k, pages))
+    cached = answer_cache.get(key)
+    if cached is not None:
+        return {**cached, "cached": True, "coalesced": False}
+
+    async def compute() -> dict:
+        context = await build_context(uuid_str, stored, query, mode, top_k, pages)
+        prompt = page_query(query, pages)
+        if context["full_document"]:
+            llm_response = await ask_full_document(uuid_str, stored, prompt, user)
+        else:
+            llm_response = await ask_llm(context["text"], prompt, user)
+
+        result = {
+            "llm_response": llm_response,
+            "context_chars": len(context["text"]),
+            "context_tokens": context["tokens"],
+            "truncated": context["truncated"],
+        }
+        answer_cache.put(key, result)
+        return result
+
+    while True:
+        try:
+            result, shared = await query_flights.do(key, compute)
+        except LLMBusyError as e:
+            if e.user_key in (None, user):
+                raise
+            continue
+        return {**result, "cached": False, "coalesced": shared}
+
+
+async def stream_answer(uuid_str: str, stored: dict, query: str, user: str, mode: str, top_k: int,
+                        pages: list[dict] | None = None):
+    """
+    Streams the answer to a query as {"text": ...} events followed by one
+    {"tokens_used": ..., "cached": ...} event. A cached answer is sent as a
+    single text event. The LLM slot is held until the stream ends or the
+    consumer closes the generator; only complete answers (streams that
+    ended with their token count) are cached.
+    Raises ContextTooLargeError before any LLM call if the context does
+    not fit the model budget under the reject policy.
+    """
+    key = answer_cache.make_key(uuid_str, stored["version"], query, query_options(mode, top_k, pages))
+    cached = answer_cache.get(key)
+    if cached is not None:
+        yield {"text": cached["llm_response"]["text"]}
+        yield {"tokens_used": cached["llm_response"]["tokens_used"], "cached": True}
+        return
+
+    built = await build_context(uuid_str, stored, query, mode, top_k, pages)
+    context, prompt = built["text"], page_query(query, pages)
+    handle = None
+    if built["full_document"]:
+        handle = await asyncio.to_thread(
+            context_cache.get_handle, uuid_str, stored["version"], stored["text"]
+        )
+
+    parts = []
+    tokens_used = 0
+    complete = False
+    async with llm_limiter.acquire(user):
+        if handle:
+            try:
+                async with aclosing(astream_llm_response(context, prompt, cached_content=handle)) as events:
+                    async for event in events:
+                        if "text" in event:
+                            parts.append(event["text"])
+                            yield event
+                        else:
+                            tokens_used, complete = event["tokens_used"], True
+                handle_failed = False
+            except CachedContentError:
+                await asyncio.to_thread(context_cache.invalidate, uuid_str)
+                handle_failed = True
+
+        if not handle or handle_failed:
+            async with aclosing(astream_llm_response(context, prompt)) as events:
+                async for event in events:
+                    if "text" in event:
+                        parts.append(event["text"])
+                        yield event
+                    else:
+                        tokens_used, complete = event["tokens_used"], True
+
+    if complete:
+        answer_cache.put(key, {
+            "llm_response": {"text": "".join(parts), "tokens_used": tokens_used},
+            "context_chars": len(context),
+            "context_tokens": built["tokens"],
+            "truncated": built["truncated"],
+        })
+    yield {"tokens_used": tokens_used, "cached": False}
+
+
+async def ask_llm_batch(uuid_str: str, stored: dict, questions: list[str], user: str,
+                        mode: str, top_k: int) -> dict:
+    """
+    Answers several questions in one LLM call. In retrieve mode the
+    context holds the best chunks for all questions of the pack.
+    Returns {"answers": [...], "tokens_used", "context_chars",
+    "context_tokens", "truncated"}.
+    """
+    if mode == "retrieve":
+        context = await retrieve_context(
+            uuid_str, stored, " ".join(questions),
+            top_k=top_k * len(questions),
+            token_budget=RETRIEVAL_TOKEN_BUDGET * len(questions),
+        )
+        sizes = {"context_chars": len(context), "context_tokens": estimate_tokens(context), "truncated": False}
+        async with llm_limiter.acquire(user):
+            return {**await aget_llm_batch_response(context, questions), **sizes}
+
+    packed = await asyncio.to_thread(pack_stored_document, stored, build_batch_query(questions))
+    sizes = {"context_chars": len(packed["text"]), "context_tokens": packed["tokens"], "truncated": packed["truncated"]}
+    if packed["truncated"]:
+        async with llm_limiter.acquire(user):
+            return {**await aget_llm_batch_response(packed["text"], questions), **sizes}
+
+    handle = await asyncio.to_thread(
+        context_cache.get_handle, uuid_str, stored["version"], stored["text"]
+    )
+    async with llm_limiter.acquire(user):
+        if handle:
+            try:
+                return {**await aget_llm_batch_response(stored["text"], questions, cached_content=handle), **sizes}
+            except CachedContentError:
+                await asyncio.to_thread(context_cache.invalidate, uuid_str)
+        return {**await aget_llm_batch_response(stored["text"], questions), **sizes}
+
+
+def _error_message(e: Exception) -> str:
+    if isinstance(e, (LLMBusyError, ContextTooLargeError)):
+        return str(e)
+    logger.error("Batch LLM call failed: %s", e)
+    return "LLM request failed."
+
+
+async def answer_batch(uuid_str: str, stored: dict, questions: list[str], user: str,
+                       mode: str, top_k: int, pack_size: int) -> dict:
+    """
+    Answers a checklist of questions about one document.
+
+    Cached answers are served directly and duplicate questions are asked
+    once. The rest run with at most BATCH_MAX_CONCURRENCY LLM calls in
+    flight; with pack_size > 1 up to that many questions share one call
+    (and its token usage, split evenly between them). Packed answers are
+    cached under their own key, so they are only served to later packed
+    batches, never to single queries.
+    Returns {"results": [...], "llm_calls": int, "total_tokens_used": int};
+    a question whose call failed has an "error" instead of "llm_response".
+    Raises ContextTooLargeError up front when the document alone is over
+    the model budget and the overflow policy is reject.
+    """
+    if mode == "full" and CONTEXT_OVERFLOW_POLICY != "truncate":
+        await asyncio.to_thread(pack_stored_document, stored, "")
+
+    options = query_options(mode, top_k)
+    pack_options = f"{options}|pack"
+    results: list[dict | None] = [None] * len(questions)
+    groups: dict[tuple, list[int]] = {}
+    for i, question in enumerate(questions):
+        key = answer_cache.make_key(uuid_str, stored["version"], question, options)
+        cached = answer_cache.get(key)
+        if cached is None and pack_size > 1:
+            cached = answer_cache.get(answer_cache.make_key(uuid_str, stored["version"], question, pack_options))
+        if cached is not None:
+            results[i] = {"question": question, "llm_response": cached["llm_response"], "cached": True}
+        else:
+            groups.setdefault(key, []).append(i)
+
+    semaphore = asyncio.Semaphore(BATCH_MAX_CONCURRENCY)
+    llm_calls = 0
+    total_tokens = 0
+
+    def fill(indexes: list[int], result: dict) -> None:
+        for i in indexes:
+            results[i] = {"question": questions[i], **result}
+
+    async def run_single(indexes: list[int]) -> None:
+        nonlocal llm_calls, total_tokens
+        try:
+            async with semaphore:
+                answer = await answer_query(uuid_str, stored, questions[indexes[0]], user, mode, top_k)
+        except Exception as e:
+            fill(indexes, {"error": _error_message(e)})
+            return
+        if not answer["cached"] and not answer["coalesced"]:
+            llm_calls += 1
+            total_tokens += answer["llm_response"]["tokens_used"]
+        fill(indexes, {"llm_response": answer["llm_response"], "cached": answer["cached"]})
+
+    async def run_pack(pack: list[tuple[tuple, list[int]]]) -> None:
+        nonlocal llm_calls, total_tokens
+        pack_questions = [questions[indexes[0]] for _, indexes in pack]
+        try:
+            async with semaphore:
+                response = await ask_llm_batch(uuid_str, stored, pack_questions, user, mode, top_k)
+        except Exception as e:
+            for _, indexes in pack:
+                fill(indexes, {"error": _error_message(e)})
+            return
+        llm_calls += 1
+        total_tokens += response["tokens_used"]
+        share = response["tokens_used"] // len(pack)
+        for (_, indexes), question, answer in zip(pack, pack_questions, response["answers"]):
+            if answer is None:
+                fill(indexes, {"error": "The model did not return an answer for this question."})
+                continue
+            llm_response = {"text": answer, "tokens_used": share}
+            answer_cache.put(answer_cache.make_key(uuid_str, stored["version"], question, pack_options), {
+                "llm_response": llm_response,
+                "context_chars": response["context_chars"],
+                "context_tokens": response["context_tokens"],
+                "truncated": response["truncated"],
+            })
+            fill(indexes, {"llm_response": llm_response, "cached": False})
+
+    pending = list(groups.items())
+    if pack_size <= 1:
+        await asyncio.gather(*(run_single(indexes) for _, indexes in pending))
+    else:
+        packs = [pending[i:i + pack_size] for i in range(0, len(pending), pack_size)]
+        await asyncio.gather(*(run_pack(pack) for pack in packs))
+
+    return {"results": results, "llm_calls": llm_calls, "total_tokens_used": total_tokens}
+
+
+async def document_passages(uuid_str: str, stored: dict, query: str, top_k: int) -> list[dict]:
+    """
+    Returns the best BM25 passages of one document, best first, each tagged
+    with the document and a score relative to the document's best passage.
+    """
+    index = retrieval_indexes.get(uuid_str, stored["version"])
+    if index is None:
+        index = await asyncio.to_thread(retrieval_indexes.build_document, uuid_str, stored)
+    passages = await asyncio.to_thread(index.passages, stored["text"], query, top_k)
+    if not passages:
+        # No query term occurs in the document: offer its opening chunks at score 0
+        passages = [
+            {"chunk_id": i, "score": 0.0, "tokens": index.chunk_tokens[i], "text": stored["text"][start:end]}
+            for i, (start, end) in enumerate(index.spans[:top_k])
+        ]
+    best = passages[0]["score"] if passages else 0.0
+    return [
+        {**p, "uuid": uuid_str, "file_name": stored["file_name"],
+         "relative_score": p["score"] / best if best else 0.0}
+        for p in passages
+    ]
+
+
+def merge_passages(per_document: list[list[dict]], token_budget: int) -> list[dict]:
+    """
+    Merges the ranked passages of several documents into one list that fits
+    in `token_budget`. Passages with the same normalized text are kept once.
+    Every document first gets its best passage, then the remaining budget
+    goes to the highest relative scores, so one long document cannot crowd
+    out the others.
+    """
+    firsts = [passages[0] for passages in per_document if passages]
+    rest = sorted(
+        (p for passages in per_document for p in passages[1:]),
+        key=lambda p: p["relative_score"],
+        reverse=True,
+    )
+
+    chosen, seen, used = [], set(), 0
+    for passage in firsts + rest:
+        digest = hashlib.sha256(normalize_query(passage["text"]).encode("utf-8")).digest()
+        if digest in seen:
+            continue
+        cost = passage["tokens"]
+        if used + cost > token_budget:
+            continue
+        seen.add(digest)
+        chosen.append(passage)
+        used += cost
+    return chosen
+
+
+async def answer_multi_document(documents: dict[str, dict], query: str, user: str, top_k: int,
+                                token_budget: int = MULTI_QUERY_TOKEN_BUDGET) -> dict:
+    """
+    Answers one query over several documents with a single LLM call.
+
+    Passages are retrieved from every document concurrently, merged within
+    the shared token budget and labelled [S1], [S2], ... in the context.
+    Returns {"llm_response", "context_chars", "context_tokens", "sources"}; each source maps
+    a label to its document and chunk.
+    """
+    per_document = await asyncio.gather(*(
+        document_passages(uuid_str, stored, query, top_k) for uuid_str, stored in documents.items()
+    ))
+    passages = merge_passages(per_document, token_budget)
+
+    sources, blocks = [], []
+    for n, passage in enumerate(passages, start=1):
+        label = f"S{n}"
+        sources.append({
+            "source": label,
+            "uuid": passage["uuid"],
+            "file_name": passage["file_name"],
+            "chunk_id": passage["chunk_id"],
+            "score": round(passage["score"], 3),
+        })
+        blocks.append(f"[{label}] ({passage['file_name']}, {passage['uuid']})\n{passage['text']}")
+
+    context = "\n\n---\n\n".join(blocks)
+    llm_response = await ask_llm(context, f"{query}\n\n{MULTI_QUERY_INSTRUCTION}", user)
+    return {
+        "llm_response": llm_response,
+        "context_chars": len(context),
+        "context_tokens": sum(passage["tokens"] for passage in passages),
+        "sources": sources,
+    }
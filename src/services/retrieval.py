@@ -0,0 +1,278 @@
+# src/services/retrieval.py
+import bisect
+import copy
+import math
+import os
+import re
+import threading
+from collections import Counter, OrderedDict
+
+from dotenv import load_dotenv, find_dotenv
+
+from src.utils.text_chunker import chunk_text
+from src.utils.token_estimator import estimate_tokens
+
+load_dotenv(find_dotenv())
+
+# -------------------------------
+# Config
+# -------------------------------
+RETRIEVAL_CHUNK_WORDS = int(os.getenv("RETRIEVAL_CHUNK_WORDS", "200"))
+RETRIEVAL_CHUNK_OVERLAP_WORDS = int(os.getenv("RETRIEVAL_CHUNK_OVERLAP_WORDS", "40"))
+RETRIEVAL_TOP_K = int(os.getenv("RETRIEVAL_TOP_K", "8"))
+RETRIEVAL_TOKEN_BUDGET = int(os.getenv("RETRIEVAL_TOKEN_BUDGET", "4000"))
+RETRIEVAL_INDEX_CACHE_SIZE = int(os.getenv("RETRIEVAL_INDEX_CACHE_SIZE", "128"))
+
+TOKEN_PATTERN = re.compile(r"\w+")
+STOPWORDS = frozenset(
+    "a an and are as at be by for from has have in is it its of on or that the "
+    "this to was were what when where which who why will with how do does".split()
+)
+
+
+def tokenize(text: str) -> list[str]:
+    """Lowercases text and splits it into word tokens, dropping stopwords."""
+    return [t for t in TOKEN_PATTERN.findall(text.lower()) if t not in STOPWORDS]
+
+
+def overlaps(span: tuple[int, int], ranges: list[tuple[int, int]]) -> bool:
+    """True if `span` overlaps one of `ranges` (sorted, non-overlapping [start, end) ranges)."""
+    i = bisect.bisect_left(ranges, (span[1],)) - 1
+    return i >= 0 and ranges[i][1] > span[0]
+
+
+def segment_spans(segments: list[dict]) -> list[tuple[int, int]]:
+    """Returns the (start, end) offsets of the segments of a stored document."""
+    return [(segment["start"], segment["end"]) for segment in segments]
+
+
+def chunk_record(start: int, end: int, chunk: str) -> tuple:
+    """
+    Tokenizes one chunk for indexing.
+    Returns (start, end, term counts, term total, estimated tokens); the
+    record holds everything BM25Index.add_chunks needs, so chunks can be
+    prepared ahead of time (e.g. while the rest of the PDF is extracted).
+    """
+    terms = tokenize(chunk)
+    return start, end, Counter(terms), len(terms), estimate_tokens(chunk)
+
+
+def segment_chunks(segment_text: str, chunk_words: int = RETRIEVAL_CHUNK_WORDS,
+                   overlap_words: int = RETRIEVAL_CHUNK_OVERLAP_WORDS) -> list[tuple]:
+    """Chunk records of a whole segment, with offsets relative to the segment."""
+    return [
+        chunk_record(start, end, segment_text[start:end])
+        for start, end in chunk_text(segment_text, chunk_words, overlap_words)
+    ]
+
+
+# -------------------------------
+# BM25 index over one document
+# -------------------------------
+class BM25Index:
+    """
+    Okapi BM25 inverted index over the chunks of a single document.
+    Chunks are kept as (start, end) offsets into the document text,
+    together with their estimated token counts. Every segment of the
+    document is chunked on its own, so appending a segment only indexes
+    the new text (`add_segment` / `add_chunks`).
+    """
+
+    def __init__(self, text: str, segments: list[tuple[int, int]] | None = None,
+                 chunk_words: int = RETRIEVAL_CHUNK_WORDS,
+                 overlap_words: int = RETRIEVAL_CHUNK_OVERLAP_WORDS,
+                 k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self.chunk_words = chunk_words
+        self.overlap_words = overlap_words
+        self.spans: list[tuple[int, int]] = []
+        self.postings: dict[str, list[tuple[int, int]]] = {}
+        self.lengths: list[int] = []
+        self.chunk_tokens: list[int] = []
+        self.total_length = 0
+        self.avg_length = 0.0
+
+        for start, end in (segments if segments is not None else [(0, len(text))]):
+            self.add_segment(text[start:end], start)
+
+    @classmethod
+    def from_chunks(cls, chunks: list[tuple]) -> "BM25Index":
+        """Builds the index of a one-segment document from its chunk records."""
+        index = cls("", [])
+        index.add_chunks(chunks, 0)
+        return index
+
+    def copy(self) -> "BM25Index":
+        """Returns an index that can be extended without changing this one."""
+        index = copy.copy(self)
+        index.spans = list(self.spans)
+        index.postings = {term: list(postings) for term, postings in self.postings.items()}
+        index.lengths = list(self.lengths)
+        index.chunk_tokens = list(self.chunk_tokens)
+        return index
+
+    def add_segment(self, segment_text: str, offset: int) -> None:
+        """Indexes the chunks of one segment whose text starts at `offset` in the document."""
+        self.add_chunks(segment_chunks(segment_text, self.chunk_words, self.overlap_words), offset)
+
+    def add_chunks(self, chunks: list[tuple], offset: int) -> None:
+        """
+        Adds the chunk records (see chunk_record) of one segment starting
+        at `offset`. A chunk's span is recorded before its postings, so a
+        search running concurrently never sees a posting without its span.
+        """
+        for start, end, term_counts, length, tokens in chunks:
+            chunk_id = len(self.spans)
+            self.spans.append((offset + start, offset + end))
+            self.lengths.append(length)
+            self.chunk_tokens.append(tokens)
+            for term, tf in term_counts.items():
+                self.postings.setdefault(term, []).append((chunk_id, tf))
+            self.total_length += length
+
+        self.avg_length = (self.total_length / len(self.lengths)) if self.lengths else 0.0
+
+    def idf(self, term: str) -> float:
+        df = len(self.postings.get(term, ()))
+        n = len(self.spans)
+        return math.log(1 + (n - df + 0.5) / (df + 0.5))
+
+    def search(self, query: str, top_k: int,
+               within: list[tuple[int, int]] | None = None) -> list[tuple[int, float]]:
+        """
+        Returns up to `top_k` (chunk_id, score) pairs, best first.
+        With `within` (sorted character ranges) only chunks overlapping
+        those ranges are considered.
+        """
+        scores: dict[int, float] = {}
+        for term in set(tokenize(query)):
+            postings = self.postings.get(term)
+            if not postings:
+                continue
+            idf = self.idf(term)
+            for chunk_id, tf in postings:
+                norm = 1 - self.b + self.b * self.lengths[chunk_id] / (self.avg_length or 1)
+                scores[chunk_id] = scores.get(chunk_id, 0.0) + idf * tf * (self.k1 + 1) / (tf + self.k1 * norm)
+        if within is not None:
+            scores = {chunk_id: score for chunk_id, score in scores.items()
+                      if overlaps(self.spans[chunk_id], within)}
+        return sorted(scores.items(), key=lambda item: item[1], reverse=True)[:top_k]
+
+    def passages(self, text: str, query: str, top_k: int) -> list[dict]:
+        """Returns the best chunks as {"chunk_id", "score", "tokens", "text"}, best first."""
+        return [
+            {
+                "chunk_id": chunk_id,
+                "score": score,
+                "tokens": self.chunk_tokens[chunk_id],
+                "text": text[self.spans[chunk_id][0]:self.spans[chunk_id][1]],
+            }
+            for chunk_id, score in self.search(query, top_k)
+        ]
+
+    def select_chunks(self, query: str, top_k: int = RETRIEVAL_TOP_K,
+                      token_budget: int = RETRIEVAL_TOKEN_BUDGET,
+                      within: list[tuple[int, int]] | None = None) -> list[int]:
+        """
+        Picks the best-scoring chunks that fit in `token_budget` and returns
+        their ids in document order. Falls back to the opening chunks when
+        no query term occurs in the document (or in the `within` ranges).
+        """
+        ranked = [chunk_id for chunk_id, _ in self.search(query, top_k, within)]
+        if not ranked:
+            candidates = range(len(self.spans))
+            if within is not None:
+                candidates = (i for i in candidates if overlaps(self.spans[i], within))
+            ranked = [chunk_id for chunk_id, _ in zip(candidates, range(top_k))]
+
+        chosen, used = [], 0
+        for chunk_id in ranked:
+            cost = self.chunk_tokens[chunk_id]
+            if used + cost > token_budget and chosen:
+                continue
+            chosen.append(chunk_id)
+            used += cost
+        return sorted(chosen)
+
+    def select_context(self, text: str, query: str, top_k: int = RETRIEVAL_TOP_K,
+                       token_budget: int = RETRIEVAL_TOKEN_BUDGET) -> list[str]:
+        """select_chunks, returning the chunk texts."""
+        return [text[self.spans[i][0]:self.spans[i][1]] for i in self.select_chunks(query, top_k, token_budget)]
+
+
+# -------------------------------
+# Per-process index cache
+# -------------------------------
+class RetrievalIndexCache:
+    """
+    LRU of BM25 indexes keyed by document UUID and tagged with the document
+    version. Indexes are built at upload time by the worker that handled
+    the upload; other workers build them lazily on their first query.
+    """
+
+    def __init__(self, max_documents: int = RETRIEVAL_INDEX_CACHE_SIZE):
+        self.max_documents = max_documents
+        self._indexes: OrderedDict[str, tuple[int, BM25Index]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, uuid: str, version: int) -> BM25Index | None:
+        with self._lock:
+            entry = self._indexes.get(uuid)
+            if entry is None or entry[0] != version:
+                return None
+            self._indexes.move_to_end(uuid)
+            return entry[1]
+
+    def put(self, uuid: str, version: int, index: BM25Index) -> BM25Index:
+        """Caches the index of a document version."""
+        with self._lock:
+            self._indexes[uuid] = (version, index)
+            self._indexes.move_to_end(uuid)
+            while len(self._indexes) > self.max_documents:
+                self._indexes.popitem(last=False)
+        return index
+
+    def build(self, uuid: str, version: int, text: str,
+              segments: list[tuple[int, int]] | None = None) -> BM25Index:
+        """Builds and caches the index for a document version (CPU-bound)."""
+        return self.put(uuid, version, BM25Index(text, segments))
+
+    def build_from_chunks(self, uuid: str, version: int, chunks: list[tuple]) -> BM25Index:
+        """Builds and caches the index of a new document from its prepared chunk records."""
+        return self.put(uuid, version, BM25Index.from_chunks(chunks))
+
+    def build_document(self, uuid: str, stored: dict) -> BM25Index:
+        """build() for a document as returned by the document store."""
+        return self.build(uuid, stored["version"], stored["text"], segment_spans(stored["segments"]))
+
+    def extend(self, uuid: str, version: int, previous_version: int, chunks: list[tuple], offset: int) -> bool:
+        """
+        Caches a copy of the index of `previous_version` extended with the
+        chunk records of a newly appended segment, tagged with `version`;
+        queries still holding the previous index keep searching it
+        unchanged. Returns False (and drops the entry) when that index is
+        not cached here; it is then rebuilt on the next query.
+        """
+        with self._lock:
+            entry = self._indexes.get(uuid)
+            if entry is None or entry[0] != previous_version:
+                self._indexes.pop(uuid, None)
+                return False
+        index = entry[1].copy()
+        index.add_chunks(chunks, offset)
+        with self._lock:
+            if self._indexes.get(uuid) is entry:
+                self._indexes[uuid] = (version, index)
+        return True
+
+    def invalidate(self, uuid: str) -> None:
+        with self._lock:
+            self._indexes.pop(uuid, None)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"documents": len(self._indexes), "max_documents": self.max_documents}
+
+
+retrieval_indexes = RetrievalIndexCache()
@@ -0,0 +1,497 @@
+# src/services/search_index.py
+import bisect
+import math
+import os
+import re
+import threading
+from array import array
+from dataclasses import dataclass
+
+from dotenv import load_dotenv, find_dotenv
+
+from src.database.document_store import DocumentStore
+from src.utils.varint import encode_deltas, decode_deltas
+
+load_dotenv(find_dotenv())
+
+# -------------------------------
+# Config
+# -------------------------------
+# Terms a prefix query ("optim*") expands to, most frequent first
+SEARCH_PREFIX_EXPANSIONS = int(os.getenv("SEARCH_PREFIX_EXPANSIONS", "64"))
+# Characters of context shown on each side of a match
+SEARCH_SNIPPET_CHARS = int(os.getenv("SEARCH_SNIPPET_CHARS", "80"))
+
+WORD_PATTERN = re.compile(r"\w+")
+QUERY_PATTERN = re.compile(r'"([^"]*)"|(\S+)')
+MAX_QUERY_CLAUSES = 16
+
+# Every CHECKPOINT_TOKENS-th token's character offset is kept per segment,
+# so a match position is turned into an offset by scanning at most that many words
+CHECKPOINT_TOKENS = 32
+
+
+class InvalidSearchQuery(ValueError):
+    """Raised when a search query has no searchable words or too many clauses."""
+
+
+# -------------------------------
+# Query parsing
+# -------------------------------
+@dataclass(frozen=True)
+class Clause:
+    """One part of a query: a term, a quoted phrase or a prefix ("optim*")."""
+    kind: str  # term | phrase | prefix
+    terms: tuple[str, ...]
+
+
+def parse_query(query: str) -> list[Clause]:
+    """
+    Splits a query into clauses, all of which must match.
+    "quoted words" form a phrase, a word ending in * is a prefix and
+    anything else is matched word by word (case-insensitive).
+    Raises InvalidSearchQuery.
+    """
+    clauses = []
+    for phrase, word in QUERY_PATTERN.findall(query):
+        if phrase:
+            terms = tuple(t.lower() for t in WORD_PATTERN.findall(phrase))
+            if len(terms) == 1:
+                clauses.append(Clause("term", terms))
+            elif terms:
+                clauses.append(Clause("phrase", terms))
+        elif word.endswith("*") and WORD_PATTERN.fullmatch(word[:-1]):
+            clauses.append(Clause("prefix", (word[:-1].lower(),)))
+        else:
+            clauses.extend(Clause("term", (t.lower(),)) for t in WORD_PATTERN.findall(word))
+    if not clauses:
+        raise InvalidSearchQuery("The search query has no searchable words.")
+    if len(clauses) > MAX_QUERY_CLAUSES:
+        raise InvalidSearchQuery(f"The search query has more than {MAX_QUERY_CLAUSES} terms.")
+    return list(dict.fromkeys(clauses))
+
+
+def analyze(text: str) -> tuple[dict[str, list[int]], int, array]:
+    """
+    Tokenizes one segment for indexing.
+    Returns (term -> token positions, token count, checkpoint offsets).
+    """
+    positions: dict[str, list[int]] = {}
+    checkpoints = array("I")
+    count = 0
+    for count, match in enumerate(WORD_PATTERN.finditer(text), start=1):
+        if (count - 1) % CHECKPOINT_TOKENS == 0:
+            checkpoints.append(match.start())
+        positions.setdefault(match.group().lower(), []).append(count - 1)
+    return positions, count, checkpoints
+
+
+# -------------------------------
+# Positional inverted index
+# -------------------------------
+class Postings:
+    """
+    Postings of one term. Unit ids and in-unit frequencies are parallel
+    arrays in ascending unit order (binary-searchable, cheap to
+    intersect); the positions of all units are gap-encoded varints in one
+    byte string, with `starts` pointing at each unit's run.
+    """
+    __slots__ = ("units", "counts", "starts", "positions")
+
+    def __init__(self):
+        self.units = array("I")
+        self.counts = array("I")
+        self.starts = array("I")
+        self.positions = bytearray()
+
+    def add(self, unit: int, positions: list[int]) -> None:
+        self.units.append(unit)
+        self.counts.append(len(positions))
+        self.starts.append(len(self.positions))
+        self.positions += encode_deltas(positions)
+
+    def find(self, unit: int) -> int:
+        """Index of `unit` in the postings, or -1."""
+        i = bisect.bisect_left(self.units, unit)
+        return i if i < len(self.units) and self.units[i] == unit else -1
+
+    def positions_at(self, i: int) -> list[int]:
+        end = self.starts[i + 1] if i + 1 < len(self.starts) else len(self.positions)
+        return decode_deltas(self.positions, self.starts[i], end)
+
+    def nbytes(self) -> int:
+        return (len(self.units) + len(self.counts) + len(self.starts)) * 4 + len(self.positions)
+
+
+class SearchIndex:
+    """
+    Positional inverted index over every stored document, used by
+    GET /search without calling the LLM.
+
+    The indexed unit is a segment (one uploaded PDF): segments never
+    change, so an append indexes only the new segment. Deleted documents
+    leave tombstoned units that searches skip; postings are rewritten
+    without them once they make up a quarter of the index.
+
+    The index lives in each worker process. It is built from the store on
+    the first search, updated directly by this worker's uploads, updates
+    and deletes, and before every search compared with the store's write
+    generation, so changes made by other workers are picked up by
+    reindexing only the documents whose version moved.
+    """
+
+    def __init__(self, k1: float = 1.2, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self.generation: int | None = None  # store generation last synced with; None = not built
+        self._terms: dict[str, Postings] = {}
+        self._sorted_terms: list[str] | None = []
+        self._units: list[tuple[str, int] | None] = []  # unit -> (uuid, seq); None once deleted
+        self._lengths = array("I")
+        self._checkpoints: list[array | None] = []
+        self._documents: dict[str, tuple[int, list[int]]] = {}  # uuid -> (version, units)
+        self._live_units = 0
+        self._total_length = 0
+        self._lock = threading.Lock()
+        self._sync_lock = threading.Lock()
+
+    # ---------- writes (hold self._lock) ----------
+    def _add_unit(self, uuid: str, seq: int, analyzed: tuple) -> int:
+        positions, length, checkpoints = analyzed
+        unit = len(self._units)
+        self._units.append((uuid, seq))
+        self._lengths.append(length)
+        self._checkpoints.append(checkpoints)
+        for term, term_positions in positions.items():
+            postings = self._terms.get(term)
+            if postings is None:
+                postings = self._terms[term] = Postings()
+                self._sorted_terms = None
+            postings.add(unit, term_positions)
+        self._live_units += 1
+        self._total_length += length
+        return unit
+
+    def _remove(self, uuid: str) -> None:
+        entry = self._documents.pop(uuid, None)
+        if entry is None:
+            return
+        for unit in entry[1]:
+            self._units[unit] = None
+            self._checkpoints[unit] = None
+            self._live_units -= 1
+            self._total_length -= self._lengths[unit]
+
+    def _compact(self) -> None:
+        """Rewrites the postings without tombstoned units, renumbering the live ones."""
+        renumbered = {}
+        for unit, owner in enumerate(self._units):
+            if owner is not None:
+                renumbered[unit] = len(renumbered)
+        terms = {}
+        for term, postings in self._terms.items():
+            compacted = Postings()
+            for i, unit in enumerate(postings.units):
+                if unit in renumbered:
+                    compacted.add(renumbered[unit], postings.positions_at(i))
+            if compacted.units:
+                terms[term] = compacted
+        self._terms = terms
+        self._sorted_terms = None
+        self._units = [owner for owner in self._units if owner is not None]
+        self._lengths = array("I", (self._lengths[unit] for unit in renumbered))
+        self._checkpoints = [self._checkpoints[unit] for unit in renumbered]
+        self._documents = {
+            uuid: (version, [renumbered[unit] for unit in units])
+            for uuid, (version, units) in self._documents.items()
+        }
+
+    def _index_document(self, uuid: str, stored: dict) -> None:
+        """Replaces the units of a document with its current segments (analysis outside the lock)."""
+        text = stored["text"]
+        analyzed = [(segment["seq"], analyze(text[segment["start"]:segment["end"]]))
+                    for segment in stored["segments"]]
+        with self._lock:
+            self._remove(uuid)
+            units = [self._add_unit(uuid, seq, result) for seq, result in analyzed]
+            self._documents[uuid] = (stored["version"], units)
+
+    # ---------- keeping up with the store ----------
+    def sync(self, store: DocumentStore) -> None:
+        """
+        Brings the index up to date with the store (blocking; the first
+        call indexes every document). Cheap when the store's write
+        generation has not moved since the last call.
+        """
+        generation = store.generation()
+        if generation == self.generation:
+            return
+        with self._sync_lock:
+            if generation == self.generation:
+                return
+            versions = store.versions()
+            with self._lock:
+                for uuid in [uuid for uuid in self._documents if uuid not in versions]:
+                    self._remove(uuid)
+                changed = [uuid for uuid, version in versions.items()
+                           if self._documents.get(uuid, (None,))[0] != version]
+            for uuid in changed:
+                stored = store.get(uuid)
+                if stored is None:
+                    with self._lock:
+                        self._remove(uuid)
+                else:
+                    self._index_document(uuid, stored)
+            with self._lock:
+                self._maybe_compact()
+            self.generation = generation
+
+    def _maybe_compact(self) -> None:
+        tombstones = len(self._units) - self._live_units
+        if tombstones >= 64 and tombstones * 4 > len(self._units):
+            self._compact()
+
+    def add_segment(self, uuid: str, version: int, previous_version: int | None, seq: int, text: str) -> bool:
+        """
+        Indexes a segment just written by this worker: the first segment
+        of a new document (`previous_version` None) or one appended to
+        the version indexed here. Returns False when the index has not
+        been built yet or does not hold the previous version; the next
+        sync catches up.
+        """
+        if self.generation is None:
+            return False
+        analyzed = analyze(text)
+        with self._lock:
+            if previous_version is None:
+                self._remove(uuid)
+                self._documents[uuid] = (version, [self._add_unit(uuid, seq, analyzed)])
+                return True
+            entry = self._documents.get(uuid)
+            if entry is None or entry[0] != previous_version:
+                self._remove(uuid)
+                return False
+            units = entry[1] + [self._add_unit(uuid, seq, analyzed)]
+            self._documents[uuid] = (version, units)
+            return True
+
+    def remove_document(self, uuid: str) -> None:
+        """Tombstones a deleted document's units, compacting once they pile up."""
+        with self._lock:
+            self._remove(uuid)
+            self._maybe_compact()
+
+    # ---------- queries (hold self._lock) ----------
+    def _expand(self, prefix: str) -> list[str]:
+        if self._sorted_terms is None:
+            self._sorted_terms = sorted(self._terms)
+        first = bisect.bisect_left(self._sorted_terms, prefix)
+        last = bisect.bisect_left(self._sorted_terms, prefix + "\U0010ffff")
+        terms = self._sorted_terms[first:last]
+        if len(terms) > SEARCH_PREFIX_EXPANSIONS:
+            terms = sorted(terms, key=lambda t: len(self._terms[t].units), reverse=True)
+            terms = terms[:SEARCH_PREFIX_EXPANSIONS]
+        return terms
+
+    def _document_frequency(self, clause: Clause) -> int:
+        if clause.kind == "prefix":
+            return min(self._live_units, sum(len(self._terms[t].units) for t in self._expand(clause.terms[0])))
+        return min(len(self._terms[t].units) if t in self._terms else 0 for t in clause.terms)
+
+    def _phrase_hits(self, terms: tuple[str, ...], unit: int) -> tuple[int, int]:
+        """(occurrences, first position) of a phrase in one unit."""
+        found = None
+        for offset, term in enumerate(terms):
+            postings = self._terms[term]
+            starts = {p - offset for p in postings.positions_at(postings.find(unit))}
+            found = starts if found is None else found & starts
+            if not found:
+                return 0, -1
+        return len(found), min(found)
+
+    def _match(self, clause: Clause, candidates: set[int] | None) -> dict[int, int]:
+        """Units matching a clause (within `candidates` when given) -> frequency."""
+        if clause.kind == "term":
+            postings = self._terms.get(clause.terms[0])
+            if postings is None:
+                return {}
+            if candidates is None:
+                return dict(zip(postings.units, postings.counts))
+            matches = {}
+            for unit in candidates:
+                i = postings.find(unit)
+                if i >= 0:
+                    matches[unit] = postings.counts[i]
+            return matches
+
+        if clause.kind == "prefix":
+            matches: dict[int, int] = {}
+            for term in self._expand(clause.terms[0]):
+                postings = self._terms[term]
+                if candidates is None:
+                    for unit, count in zip(postings.units, postings.counts):
+                        matches[unit] = matches.get(unit, 0) + count
+                else:
+                    for unit in candidates:
+                        i = postings.find(unit)
+                        if i >= 0:
+                            matches[unit] = matches.get(unit, 0) + postings.counts[i]
+            return matches
+
+        # Phrase: units holding every word, then a position check
+        if any(term not in self._terms for term in clause.terms):
+            return {}
+        units = candidates
+        for term in sorted(clause.terms, key=lambda t: len(self._terms[t].units)):
+            term_units = set(self._terms[term].units)
+            units = term_units if units is None else units & term_units
+        matches = {}
+        for unit in units:
+            count, _ = self._phrase_hits(clause.terms, unit)
+            if count:
+                matches[unit] = count
+        return matches
+
+    def _first_position(self, clause: Clause, unit: int) -> int:
+        if clause.kind == "phrase":
+            return self._phrase_hits(clause.terms, unit)[1]
+        terms = clause.terms if clause.kind == "term" else self._expand(clause.terms[0])
+        first = -1
+        for term in terms:
+            postings = self._terms.get(term)
+            i = postings.find(unit) if postings else -1
+            if i >= 0:
+                position = postings.positions_at(i)[0]
+                first = position if first < 0 else min(first, position)
+        return first
+
+    def search(self, query: str, limit: int) -> list[dict]:
+        """
+        Ranks segments matching every clause of `query` with BM25.
+        Returns up to `limit` {"uuid", "seq", "score", "position",
+        "match_tokens", "checkpoint"} dicts, best first; "position" is the
+        token position of the first match of the rarest clause.
+        Raises InvalidSearchQuery.
+        """
+        clauses = parse_query(query)
+        with self._lock:
+            if not self._live_units:
+                return []
+            frequencies = {clause: self._document_frequency(clause) for clause in clauses}
+            clauses.sort(key=lambda clause: frequencies[clause])
+
+            candidates: set[int] | None = None
+            scores: dict[int, float] = {}
+            avg_length = self._total_length / self._live_units
+            for clause in clauses:
+                matches = self._match(clause, candidates)
+                matches = {unit: tf for unit, tf in matches.items() if self._units[unit] is not None}
+                df = max(1, frequencies[clause])
+                idf = math.log(1 + (self._live_units - df + 0.5) / (df + 0.5))
+                clause_scores = {}
+                for unit, tf in matches.items():
+                    norm = 1 - self.b + self.b * self._lengths[unit] / (avg_length or 1)
+                    clause_scores[unit] = scores.get(unit, 0.0) + idf * tf * (self.k1 + 1) / (tf + self.k1 * norm)
+                scores = clause_scores
+                candidates = set(scores)
+                if not candidates:
+                    return []
+
+            ranked = sorted(scores.items(), key=lambda item: item[1], reverse=True)[:limit]
+            anchor = clauses[0]
+            hits = []
+            for unit, score in ranked:
+                position = self._first_position(anchor, unit)
+                checkpoints = self._checkpoints[unit]
+                uuid, seq = self._units[unit]
+                hits.append({
+                    "uuid": uuid,
+                    "seq": seq,
+                    "score": round(score, 4),
+                    "position": position,
+                    "match_tokens": len(anchor.terms) if anchor.kind == "phrase" else 1,
+                    "checkpoint": checkpoints[position // CHECKPOINT_TOKENS],
+                })
+            return hits
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "built": self.generation is not None,
+                "documents": len(self._documents),
+                "segments": self._live_units,
+                "tombstones": len(self._units) - self._live_units,
+                "terms": len(self._terms),
+                "postings_bytes": sum(postings.nbytes() for postings in self._terms.values()),
+            }
+
+
+def locate_match(text: str, checkpoint: int, skip: int, match_tokens: int) -> tuple[int, int]:
+    """
+    Character span of a match in a segment text, found by scanning from
+    the checkpoint before it: skip `skip` words, then cover `match_tokens`.
+    """
+    words = WORD_PATTERN.finditer(text, checkpoint)
+    start = end = checkpoint
+    for i, word in enumerate(words):
+        if i == skip:
+            start = word.start()
+        if i == skip + match_tokens - 1:
+            end = word.end()
+            break
+    return start, end
+
+
+def snippet(text: str, start: int, end: int, context: int = SEARCH_SNIPPET_CHARS) -> str:
+    """The match with up to `context` characters on each side, cut at whitespace."""
+    left = max(0, start - context)
+    right = min(len(text), end + context)
+    if left > 0:
+        space = text.find(" ", left, start)
+        left = space + 1 if space >= 0 else left
+    if right < len(text):
+        space = text.rfind(" ", end, right)
+        right = space if space >= 0 else right
+    return " ".join(text[left:right].split())
+
+
+def resolve_hits(store: DocumentStore, hits: list[dict]) -> list[dict]:
+    """
+    Turns SearchIndex.search() hits into results with the match's
+    character offset in the document, its page and a snippet. Each
+    document is read once; hits on documents or segments deleted since
+    the search are dropped.
+    Returns {"uuid", "file_name", "segment", "page", "offset", "score", "snippet"} dicts.
+    """
+    documents, pages = {}, {}
+    results = []
+    for hit in hits:
+        uuid = hit["uuid"]
+        if uuid not in documents:
+            documents[uuid] = store.get(uuid)
+            page_list = store.get_pages(uuid) if documents[uuid] else None
+            pages[uuid] = [page for page in page_list or () if page["start"] is not None]
+        stored = documents[uuid]
+        segment = next((s for s in stored["segments"] if s["seq"] == hit["seq"]), None) if stored else None
+        if segment is None:
+            continue
+
+        text = stored["text"][segment["start"]:segment["end"]]
+        start, end = locate_match(text, hit["checkpoint"], hit["position"] % CHECKPOINT_TOKENS,
+                                  hit["match_tokens"])
+        offset = segment["start"] + start
+        page_starts = [page["start"] for page in pages[uuid]]
+        i = bisect.bisect_right(page_starts, offset) - 1
+        results.append({
+            "uuid": uuid,
+            "file_name": segment["file_name"],
+            "segment": segment["seq"],
+            "page": pages[uuid][i]["page"] if i >= 0 else None,
+            "offset": offset,
+            "score": hit["score"],
+            "snippet": snippet(text, start, end),
+        })
+    return results
+
+
+search_index = SearchIndex()
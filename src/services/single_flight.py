@@ -0,0 +1,51 @@
+# src/services/single_flight.py
+import asyncio
+from typing import Any, Awaitable, Callable, Hashable
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent calls with the same key into one execution.
+
+    The first caller (the leader) starts the work as a task; callers that
+    arrive with the same key while it is running await the same task and
+    receive its result or its exception. The task is shielded, so a
+    cancelled waiter (e.g. a client that went away) does not cancel the
+    work for the others.
+    """
+
+    def __init__(self):
+        self._in_flight: dict[Hashable, asyncio.Task] = {}
+        self.executions = 0
+        self.coalesced = 0
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> tuple[Any, bool]:
+        """
+        Runs `fn()` once per key at a time.
+        Returns (result, shared) where `shared` is True for callers that
+        joined a call started by someone else.
+        """
+        task = self._in_flight.get(key)
+        if task is not None:
+            self.coalesced += 1
+            return await asyncio.shield(task), True
+
+        task = asyncio.ensure_future(fn())
+        self._in_flight[key] = task
+        self.executions += 1
+        task.add_done_callback(lambda t: self._finish(key, t))
+        return await asyncio.shield(task), False
+
+    def _finish(self, key: Hashable, task: asyncio.Task) -> None:
+        if self._in_flight.get(key) is task:
+            del self._in_flight[key]
+        # Mark the exception as retrieved even if every waiter was cancelled
+        if not task.cancelled():
+            task.exception()
+
+    def stats(self) -> dict:
+        return {
+            "in_flight": len(self._in_flight),
+            "executions": self.executions,
+            "llm_calls_saved": self.coalesced,
+        }
@@ -1,44 +1,49 @@
 # src/services/user_service.py
-from src.database.memory_db import users, next_user_id
-from src.utils.password_utils import hash_password, verify_password
+import asyncio
+
+from src.database.memory_db import users
+from src.services.password_hasher import password_hasher
 
 # -------------------------------
 # Create a new user
 # -------------------------------
-def create_user(name: str, email: str, country: str, password: str, purpose: str = None) -> dict:
+async def create_user(name: str, email: str, country: str, password: str, purpose: str = None) -> dict:
     """
-    Creates a new user and stores in the in-memory database.
-    Raises ValueError if the email already exists.
+    Creates a new user and stores it in the configured user store.
+    The password is hashed on the password hashing pool and the store is
+    called in a worker thread, so neither blocks the event loop.
+    Raises ValueError if the email already exists, PasswordHasherBusy if
+    the hashing queue is full.
     """
-    global next_user_id
-    if email in users:
+    if await asyncio.to_thread(users.__contains__, email):
         raise ValueError("User already exists")
-    
-    user = {
-        "user_id": next_user_id,
-        "name": name,
-        "email": email,
-        "country": country,
-        "password_hash": hash_password(password),
-        "purpose": purpose
-    }
 
-    users[email] = user
-    next_user_id += 1
-    return user
+    password_hash = await password_hasher.hash(password)
+    return await asyncio.to_thread(
+        users.add,
+        name=name,
+        email=email,
+        country=country,
+        password_hash=password_hash,
+        purpose=purpose
+    )
 
 # -------------------------------
 # Authenticate existing user
 # -------------------------------
-def authenticate_user(email: str, password: str) -> dict | None:
+async def authenticate_user(email: str, password: str) -> dict | None:
     """
     Verifies the email and password.
+    A password hashed with an outdated bcrypt cost is re-hashed and saved.
     Returns the user dict if authentication is successful, else None.
+    Raises PasswordHasherBusy if the hashing queue is full.
     """
-    user = users.get(email)
+    user = await asyncio.to_thread(users.get, email)
     if not user:
         return None
-    if verify_password(password, user["password_hash"]):
-        return user
-    return None
-
+    valid, new_hash = await password_hasher.verify(password, user["password_hash"])
+    if not valid:
+        return None
+    if new_hash is not None:
+        await asyncio.to_thread(users.update_password_hash, email, new_hash)
+    return user
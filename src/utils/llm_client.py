@@ -1,37 +1,205 @@
 from google import genai
-from google.genai import types
+from google.genai import errors, types
+import httpx
+import json
+import logging
 import os
-from dotenv import load_dotenv , find_dotenv 
+import threading
+from dotenv import load_dotenv , find_dotenv
 
 # load the environament  variable
 load_dotenv(find_dotenv())
+logger = logging.getLogger(__name__)
 
-def get_llm_response(context:str , query:str)->dict:
+MODEL = "gemini-2.5-flash"
+
+# Size of the keep-alive HTTP connection pool shared by all queries of a worker
+LLM_MAX_CONNECTIONS = int(os.getenv("LLM_MAX_CONNECTIONS", "20"))
+LLM_KEEPALIVE_SECONDS = float(os.getenv("LLM_KEEPALIVE_SECONDS", "60"))
+
+SYSTEM_PROMPT = (
+    "You are a helpful assistant that can answer questions based on the provided context delimited "
+    "with triple backticks.\n\n"
+    "You will be given a context and a user query. Your task is to generate a response that is "
+    "relevant to the query based on the context provided. If the context does not contain enough "
+    "information to answer the query, you should indicate that you do not have enough information "
+    "to provide a complete answer.\n\n"
+    "If the context is empty, you should respond with a message indicating that you do not have "
+    "enough information to answer the query.\n\n"
+    "You should always respond in a friendly and helpful manner. You should not include any "
+    "personal opinions or information.\n\n"
+)
+
+# Several questions answered in one call come back as [{"index", "answer"}, ...]
+BATCH_ANSWER_SCHEMA = types.Schema(
+    type=types.Type.ARRAY,
+    items=types.Schema(
+        type=types.Type.OBJECT,
+        properties={
+            "index": types.Schema(type=types.Type.INTEGER),
+            "answer": types.Schema(type=types.Type.STRING),
+        },
+        required=["index", "answer"],
+    ),
+)
+
+# Invariant prompt parts, built once; the document text goes between them
+# as its own part so it is never copied into a bigger string per query.
+CONTEXT_PREFIX_PART = types.Part.from_text(text=SYSTEM_PROMPT + "Context:\n```")
+CONTEXT_SUFFIX_PART = types.Part.from_text(text="```")
+
+
+class CachedContentError(Exception):
+    """Raised when Gemini rejects a context cache handle (expired or deleted)."""
+
+
+def build_system_instruction(context: str) -> str:
+    """Returns the system instruction text for a given document context."""
+    return SYSTEM_PROMPT + f"Context:\n```{context}```"
+
+
+# -------------------------------
+# Connection reuse statistics
+# -------------------------------
+class ConnectionStats:
+    """
+    Counts HTTP requests and the distinct connections that served them,
+    using httpx response hooks. Every request that did not need a new
+    connection was served from the keep-alive pool.
     """
-    Send a user query and context to Google Gemini and return the assistant's response.
 
-    Args:
-        Context (str): Background information delimited by triple backticks.
-        query (str): The user's question to be answered based on the context.
+    def __init__(self):
+        self.requests = 0
+        self.connections = 0
+        self._lock = threading.Lock()
 
-    Returns:
-        str: The assistant's generated text response
+    def record(self, response: httpx.Response) -> None:
+        stream = response.extensions.get("network_stream")
+        with self._lock:
+            self.requests += 1
+            # Mark the connection's stream object the first time we see it
+            if stream is not None and not getattr(stream, "_cag_seen", False):
+                self.connections += 1
+                try:
+                    stream._cag_seen = True
+                except AttributeError:
+                    pass
 
-    Raises:
-        ValueError: If the GEMINI_API_KEY environment variable is not set.
+    async def arecord(self, response: httpx.Response) -> None:
+        self.record(response)
 
+    def stats(self) -> dict:
+        with self._lock:
+            connections = self.connections
+            reused = max(0, self.requests - connections)
+            return {
+                "requests": self.requests,
+                "connections_opened": connections,
+                "requests_on_reused_connections": reused,
+                "reuse_ratio": round(reused / self.requests, 3) if self.requests else 0.0,
+            }
+
+
+# -------------------------------
+# Client manager
+# -------------------------------
+class LLMClientManager:
+    """
+    Owns the single Gemini client of this worker.
+
+    The client is created at app startup (or on first use) with a pooled
+    httpx transport, so HTTP keep-alive and TLS sessions survive between
+    queries, and is closed on shutdown.
     """
-    
-    api_key = os.getenv("GEMINI_API_KEY")
-    if not api_key:
-        raise ValueError(
-            "GEMINI_API_KEY environment variable is not set. "
-            "Please set it to your Google Gemini API key (get key from  https://aistudio.google.com )"
+
+    def __init__(self, max_connections: int, keepalive_seconds: float):
+        self.max_connections = max_connections
+        self.keepalive_seconds = keepalive_seconds
+        self.connection_stats = ConnectionStats()
+        self._client: genai.Client | None = None
+        self._lock = threading.Lock()
+
+    def _http_options(self) -> types.HttpOptions:
+        limits = httpx.Limits(
+            max_connections=self.max_connections,
+            max_keepalive_connections=self.max_connections,
+            keepalive_expiry=self.keepalive_seconds,
         )
-    # Intialize the GenAI client
-    
-    client = genai.Client(api_key=api_key)
-    model = "gemini-2.5-flash"
+        return types.HttpOptions(
+            client_args={
+                "limits": limits,
+                "event_hooks": {"response": [self.connection_stats.record]},
+            },
+            async_client_args={
+                "limits": limits,
+                "event_hooks": {"response": [self.connection_stats.arecord]},
+            },
+        )
+
+    def start(self) -> None:
+        """Creates the client at startup; without an API key it is left for first use."""
+        if not os.getenv("GEMINI_API_KEY"):
+            logger.warning("GEMINI_API_KEY is not set; LLM queries will fail until it is.")
+            return
+        _ = self.client
+
+    @property
+    def client(self) -> genai.Client:
+        """
+        The shared Gemini client, created on first access.
+
+        Raises:
+            ValueError: If the GEMINI_API_KEY environment variable is not set.
+        """
+        if self._client is not None:
+            return self._client
+        with self._lock:
+            if self._client is None:
+                api_key = os.getenv("GEMINI_API_KEY")
+                if not api_key:
+                    raise ValueError(
+                        "GEMINI_API_KEY environment variable is not set. "
+                        "Please set it to your Google Gemini API key (get key from  https://aistudio.google.com )"
+                    )
+                self._client = genai.Client(api_key=api_key, http_options=self._http_options())
+        return self._client
+
+    async def aclose(self) -> None:
+        """Closes the pooled connections of the sync and async clients."""
+        with self._lock:
+            client, self._client = self._client, None
+        if client is not None:
+            client.close()
+            await client.aio.aclose()
+
+    def stats(self) -> dict:
+        return {
+            "client_started": self._client is not None,
+            "max_connections": self.max_connections,
+            **self.connection_stats.stats(),
+        }
+
+
+llm_client_manager = LLMClientManager(
+    max_connections=LLM_MAX_CONNECTIONS,
+    keepalive_seconds=LLM_KEEPALIVE_SECONDS,
+)
+
+
+def get_genai_client() -> genai.Client:
+    """
+    Returns the worker's shared Gemini client.
+
+    Raises:
+        ValueError: If the GEMINI_API_KEY environment variable is not set.
+    """
+    return llm_client_manager.client
+
+
+def _build_request(context: str, query: str, cached_content: str | None,
+                   response_mime_type: str = "text/plain",
+                   response_schema: types.Schema | None = None) -> tuple[list, types.GenerateContentConfig]:
+    """Builds the contents and config shared by the sync and async calls."""
     contents = [
         types.Content(
             role = "user",
@@ -39,36 +207,188 @@ def get_llm_response(context:str , query:str)->dict:
         ),
     ]
 
-    generate_content_config = types.GenerateContentConfig(
-        response_mime_type="text/plain",
-        system_instruction= [
-            types.Part.from_text(
-                text=(
-                    "You are a helpful assistant that can answer questions based on the provided context delimited "
-                    "with triple backticks.\n\n"
-                    "You will be given a context and a user query. Your task is to generate a response that is "
-                    "relevant to the query based on the context provided. If the context does not contain enough "
-                    "information to answer the query, you should indicate that you do not have enough information "
-                    "to provide a complete answer.\n\n"
-                    "If the context is empty, you should respond with a message indicating that you do not have "
-                    "enough information to answer the query.\n\n"
-                    "You should always respond in a friendly and helpful manner. You should not include any "
-                    "personal opinions or information.\n\n"
-                    f"Context:\n```{context}```"
-                )
-            ),
-        ],
-    )
+    if cached_content:
+        generate_content_config = types.GenerateContentConfig(
+            response_mime_type=response_mime_type,
+            response_schema=response_schema,
+            cached_content=cached_content,
+        )
+    else:
+        generate_content_config = types.GenerateContentConfig(
+            response_mime_type=response_mime_type,
+            response_schema=response_schema,
+            system_instruction= [
+                CONTEXT_PREFIX_PART,
+                types.Part.from_text(text=context),
+                CONTEXT_SUFFIX_PART,
+            ],
+        )
+    return contents, generate_content_config
 
-    response =  client.models.generate_content(
-        model= model,
-        contents = contents,
-        config = generate_content_config
-    )
+
+def _parse_response(response) -> dict:
     response_text = response.text  # Correct attribute
-    tokens_used = response.usage_metadata.total_token_count if hasattr(response, 'usage_metadata') else 0
+    tokens_used = response.usage_metadata.total_token_count if getattr(response, 'usage_metadata', None) else 0
 
     return {
         "text": response_text,
         "tokens_used": tokens_used,
-    }
\ No newline at end of file
+    }
+
+
+def get_llm_response(context:str , query:str, cached_content:str|None=None)->dict:
+    """
+    Send a user query and context to Google Gemini and return the assistant's response.
+
+    Args:
+        Context (str): Background information delimited by triple backticks.
+        query (str): The user's question to be answered based on the context.
+        cached_content (str | None): Name of a context cache that already holds the
+            system instruction for this context. When given, the context is not re-sent.
+
+    Returns:
+        str: The assistant's generated text response
+
+    Raises:
+        ValueError: If the GEMINI_API_KEY environment variable is not set.
+        CachedContentError: If `cached_content` no longer exists on the backend.
+
+    """
+
+    client = get_genai_client()
+    contents, generate_content_config = _build_request(context, query, cached_content)
+
+    try:
+        response =  client.models.generate_content(
+            model= MODEL,
+            contents = contents,
+            config = generate_content_config
+        )
+    except errors.ClientError as e:
+        if cached_content and e.code in (403, 404):
+            raise CachedContentError(str(e)) from e
+        raise
+    return _parse_response(response)
+
+
+async def aget_llm_response(context:str , query:str, cached_content:str|None=None)->dict:
+    """
+    Async version of `get_llm_response` using the client's native async API,
+    so a pending Gemini call does not block the event loop.
+    Same arguments, return value and exceptions.
+    """
+
+    client = get_genai_client()
+    contents, generate_content_config = _build_request(context, query, cached_content)
+
+    try:
+        response = await client.aio.models.generate_content(
+            model= MODEL,
+            contents = contents,
+            config = generate_content_config
+        )
+    except errors.ClientError as e:
+        if cached_content and e.code in (403, 404):
+            raise CachedContentError(str(e)) from e
+        raise
+    return _parse_response(response)
+
+
+async def astream_llm_response(context:str , query:str, cached_content:str|None=None):
+    """
+    Streams the answer to a query as it is generated.
+
+    Yields {"text": <chunk>} for every piece of generated text, then one
+    final {"tokens_used": <total>}. Closing the generator early (client
+    disconnect, cancellation) closes the upstream stream, which stops the
+    generation. Raises the same exceptions as `get_llm_response`;
+    CachedContentError is only raised before any text has been yielded.
+    """
+
+    client = get_genai_client()
+    contents, generate_content_config = _build_request(context, query, cached_content)
+
+    stream = None
+    tokens_used = 0
+    started = False
+    try:
+        stream = await client.aio.models.generate_content_stream(
+            model= MODEL,
+            contents = contents,
+            config = generate_content_config
+        )
+        async for chunk in stream:
+            if getattr(chunk, "usage_metadata", None) and chunk.usage_metadata.total_token_count:
+                tokens_used = chunk.usage_metadata.total_token_count
+            if chunk.text:
+                started = True
+                yield {"text": chunk.text}
+    except errors.ClientError as e:
+        if cached_content and not started and e.code in (403, 404):
+            raise CachedContentError(str(e)) from e
+        raise
+    finally:
+        aclose = getattr(stream, "aclose", None)
+        if aclose is not None:
+            await aclose()
+
+    yield {"tokens_used": tokens_used}
+
+
+def build_batch_query(questions: list[str]) -> str:
+    """Packs several questions into one numbered prompt."""
+    numbered = "\n".join(f"{i}. {question}" for i, question in enumerate(questions, start=1))
+    return (
+        "Answer each of the following questions separately, using only the context. "
+        "Return a JSON array with one object per question: "
+        '{"index": <question number>, "answer": <answer text>}.\n\n'
+        f"{numbered}"
+    )
+
+
+async def aget_llm_batch_response(context:str, questions:list[str], cached_content:str|None=None)->dict:
+    """
+    Answers several questions about the same context in a single call,
+    using structured JSON output to split the answers.
+
+    Returns:
+        {"answers": [str | None, ...], "tokens_used": int}, answers in
+        question order; None where the model skipped a question.
+
+    Raises:
+        Same as `get_llm_response`; ValueError if the output is not valid JSON.
+    """
+
+    client = get_genai_client()
+    contents, generate_content_config = _build_request(
+        context,
+        build_batch_query(questions),
+        cached_content,
+        response_mime_type="application/json",
+        response_schema=BATCH_ANSWER_SCHEMA,
+    )
+
+    try:
+        response = await client.aio.models.generate_content(
+            model= MODEL,
+            contents = contents,
+            config = generate_content_config
+        )
+    except errors.ClientError as e:
+        if cached_content and e.code in (403, 404):
+            raise CachedContentError(str(e)) from e
+        raise
+
+    parsed = _parse_response(response)
+    try:
+        items = json.loads(parsed["text"] or "[]")
+    except json.JSONDecodeError as e:
+        raise ValueError(f"LLM returned invalid JSON for a batch query: {e}") from e
+
+    answers = [None] * len(questions)
+    for item in items:
+        index = item.get("index") if isinstance(item, dict) else None
+        if isinstance(index, int) and 1 <= index <= len(questions):
+            answers[index - 1] = item.get("answer")
+
+    return {"answers": answers, "tokens_used": parsed["tokens_used"]}
@@ -0,0 +1,67 @@
+# src/utils/page_ranges.py
+import re
+
+RANGE_PATTERN = re.compile(r"^(\d+)(?:\s*-\s*(\d*))?$")
+
+# Upper bound on the number of comma-separated parts in one selection
+MAX_RANGE_PARTS = 100
+
+
+def parse_page_ranges(spec: str, page_count: int) -> list[tuple[int, int]]:
+    """
+    Parses a page selection such as "7", "3-9", "12-" or "1,4-6".
+    Args:
+        spec: Comma-separated pages or ranges, 1-based and inclusive;
+              an open range ("12-") runs to the last page.
+        page_count: Number of pages in the document.
+    Returns:
+        Sorted, merged (first, last) ranges.
+    Raises:
+        ValueError: If the selection is malformed or outside 1..page_count.
+    """
+    parts = [part.strip() for part in spec.split(",") if part.strip()]
+    if not parts:
+        raise ValueError("Page selection is empty.")
+    if len(parts) > MAX_RANGE_PARTS:
+        raise ValueError(f"Page selection has more than {MAX_RANGE_PARTS} parts.")
+
+    ranges = []
+    for part in parts:
+        match = RANGE_PATTERN.match(part)
+        if match is None:
+            raise ValueError(f"Invalid page range '{part}'. Use e.g. 3, 3-7 or 1,4-6.")
+        first = int(match.group(1))
+        if match.group(2) is None:
+            last = first
+        elif match.group(2) == "":
+            last = page_count
+        else:
+            last = int(match.group(2))
+        if first < 1 or last < first or last > page_count:
+            raise ValueError(f"Page range '{part}' is outside the document's pages 1-{page_count}.")
+        ranges.append((first, last))
+
+    ranges.sort()
+    merged = [ranges[0]]
+    for first, last in ranges[1:]:
+        if first <= merged[-1][1] + 1:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], last))
+        else:
+            merged.append((first, last))
+    return merged
+
+
+def format_page_ranges(ranges: list[tuple[int, int]]) -> str:
+    """Formats ranges back into a selection string, e.g. "1,4-6"."""
+    return ",".join(str(first) if first == last else f"{first}-{last}" for first, last in ranges)
+
+
+def group_pages(numbers: list[int]) -> list[tuple[int, int]]:
+    """Groups sorted page numbers into (first, last) runs of consecutive pages."""
+    ranges = []
+    for number in numbers:
+        if ranges and number == ranges[-1][1] + 1:
+            ranges[-1] = (ranges[-1][0], number)
+        else:
+            ranges.append((number, number))
+    return ranges
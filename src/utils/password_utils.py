@@ -1,21 +1,79 @@
 # src/utils/password_utils.py
+import time
+
 from passlib.context import CryptContext
+from passlib.hash import bcrypt
+
+# bcrypt cost bounds: each extra round doubles the hashing time
+BCRYPT_MIN_ROUNDS = 10
+BCRYPT_MAX_ROUNDS = 16
+# Passlib's default cost, used until the hasher is calibrated
+BCRYPT_DEFAULT_ROUNDS = 12
+# Cheap cost timed by calibrate_rounds and extrapolated from
+CALIBRATION_ROUNDS = 8
+CALIBRATION_SAMPLES = 3
+
+
+def build_context(rounds: int = BCRYPT_DEFAULT_ROUNDS) -> CryptContext:
+    """
+    Creates a CryptContext hashing with `rounds` bcrypt rounds. Hashes with
+    fewer rounds count as outdated (needs_update / verify_and_update);
+    stronger ones are left alone.
+    """
+    return CryptContext(
+        schemes=["bcrypt"],
+        deprecated="auto",
+        bcrypt__default_rounds=rounds,
+        bcrypt__min_rounds=rounds,
+    )
+
 
 # Create a CryptContext for hashing and verifying passwords
-pwd_context = CryptContext(
-    schemes=["bcrypt"],
-    deprecated="auto",
-)
+pwd_context = build_context()
 
-def hash_password(password: str) -> str:
+
+def hash_password(password: str, context: CryptContext = pwd_context) -> str:
     """
     Hashes the password using bcrypt.
     bcrypt automatically generates a secure salt.
     """
-    return pwd_context.hash(password)
+    return context.hash(password)
+
 
-def verify_password(password: str, password_hash: str) -> bool:
+def verify_password(password: str, password_hash: str, context: CryptContext = pwd_context) -> bool:
     """
     Verifies a plain password against its hashed password.
     """
-    return pwd_context.verify(password, password_hash)
+    return context.verify(password, password_hash)
+
+
+def verify_and_update(password: str, password_hash: str,
+                      context: CryptContext = pwd_context) -> tuple[bool, str | None]:
+    """
+    Verifies a password and, if it matches a hash with an outdated cost,
+    hashes it again with the context's cost.
+    Returns (valid, new hash or None).
+    """
+    return context.verify_and_update(password, password_hash)
+
+
+def calibrate_rounds(target_ms: float, min_rounds: int = BCRYPT_MIN_ROUNDS,
+                     max_rounds: int = BCRYPT_MAX_ROUNDS) -> tuple[int, float]:
+    """
+    Picks the highest bcrypt cost whose hash takes at most `target_ms` on
+    this host, within [min_rounds, max_rounds]. The fastest of a few
+    hashes at a cheap cost is timed and doubled per extra round, so the
+    calibration itself takes a few tens of milliseconds.
+    Returns (rounds, estimated milliseconds per hash at that cost).
+    """
+    hasher = bcrypt.using(rounds=CALIBRATION_ROUNDS)
+    fastest = float("inf")
+    for _ in range(CALIBRATION_SAMPLES):
+        started = time.perf_counter()
+        hasher.hash("calibration")
+        fastest = min(fastest, (time.perf_counter() - started) * 1000)
+
+    rounds = min_rounds
+    while rounds < max_rounds and fastest * 2 ** (rounds + 1 - CALIBRATION_ROUNDS) <= target_ms:
+        rounds += 1
+    return rounds, fastest * 2 ** (rounds - CALIBRATION_ROUNDS)
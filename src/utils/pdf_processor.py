@@ -1,24 +1,135 @@
+import logging
+import threading
+from io import BytesIO
 from pypdf import PdfReader
 
-def extract_text_from_pdf(pdf_path:str)->str:
+logger = logging.getLogger(__name__)
+
+# A PDF reader kept in this process for the next page window of the same
+# file: windows of one upload often reach the same pool worker, and reusing
+# the reader saves parsing the document (and its fonts) again for every
+# window. It is keyed by the file path (uploads are spooled to a temporary
+# file of their own), and dropped by the window that reaches the end of the
+# document, by any call for another PDF, and after PDF_READER_IDLE_SECONDS
+# without a call, so a worker whose last window was not the final one does
+# not hold the upload once its job is over.
+PDF_READER_IDLE_SECONDS = 5.0
+_kept:tuple[str, PdfReader]|None = None
+_kept_lock = threading.Lock()
+_kept_expiry:threading.Timer|None = None
+
+
+def _take_kept()->tuple[str, PdfReader]|None:
+    """Releases the kept reader and returns it (None if there was none)."""
+    global _kept, _kept_expiry
+    with _kept_lock:
+        kept, _kept = _kept, None
+        if _kept_expiry is not None:
+            _kept_expiry.cancel()
+            _kept_expiry = None
+    return kept
+
+
+def _keep(pdf_path:str, reader:PdfReader)->None:
+    global _kept, _kept_expiry
+    with _kept_lock:
+        _kept = (pdf_path, reader)
+        _kept_expiry = threading.Timer(PDF_READER_IDLE_SECONDS, _take_kept)
+        _kept_expiry.daemon = True
+        _kept_expiry.start()
+
+
+def _open_pdf(pdf_source:str|bytes)->PdfReader:
+    """
+    Opens a PDF from a file path or from the raw bytes of an upload.
+    Bytes are wrapped in an in-memory buffer, so nothing touches the disk.
+    A reader kept for this path (see _keep) is reused; any kept reader
+    is released either way.
+    """
+    kept = _take_kept()
+    if isinstance(pdf_source, (bytes, bytearray)):
+        return PdfReader(BytesIO(pdf_source))
+    if kept is not None and kept[0] == pdf_source:
+        return kept[1]
+    return PdfReader(pdf_source)
+
+
+def join_pages(pages:list[str])->str:
+    """Joins page texts into the document text, skipping pages without text."""
+    return "\n".join(text for text in pages if text)
+
+
+def page_offsets(pages:list[str])->list[tuple[int, int]]:
+    """
+    Returns the [start, end) character offsets of every page in the text
+    built by join_pages. Pages without text get an empty span at the
+    position where they would have been.
+    """
+    spans = []
+    position = 0
+    for text in pages:
+        if text:
+            if position:
+                position += 1  # the "\n" before every page but the first
+            spans.append((position, position + len(text)))
+            position += len(text)
+        else:
+            spans.append((position, position))
+    return spans
+
+
+def extract_text_from_pdf(pdf_source:str|bytes)->str:
     """
     Extracts all text content from a PDF file using PyPDF.
     Args:
-        pdf_path: Path to the PDF file.
+        pdf_source: Path to the PDF file, or the PDF bytes.
     Returns:
         The extracted text as a single string.
     """
 
     try:
-        reader = PdfReader(pdf_path)
-        full_text = []
-        for page in reader.pages:
-            text = page.extract_text()
-            if text:
-                full_text.append(text)
-        return "\n".join(full_text)
+        reader = _open_pdf(pdf_source)
+        return join_pages([page.extract_text() for page in reader.pages])
 
     except FileNotFoundError:
-        print(f"Error: File not found at {pdf_path}")
+        logger.error("File not found at %s", pdf_source)
         return ""
 
+
+def count_pdf_pages(pdf_source:str|bytes)->int:
+    """
+    Returns the number of pages in a PDF (0 if the file is missing).
+    Only the cross-reference table is parsed, no page content is extracted.
+    """
+    try:
+        return len(_open_pdf(pdf_source).pages)
+    except FileNotFoundError:
+        logger.error("File not found at %s", pdf_source)
+        return 0
+
+
+def extract_pages_from_pdf(pdf_source:str|bytes, start:int=0, stop:int|None=None,
+                           keep_open:bool=False)->list[str]:
+    """
+    Extracts the text of pages [start, stop) from a PDF.
+    Each call opens the document itself, so page ranges of the same file
+    can be extracted in separate processes.
+    Args:
+        pdf_source: Path to the PDF file, or the PDF bytes.
+        start: Index of the first page (0-based).
+        stop: Index after the last page; None means the end of the document.
+        keep_open: More windows of this file follow; keep the reader for
+                   them unless this window reaches the end of the document.
+    Returns:
+        One string per page, in page order (empty string for pages without text).
+    """
+    try:
+        reader = _open_pdf(pdf_source)
+        pages = [page.extract_text() or "" for page in reader.pages[start:stop]]
+        if keep_open and isinstance(pdf_source, str) and stop is not None and stop < len(reader.pages):
+            _keep(pdf_source, reader)
+        return pages
+
+    except FileNotFoundError:
+        logger.error("File not found at %s", pdf_source)
+        return []
@@ -0,0 +1,91 @@
+# src/utils/text_chunker.py
+import re
+from collections import deque
+
+WORD_PATTERN = re.compile(r"\S+")
+
+
+def chunk_text(text: str, chunk_words: int = 200, overlap_words: int = 40) -> list[tuple[int, int]]:
+    """
+    Splits text into overlapping windows of whole words.
+    Args:
+        text: The document text.
+        chunk_words: Number of words per chunk.
+        overlap_words: Number of words shared by consecutive chunks.
+    Returns:
+        (start, end) character offsets of each chunk, in document order.
+        Chunks are returned as offsets so callers can slice the text
+        instead of keeping a second copy of it.
+    """
+    if chunk_words <= 0:
+        raise ValueError("chunk_words must be positive")
+    overlap_words = max(0, min(overlap_words, chunk_words - 1))
+
+    words = [(m.start(), m.end()) for m in WORD_PATTERN.finditer(text)]
+    if not words:
+        return []
+
+    step = chunk_words - overlap_words
+    spans = []
+    for first in range(0, len(words), step):
+        last = min(first + chunk_words, len(words)) - 1
+        spans.append((words[first][0], words[last][1]))
+        if last == len(words) - 1:
+            break
+    return spans
+
+
+class ChunkStream:
+    """
+    Incremental chunk_text: the text is fed in contiguous pieces (e.g.
+    page by page, separators included) and every chunk is emitted as soon
+    as its last word has arrived. The chunks are the same as chunk_text
+    on the whole text as long as no word spans two pieces. Only the text
+    of the chunk being filled is kept.
+    """
+
+    def __init__(self, chunk_words: int = 200, overlap_words: int = 40, offset: int = 0):
+        if chunk_words <= 0:
+            raise ValueError("chunk_words must be positive")
+        self.chunk_words = chunk_words
+        self.step = chunk_words - max(0, min(overlap_words, chunk_words - 1))
+        self._words: deque[tuple[int, int]] = deque()
+        self._text = ""       # text from offset self._base on
+        self._base = offset
+        self._covered = 0     # buffered words already part of an emitted chunk
+
+    def _chunk(self, start: int, end: int) -> tuple[int, int, str]:
+        return start, end, self._text[start - self._base:end - self._base]
+
+    def feed(self, piece: str) -> list[tuple[int, int, str]]:
+        """
+        Appends the next piece of text.
+        Returns the (start, end, chunk text) of the chunks it completed,
+        with offsets into the whole text.
+        """
+        offset = self._base + len(self._text)
+        self._text += piece
+
+        chunks = []
+        for m in WORD_PATTERN.finditer(piece):
+            self._words.append((offset + m.start(), offset + m.end()))
+            if len(self._words) == self.chunk_words:
+                chunks.append(self._chunk(self._words[0][0], self._words[-1][1]))
+                for _ in range(self.step):
+                    self._words.popleft()
+                self._covered = len(self._words)
+
+        # Drop the text before the first buffered word
+        start = self._words[0][0] if self._words else self._base + len(self._text)
+        self._text = self._text[start - self._base:]
+        self._base = start
+        return chunks
+
+    def finish(self) -> list[tuple[int, int, str]]:
+        """Returns the last, shorter chunk if words remain that no chunk covers."""
+        if len(self._words) <= self._covered:
+            return []
+        chunk = self._chunk(self._words[0][0], self._words[-1][1])
+        self._words.clear()
+        self._covered = 0
+        return [chunk]
@@ -0,0 +1,106 @@
+# src/utils/text_normalizer.py
+import math
+import re
+from collections import Counter
+
+# Runs of horizontal whitespace (including no-break spaces) inside a line
+SPACE_PATTERN = re.compile(r"[ \t\f\v\u00a0]+")
+# A word broken with a hyphen at the end of a line and continued in lower case
+HYPHEN_BREAK_PATTERN = re.compile(r"(\w)-\n(?=[a-z])")
+# Labelled page numbers, always boilerplate: "Page 12", "page 3 of 40", "Page 3/40"
+PAGE_LABEL_PATTERN = re.compile(
+    r"^page\s*[-–—(\s]*\d{1,5}[-–—)\s]*(?:(?:/|of)\s*\d{1,5})?$", re.IGNORECASE
+)
+# Bare numbers: "12", "- 12 -", "(12)", "3 of 40", "3/40"; only page numbers
+# when they follow the page sequence (see find_page_number_offsets)
+BARE_NUMBER_PATTERN = re.compile(r"^[-–—(\s]*(\d{1,5})[-–—)\s]*(?:(?:/|of)\s*\d{1,5})?$", re.IGNORECASE)
+
+# Lines at the top and bottom of a page where running headers and footers live
+EDGE_LINES = 3
+
+
+def clean_lines(page: str) -> list[str]:
+    """Splits a page into lines with whitespace runs collapsed and ends stripped."""
+    return [SPACE_PATTERN.sub(" ", line).strip() for line in page.splitlines()]
+
+
+def _edge_lines(lines: list[str], edge_lines: int) -> set[str]:
+    content = [line for line in lines if line]
+    return set(content[:edge_lines] + content[-edge_lines:])
+
+
+def find_repeated_lines(pages: list[str], min_share: float = 0.5,
+                        edge_lines: int = EDGE_LINES) -> set[str]:
+    """
+    Returns the lines that open or close at least `min_share` of the
+    pages (and at least 3 pages): running headers and footers.
+    Only the first and last `edge_lines` lines of a page are considered,
+    so text that merely recurs in page bodies is kept.
+    """
+    counts = Counter()
+    for page in pages:
+        counts.update(_edge_lines(clean_lines(page), edge_lines))
+    needed = max(3, math.ceil(len(pages) * min_share))
+    return {line for line, count in counts.items() if count >= needed}
+
+
+def find_page_number_offsets(pages: list[str], min_share: float = 0.5,
+                             edge_lines: int = EDGE_LINES) -> set[int]:
+    """
+    Returns the offsets between printed and actual page numbers that the
+    pages bear out: a bare number N at the top or bottom of page i (from
+    0) votes for offset N - i, and offsets voted for by at least
+    `min_share` of the pages (and at least 3 pages) are kept. A number
+    that merely ends a page's text never forms such a sequence.
+    """
+    counts = Counter()
+    for index, page in enumerate(pages):
+        offsets = set()
+        for line in _edge_lines(clean_lines(page), edge_lines):
+            match = BARE_NUMBER_PATTERN.match(line)
+            if match:
+                offsets.add(int(match.group(1)) - index)
+        counts.update(offsets)
+    needed = max(3, math.ceil(len(pages) * min_share))
+    return {offset for offset, count in counts.items() if count >= needed}
+
+
+def _is_boilerplate(line: str, repeated: set[str], page_numbers: set[int]) -> bool:
+    if line in repeated or PAGE_LABEL_PATTERN.match(line):
+        return True
+    match = BARE_NUMBER_PATTERN.match(line)
+    return match is not None and int(match.group(1)) in page_numbers
+
+
+def normalize_page(page: str, repeated: set[str], page_numbers: set[int] = frozenset(),
+                   edge_lines: int = EDGE_LINES) -> str:
+    """
+    Normalizes the text of one page:
+    - drops repeated header/footer lines, "Page N" labels and bare
+      numbers in `page_numbers` (the numbers this page may be printed
+      with) at the top and bottom of the page,
+    - collapses whitespace runs and keeps at most one blank line,
+    - joins words hyphenated across a line break ("exam-\\nple").
+    """
+    lines = clean_lines(page)
+
+    for _ in range(edge_lines):
+        while lines and not lines[0]:
+            lines.pop(0)
+        if not lines or not _is_boilerplate(lines[0], repeated, page_numbers):
+            break
+        lines.pop(0)
+    for _ in range(edge_lines):
+        while lines and not lines[-1]:
+            lines.pop()
+        if not lines or not _is_boilerplate(lines[-1], repeated, page_numbers):
+            break
+        lines.pop()
+
+    kept = []
+    for line in lines:
+        if line or (kept and kept[-1]):
+            kept.append(line)
+    while kept and not kept[-1]:
+        kept.pop()
+    return HYPHEN_BREAK_PATTERN.sub(r"\1", "\n".join(kept))
@@ -0,0 +1,45 @@
+# src/utils/token_estimator.py
+import math
+import re
+
+# Words and single non-space symbols, the pieces a tokenizer never merges across
+TOKEN_PIECE_PATTERN = re.compile(r"\w+|[^\w\s]")
+
+# Characters of a word covered by one token
+CHARS_PER_WORD_TOKEN = 4
+
+
+def _piece_tokens(piece: str) -> int:
+    return math.ceil(len(piece) / CHARS_PER_WORD_TOKEN)
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Estimates how many model tokens a text takes, without calling the API.
+    Every word costs one token per 4 characters (at least one) and every
+    punctuation mark one token. For English prose this is a little above
+    what Gemini reports, so budgets based on it err on the safe side.
+    """
+    return sum(_piece_tokens(piece) for piece in TOKEN_PIECE_PATTERN.findall(text))
+
+
+def estimate_page_tokens(pages: list[str]) -> list[int]:
+    """Returns the estimated token count of every page, in page order."""
+    return [estimate_tokens(page) for page in pages]
+
+
+def truncate_to_tokens(text: str, max_tokens: int) -> tuple[str, int]:
+    """
+    Cuts a text after the last word that still fits in `max_tokens`.
+    Returns the kept prefix and its estimated token count.
+    """
+    used, end = 0, 0
+    for match in TOKEN_PIECE_PATTERN.finditer(text):
+        cost = _piece_tokens(match.group())
+        if used + cost > max_tokens:
+            break
+        used += cost
+        end = match.end()
+    else:
+        return text, used
+    return text[:end], used
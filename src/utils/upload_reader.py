@@ -0,0 +1,65 @@
+# src/utils/upload_reader.py
+import hashlib
+import os
+from fastapi import UploadFile
+from dotenv import load_dotenv, find_dotenv
+
+load_dotenv(find_dotenv())
+
+# -------------------------------
+# Config
+# -------------------------------
+MAX_UPLOAD_BYTES = int(os.getenv("MAX_UPLOAD_BYTES", str(50 * 1024 * 1024)))  # 50 MB
+UPLOAD_CHUNK_SIZE = 1024 * 1024  # 1 MB
+PDF_MAGIC = b"%PDF-"
+# The PDF header may be preceded by a little garbage; readers look at the first 1 KB
+PDF_HEADER_WINDOW = 1024
+
+
+class InvalidPDFError(ValueError):
+    """Raised when the uploaded bytes do not start with a PDF header."""
+
+
+class UploadTooLargeError(ValueError):
+    """Raised when the upload is bigger than MAX_UPLOAD_BYTES."""
+
+
+async def read_pdf_upload(
+    file: UploadFile,
+    max_bytes: int = MAX_UPLOAD_BYTES,
+    chunk_size: int = UPLOAD_CHUNK_SIZE,
+) -> tuple[bytes, str]:
+    """
+    Reads an uploaded PDF in chunks and returns (bytes, SHA-256 hex digest).
+
+    The size cap and the `%PDF` magic bytes are checked on the first chunk,
+    so an oversized or non-PDF upload is rejected before the rest of the
+    body is read. Memory use per upload is bounded by `max_bytes`. The
+    digest is computed chunk by chunk while the body streams in.
+
+    Raises:
+        UploadTooLargeError: If the upload exceeds `max_bytes`.
+        InvalidPDFError: If the upload does not look like a PDF.
+    """
+    too_large = f"File is larger than the {max_bytes // (1024 * 1024)} MB upload limit."
+    if file.size is not None and file.size > max_bytes:
+        raise UploadTooLargeError(too_large)
+
+    chunks = []
+    total = 0
+    digest = hashlib.sha256()
+    while True:
+        chunk = await file.read(chunk_size)
+        if not chunk:
+            break
+        if not chunks and PDF_MAGIC not in chunk[:PDF_HEADER_WINDOW]:
+            raise InvalidPDFError("Uploaded file is not a valid PDF.")
+        total += len(chunk)
+        if total > max_bytes:
+            raise UploadTooLargeError(too_large)
+        digest.update(chunk)
+        chunks.append(chunk)
+
+    if not chunks:
+        raise InvalidPDFError("Uploaded file is empty.")
+    return b"".join(chunks), digest.hexdigest()
@@ -0,0 +1,34 @@
+# src/utils/varint.py
+
+
+def encode_deltas(values: list[int]) -> bytes:
+    """
+    Encodes ascending non-negative integers as the gaps between them,
+    each gap as a LEB128 varint (7 bits per byte, high bit = more bytes).
+    Small gaps, the common case for term positions, take a single byte.
+    """
+    out = bytearray()
+    previous = 0
+    for value in values:
+        gap = value - previous
+        previous = value
+        while gap >= 0x80:
+            out.append((gap & 0x7F) | 0x80)
+            gap >>= 7
+        out.append(gap)
+    return bytes(out)
+
+
+def decode_deltas(data: bytes | bytearray, start: int = 0, end: int | None = None) -> list[int]:
+    """Decodes the values written by encode_deltas from data[start:end]."""
+    values = []
+    value = shift = previous = 0
+    for byte in memoryview(data)[start:end]:
+        value |= (byte & 0x7F) << shift
+        if byte & 0x80:
+            shift += 7
+        else:
+            previous += value
+            values.append(previous)
+            value = shift = 0
+    return values
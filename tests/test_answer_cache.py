@@ -0,0 +1,112 @@
+# tests/test_answer_cache.py
+from types import SimpleNamespace
+
+import pytest
+
+from src.services import answer_cache as answer_cache_module
+from src.services.answer_cache import AnswerCache
+
+TTL_SECONDS = 600
+
+
+class FakeClock:
+    def __init__(self, now: float = 1_000_000.0):
+        self.now = now
+
+    def time(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    fake = FakeClock()
+    monkeypatch.setattr(answer_cache_module, "time", SimpleNamespace(time=fake.time))
+    return fake
+
+
+@pytest.fixture
+def cache(clock):
+    return AnswerCache(max_entries=3, max_bytes=1024 * 1024, ttl_seconds=TTL_SECONDS)
+
+
+def answer(text: str) -> dict:
+    return {"llm_response": {"text": text}, "tokens_used": 10}
+
+
+# -------------------------------
+# Keys and LRU
+# -------------------------------
+def test_equivalent_questions_share_an_entry(cache):
+    cache.put(AnswerCache.make_key("doc-1", 1, "What is BM25?"), answer("a ranking function"))
+
+    assert cache.get(AnswerCache.make_key("doc-1", 1, "  what is bm25 ")) == answer("a ranking function")
+    assert cache.get(AnswerCache.make_key("doc-1", 1, "What is BM25?", options="pages=1")) is None
+
+
+def test_least_recently_used_entry_is_evicted(cache):
+    keys = [AnswerCache.make_key("doc-1", 1, f"question {i}") for i in range(3)]
+    for i, key in enumerate(keys):
+        cache.put(key, answer(f"answer {i}"))
+
+    cache.get(keys[0])
+    cache.put(AnswerCache.make_key("doc-1", 1, "question 3"), answer("answer 3"))
+
+    assert cache.get(keys[0]) is not None
+    assert cache.get(keys[1]) is None
+    assert cache.get(keys[2]) is not None
+    assert cache.stats()["evictions"] == 1
+
+
+def test_byte_limit_evicts_and_skips_oversized_answers(clock):
+    cache = AnswerCache(max_entries=100, max_bytes=3000, ttl_seconds=TTL_SECONDS)
+    first, second = AnswerCache.make_key("doc-1", 1, "first"), AnswerCache.make_key("doc-1", 1, "second")
+    cache.put(first, answer("x" * 1500))
+    cache.put(second, answer("y" * 1500))
+
+    assert cache.get(first) is None
+    assert cache.get(second) is not None
+    assert cache.stats()["bytes"] <= 3000
+
+    cache.put(AnswerCache.make_key("doc-1", 1, "huge"), answer("z" * 10_000))
+    assert cache.stats()["entries"] == 1
+
+
+# -------------------------------
+# Expiry and invalidation
+# -------------------------------
+def test_entries_expire_after_ttl(cache, clock):
+    key = AnswerCache.make_key("doc-1", 1, "question")
+    cache.put(key, answer("fresh"))
+
+    clock.now += TTL_SECONDS - 1
+    assert cache.get(key) == answer("fresh")
+
+    clock.now += 1
+    assert cache.get(key) is None
+    assert cache.stats()["expirations"] == 1
+    assert cache.stats()["entries"] == 0
+
+
+def test_invalidate_drops_every_answer_of_a_document(cache):
+    cache.put(AnswerCache.make_key("doc-1", 1, "one"), answer("1"))
+    cache.put(AnswerCache.make_key("doc-1", 1, "two"), answer("2"))
+    other = AnswerCache.make_key("doc-2", 1, "one")
+    cache.put(other, answer("other"))
+
+    cache.invalidate("doc-1")
+
+    assert cache.get(AnswerCache.make_key("doc-1", 1, "one")) is None
+    assert cache.get(other) == answer("other")
+    assert cache.stats()["documents"] == 1
+
+
+def test_answer_for_a_new_version_drops_older_versions(cache):
+    old = AnswerCache.make_key("doc-1", 1, "summary")
+    cache.put(old, answer("before the update"))
+
+    # After an append the document has a new version, so the old answer is never looked up again
+    assert cache.get(AnswerCache.make_key("doc-1", 2, "summary")) is None
+    cache.put(AnswerCache.make_key("doc-1", 2, "other question"), answer("after the update"))
+
+    assert cache.get(old) is None
+    assert cache.stats()["entries"] == 1
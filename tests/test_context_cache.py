@@ -0,0 +1,139 @@
+# tests/test_context_cache.py
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+from src.services import context_cache as context_cache_module
+from src.services import query_service
+from src.services.context_cache import (
+    ContextCacheManager,
+    LocalContextCacheBackend,
+    CONTEXT_CACHE_EXPIRY_MARGIN_SECONDS,
+)
+from src.utils.llm_client import CachedContentError, build_system_instruction
+
+TTL_SECONDS = 600
+TEXT = "The quick brown fox jumps over the lazy dog. " * 10
+
+
+class FakeClock:
+    def __init__(self, now: float = 1_000_000.0):
+        self.now = now
+
+    def time(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    fake = FakeClock()
+    monkeypatch.setattr(context_cache_module, "time", SimpleNamespace(time=fake.time))
+    return fake
+
+
+@pytest.fixture
+def backend():
+    return LocalContextCacheBackend()
+
+
+@pytest.fixture
+def manager(backend, clock):
+    return ContextCacheManager(backend=backend, ttl_seconds=TTL_SECONDS, min_chars=100)
+
+
+# -------------------------------
+# Handle lifecycle
+# -------------------------------
+def test_creates_handle_on_first_use(manager, backend):
+    handle = manager.get_handle("doc-1", 1, TEXT)
+
+    assert handle is not None
+    assert backend.resolve(handle) == build_system_instruction(TEXT)
+    assert manager.stats()["misses"] == 1
+    assert manager.stats()["hits"] == 0
+
+
+def test_small_context_is_not_cached(manager):
+    assert manager.get_handle("doc-1", 1, "short") is None
+    assert manager.stats()["entries"] == 0
+
+
+def test_reuses_handle_for_same_content(manager, backend):
+    first = manager.get_handle("doc-1", 1, TEXT)
+    # A new version with identical text still hits on the content hash
+    second = manager.get_handle("doc-1", 2, TEXT)
+
+    assert second == first
+    assert backend.resolve(first) is not None
+    assert manager.stats()["hits"] == 1
+    assert manager.stats()["misses"] == 1
+
+
+def test_recreates_handle_when_content_changes(manager, backend):
+    first = manager.get_handle("doc-1", 1, TEXT)
+    second = manager.get_handle("doc-1", 2, TEXT + " Appended text.")
+
+    assert second != first
+    assert backend.resolve(first) is None
+    assert backend.resolve(second) == build_system_instruction(TEXT + " Appended text.")
+    assert manager.stats()["misses"] == 2
+
+
+def test_recreates_handle_before_ttl_expiry(manager, backend, clock):
+    first = manager.get_handle("doc-1", 1, TEXT)
+
+    clock.now += TTL_SECONDS - CONTEXT_CACHE_EXPIRY_MARGIN_SECONDS - 1
+    assert manager.get_handle("doc-1", 1, TEXT) == first
+
+    clock.now += 1
+    second = manager.get_handle("doc-1", 1, TEXT)
+    assert second != first
+    assert backend.resolve(first) is None
+    assert backend.resolve(second) is not None
+
+
+def test_invalidate_deletes_handle(manager, backend):
+    handle = manager.get_handle("doc-1", 1, TEXT)
+    manager.invalidate("doc-1")
+
+    assert backend.resolve(handle) is None
+    assert manager.stats()["entries"] == 0
+    assert manager.get_handle("doc-1", 1, TEXT) != handle
+
+
+def test_backend_failure_returns_no_handle(manager, backend, monkeypatch):
+    def refuse(**kwargs):
+        raise RuntimeError("cache quota exceeded")
+
+    monkeypatch.setattr(backend, "create", refuse)
+
+    assert manager.get_handle("doc-1", 1, TEXT) is None
+    assert manager.stats()["failures"] == 1
+    assert manager.stats()["entries"] == 0
+
+
+# -------------------------------
+# Query fallback
+# -------------------------------
+def test_query_falls_back_to_inline_context_on_cached_content_error(manager, backend, monkeypatch):
+    calls = []
+
+    async def fake_llm_response(context, query, cached_content=None):
+        calls.append(cached_content)
+        if cached_content is not None:
+            raise CachedContentError("404 cached content not found")
+        return {"response": "inline answer", "tokens_used": 42}
+
+    monkeypatch.setattr(query_service, "context_cache", manager)
+    monkeypatch.setattr(query_service, "aget_llm_response", fake_llm_response)
+
+    stored = {"text": TEXT, "version": 1}
+    handle = manager.get_handle("doc-1", 1, TEXT)
+    result = asyncio.run(query_service.ask_full_document("doc-1", stored, "What jumps?", "user-1"))
+
+    assert result == {"response": "inline answer", "tokens_used": 42}
+    assert calls == [handle, None]
+    # The rejected handle is dropped, so the next query registers a fresh one
+    assert backend.resolve(handle) is None
+    assert manager.stats()["entries"] == 0
@@ -0,0 +1,96 @@
+# tests/test_dense_index.py
+import pytest
+
+from src.database.document_store import InMemoryDocumentStore
+from src.services.dense_index import DenseIndex, IVF_MIN_ROWS_PER_LIST
+from src.services.retrieval import segment_chunks
+
+TOPICS = ["zebra stripes savanna", "compiler register allocation", "sourdough bread starter",
+          "glacier ice melt", "violin string tension", "tax return deduction"]
+
+
+def topic_text(i: int) -> str:
+    return f"{TOPICS[i % len(TOPICS)]} notes volume {i} " * 3
+
+
+@pytest.fixture
+def store():
+    store = InMemoryDocumentStore()
+    store.create("zebra", "zebra.pdf", "2026-01-01", "Zebras are striped equids. Zebra stripes deter flies.")
+    store.create("bread", "bread.pdf", "2026-01-01", "A sourdough starter leavens bread slowly.")
+    return store
+
+
+def routed(index: DenseIndex, query: str, limit: int = 5) -> list[str]:
+    return [hit["uuid"] for hit in index.route(query, limit)]
+
+
+# -------------------------------
+# Exact search
+# -------------------------------
+def test_route_ranks_the_matching_document_first(store):
+    index = DenseIndex(dim=256, directory="")
+    index.sync(store)
+
+    assert routed(index, "why do zebras have stripes?")[0] == "zebra"
+    assert routed(index, "sourdough starter")[0] == "bread"
+    assert index.route("the of", 5) == []
+
+
+def test_add_chunks_needs_a_built_index(store):
+    index = DenseIndex(dim=256, directory="")
+    chunks = segment_chunks("Glaciers melt in summer.")
+
+    assert not index.add_chunks("ice", 1, None, chunks)
+
+    index.sync(store)
+    assert index.add_chunks("ice", store.generation() + 1, None, chunks)
+    assert routed(index, "glaciers melting")[0] == "ice"
+
+
+def test_add_chunks_to_an_unknown_version_drops_the_document(store):
+    index = DenseIndex(dim=256, directory="")
+    index.sync(store)
+
+    assert not index.add_chunks("zebra", 99, 98, segment_chunks("More about zebras."))
+    assert "zebra" not in routed(index, "zebra stripes")
+
+
+def test_removed_rows_are_reused(store):
+    index = DenseIndex(dim=256, directory="")
+    index.sync(store)
+    rows = index.stats()["chunks"]
+
+    index.remove_document("zebra")
+    assert routed(index, "zebra stripes") == []
+    assert index.stats()["free_rows"] > 0
+
+    index.add_chunks("zebra", 100, None, segment_chunks("Zebras again, with stripes."))
+    assert index.stats()["free_rows"] == 0
+    assert index.stats()["chunks"] == rows
+
+
+# -------------------------------
+# IVF quantizer
+# -------------------------------
+def test_untrained_ivf_falls_back_to_exact_search(store):
+    index = DenseIndex(dim=256, directory="", ivf_lists=4)
+    index.sync(store)
+
+    assert index.stats()["ivf_lists"] == 0
+    assert routed(index, "zebra stripes")[0] == "zebra"
+
+
+def test_ivf_is_trained_on_sync_and_routes_like_exact_search():
+    store = InMemoryDocumentStore()
+    for i in range(2 * IVF_MIN_ROWS_PER_LIST * 2):
+        store.create(f"doc-{i}", "doc.pdf", "2026-01-01", topic_text(i))
+    exact = DenseIndex(dim=256, directory="")
+    ivf = DenseIndex(dim=256, directory="", ivf_lists=2, ivf_probes=2)
+    exact.sync(store)
+    ivf.sync(store)
+
+    assert ivf.stats()["ivf_lists"] == 2
+    for query in ("zebra stripes volume 7", "sourdough bread volume 20"):
+        assert routed(ivf, query, 3) == routed(exact, query, 3)
+
@@ -0,0 +1,100 @@
+# tests/test_search_index.py
+import pytest
+
+from src.database.document_store import InMemoryDocumentStore
+from src.services.search_index import InvalidSearchQuery, SearchIndex, resolve_hits
+
+
+@pytest.fixture
+def store():
+    store = InMemoryDocumentStore()
+    store.create("fox", "fox.pdf", "2026-01-01", "The quick brown fox jumps over the lazy dog.")
+    store.create("perf", "perf.pdf", "2026-01-01", "Optimizing the optimizer: optimization of quick queries.")
+    store.create("dog", "dog.pdf", "2026-01-01", "A lazy dog sleeps. The dog is brown and quick to wake.")
+    return store
+
+
+@pytest.fixture
+def index(store):
+    index = SearchIndex()
+    index.sync(store)
+    return index
+
+
+def uuids(hits: list[dict]) -> set[str]:
+    return {hit["uuid"] for hit in hits}
+
+
+# -------------------------------
+# Queries
+# -------------------------------
+def test_terms_must_all_match(index):
+    assert uuids(index.search("quick brown", 10)) == {"fox", "dog"}
+    assert uuids(index.search("quick optimizer", 10)) == {"perf"}
+
+
+def test_phrase_matches_adjacent_words_only(index):
+    assert uuids(index.search('"brown fox"', 10)) == {"fox"}
+    assert uuids(index.search('"lazy dog"', 10)) == {"fox", "dog"}
+    assert index.search('"fox brown"', 10) == []
+
+
+def test_prefix_expands_to_matching_terms(index):
+    assert uuids(index.search("optim*", 10)) == {"perf"}
+    assert uuids(index.search("qui*", 10)) == {"fox", "perf", "dog"}
+
+
+def test_query_without_words_is_rejected(index):
+    with pytest.raises(InvalidSearchQuery):
+        index.search("*** ...", 10)
+
+
+def test_hit_resolves_to_phrase_offset(store, index):
+    [result] = resolve_hits(store, index.search('"brown fox"', 10))
+
+    text = store.get("fox")["text"]
+    assert text[result["offset"]:].startswith("brown fox")
+    assert "brown fox" in result["snippet"]
+
+
+# -------------------------------
+# Deletes and appends
+# -------------------------------
+def test_deleted_documents_are_tombstoned(store, index):
+    index.remove_document("fox")
+
+    assert uuids(index.search("lazy", 10)) == {"dog"}
+    assert index.stats()["tombstones"] == 1
+    assert index.stats()["segments"] == 2
+
+
+def test_compaction_drops_tombstones_and_keeps_results(store):
+    for i in range(100):
+        store.create(f"filler-{i}", "filler.pdf", "2026-01-01", f"filler text number {i}")
+    index = SearchIndex()
+    index.sync(store)
+
+    for i in range(70):
+        index.remove_document(f"filler-{i}")
+
+    stats = index.stats()
+    assert stats["tombstones"] < 64
+    assert stats["segments"] == 33
+    assert uuids(index.search('"lazy dog"', 10)) == {"fox", "dog"}
+    assert uuids(index.search("filler", 100)) == {f"filler-{i}" for i in range(70, 100)}
+
+
+def test_appended_segment_is_searchable(store, index):
+    appended = store.append_segment("fox", "more.pdf", "2026-01-02", "Zebras are striped.")
+    assert index.add_segment("fox", appended["version"], appended["previous_version"], 1, "Zebras are striped.")
+
+    [hit] = index.search("zebras", 10)
+    assert (hit["uuid"], hit["seq"]) == ("fox", 1)
+
+
+def test_sync_picks_up_changes_made_elsewhere(store, index):
+    store.delete("perf")
+    store.create("new", "new.pdf", "2026-01-02", "An optimal plan.")
+    index.sync(store)
+
+    assert uuids(index.search("optim*", 10)) == {"new"}
@@ -0,0 +1,118 @@
+# tests/test_single_flight.py
+import asyncio
+
+from src.services.single_flight import SingleFlight
+
+
+class Work:
+    """An awaitable job that waits for the test to release it and counts its runs."""
+
+    def __init__(self):
+        self.calls = 0
+        self.release = asyncio.Event()
+        self.error: Exception | None = None
+
+    async def __call__(self) -> str:
+        self.calls += 1
+        await self.release.wait()
+        if self.error is not None:
+            raise self.error
+        return "answer"
+
+
+async def settle() -> None:
+    """Lets the tasks just created run up to their first await."""
+    for _ in range(3):
+        await asyncio.sleep(0)
+
+
+# -------------------------------
+# Coalescing
+# -------------------------------
+def test_concurrent_callers_share_one_execution():
+    async def run():
+        flights, work = SingleFlight(), Work()
+        tasks = [asyncio.ensure_future(flights.do("key", work)) for _ in range(3)]
+        await settle()
+        work.release.set()
+        return await asyncio.gather(*tasks), work.calls, flights.stats()
+
+    results, calls, stats = asyncio.run(run())
+
+    assert results == [("answer", False), ("answer", True), ("answer", True)]
+    assert calls == 1
+    assert stats == {"in_flight": 0, "executions": 1, "llm_calls_saved": 2}
+
+
+def test_different_keys_run_separately():
+    async def run():
+        flights, work = SingleFlight(), Work()
+        work.release.set()
+        return await asyncio.gather(flights.do("a", work), flights.do("b", work)), work.calls
+
+    results, calls = asyncio.run(run())
+
+    assert results == [("answer", False), ("answer", False)]
+    assert calls == 2
+
+
+def test_finished_call_is_not_reused():
+    async def run():
+        flights, work = SingleFlight(), Work()
+        work.release.set()
+        await flights.do("key", work)
+        return await flights.do("key", work), work.calls
+
+    assert asyncio.run(run()) == (("answer", False), 2)
+
+
+# -------------------------------
+# Errors and cancellation
+# -------------------------------
+def test_error_reaches_every_waiter_and_is_not_cached():
+    async def run():
+        flights, work = SingleFlight(), Work()
+        work.error = RuntimeError("LLM unavailable")
+        tasks = [asyncio.ensure_future(flights.do("key", work)) for _ in range(3)]
+        await settle()
+        work.release.set()
+        outcomes = await asyncio.gather(*tasks, return_exceptions=True)
+
+        work.error = None
+        return outcomes, await flights.do("key", work), work.calls
+
+    outcomes, retried, calls = asyncio.run(run())
+
+    assert all(isinstance(e, RuntimeError) and str(e) == "LLM unavailable" for e in outcomes)
+    assert retried == ("answer", False)
+    assert calls == 2
+
+
+def test_cancelled_waiter_does_not_cancel_the_work():
+    async def run():
+        flights, work = SingleFlight(), Work()
+        leader = asyncio.ensure_future(flights.do("key", work))
+        follower = asyncio.ensure_future(flights.do("key", work))
+        await settle()
+
+        leader.cancel()
+        await asyncio.gather(leader, return_exceptions=True)
+        work.release.set()
+        return leader.cancelled(), await follower, work.calls
+
+    assert asyncio.run(run()) == (True, ("answer", True), 1)
+
+
+def test_cancelled_work_cancels_every_waiter():
+    async def run():
+        flights, work = SingleFlight(), Work()
+        tasks = [asyncio.ensure_future(flights.do("key", work)) for _ in range(2)]
+        await settle()
+        next(iter(flights._in_flight.values())).cancel()
+        outcomes = await asyncio.gather(*tasks, return_exceptions=True)
+        return outcomes, flights.stats()["in_flight"]
+
+    outcomes, in_flight = asyncio.run(run())
+
+    assert all(isinstance(e, asyncio.CancelledError) for e in outcomes)
+    assert in_flight == 0
@@ -0,0 +1,29 @@
+# tests/test_text_normalizer.py
+from src.utils.text_normalizer import find_page_number_offsets, normalize_page
+
+
+def test_numbers_following_the_page_sequence_are_dropped():
+    pages = [f"Body of page {i}\n{i + 5}" for i in range(6)]
+
+    offsets = find_page_number_offsets(pages)
+
+    assert offsets == {5}
+    assert normalize_page(pages[2], set(), {2 + offset for offset in offsets}) == "Body of page 2"
+
+
+def test_bare_numbers_without_a_sequence_are_kept():
+    pages = [f"Total\n{value}" for value in (42, 17, 3, 99, 250)]
+
+    assert find_page_number_offsets(pages) == set()
+    assert normalize_page(pages[0], set()) == "Total\n42"
+
+
+def test_short_documents_give_no_sequence_evidence():
+    pages = ["Answer\n1", "Answer\n2"]
+
+    assert find_page_number_offsets(pages) == set()
+    assert normalize_page(pages[1], set()) == "Answer\n2"
+
+
+def test_page_labels_are_dropped_without_a_sequence():
+    assert normalize_page("Page 3 of 40\nIntroduction\nPage 3", set()) == "Introduction"
@@ -0,0 +1,27 @@
+# tests/test_varint.py
+from src.utils.varint import decode_deltas, encode_deltas
+
+
+def test_round_trip():
+    values = [0, 1, 2, 127, 128, 300, 16_383, 16_384, 2_097_152, 1 << 40]
+
+    assert decode_deltas(encode_deltas(values)) == values
+
+
+def test_small_gaps_take_one_byte():
+    values = list(range(5, 505, 5))
+
+    assert len(encode_deltas(values)) == len(values)
+
+
+def test_empty_list():
+    assert encode_deltas([]) == b""
+    assert decode_deltas(b"") == []
+
+
+def test_decode_slice_of_concatenated_lists():
+    first, second = encode_deltas([3, 200, 70_000]), encode_deltas([1, 2, 3])
+    data = bytearray(first + second)
+
+    assert decode_deltas(data, 0, len(first)) == [3, 200, 70_000]
+    assert decode_deltas(data, len(first)) == [1, 2, 3]